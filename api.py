@@ -1,9 +1,17 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, Dict, Any, List, Union
+import asyncio
+import hmac
+from contextlib import asynccontextmanager
+import time
+import zlib
 import json
 import os
 import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 
 # Agregar src/ al path para importar módulos
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -11,10 +19,25 @@ src_dir = os.path.join(current_dir, 'src')
 sys.path.insert(0, src_dir)
 
 # Importaciones modulares actualizadas desde src/
-from monotributo_scraper import obtener_datos_monotributo_web
-from data_manager import cargar_datos_json_locales, guardar_datos_json_locales
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from monotributo_scraper import ResultadoScraping
+from data_manager import (cargar_datos_json_locales, guardar_datos_json_locales, obtener_fecha_actualizacion_local,
+                          registrar_scraping)
+from fuentes_datos import (FUENTES, cerrar_cliente, cliente_compartido, consultar_fuentes, datos_con_cache,
+                           huellas_previas_fuentes)
+from historial_datos import obtener_historial, normalizar_fecha
+from snapshot_binario import abrir_snapshot, compilar_snapshot
+from simulador import simular_escenarios, saltos_de_categoria, resultado_a_json
+from tablas_monotributo import construir_tablas
+from motor_inferencia import RUTA_REGLAS, MotorInferencia, cargar_reglas, validar_reglas, version_reglas
+from checkpoint_sesiones import AlmacenSesiones
+from control_admision import ControlAdmision, Sobrecarga
+from recursos_estaticos import RecursosEstaticos, etag_coincide
+from analitica_entrevistas import RegistroAnalitica
+from captura_trafico import CapturaTrafico
+from token_sesion import (CodificadorTokens, TokenInvalido, TokenRetirado, clave_tokens, nuevo_sesion_id,
+                          versiones_del_token)
+from contabilidad_memoria import ContabilidadMemoria, atribuir_modulos
+from jurisdicciones import JURISDICCION_PREDETERMINADA, CacheJurisdicciones, JurisdiccionDesconocida
 
 app = FastAPI(title="Sistema Experto Monotributo API")
 
@@ -23,847 +46,1025 @@ class RespuestaUsuario(BaseModel):
     pregunta_id: str
     respuesta: str
     valor_numerico: Optional[float] = None
+    # Número de respuesta dentro de la sesión (1, 2, ...) para detectar
+    # reintentos y respuestas fuera de orden; opcional
+    secuencia: Optional[int] = None
+
+class RespuestaConToken(RespuestaUsuario):
+    # Token de sesión del modo sin estado (ver /iniciar_sesion?sin_estado=true)
+    token: str
 
 class EstadoSesion(BaseModel):
     id_sesion: str
     estado_actual: Dict[str, Any] = {}
     applied_rules: List[str] = []
 
+# Puntos máximos de una simulación pedida por HTTP: mucho menos que los de la
+# biblioteca, porque la respuesta crece con los puntos (unos 120 bytes cada uno)
+MAXIMO_PUNTOS_SIMULACION = int(os.environ.get("MAXIMO_PUNTOS_SIMULACION", 100_000))
+
+class RangoSimulacion(BaseModel):
+    desde: float
+    hasta: float
+    pasos: int = Field(100, ge=1, le=MAXIMO_PUNTOS_SIMULACION)
+
+class ParametrosSimulacion(BaseModel):
+    tipo_actividad: str = "servicios"
+    ingresos: Optional[Union[float, List[float], RangoSimulacion]] = None
+    superficie: Optional[Union[float, List[float], RangoSimulacion]] = None
+    energia: Optional[Union[float, List[float], RangoSimulacion]] = None
+    alquileres: Optional[Union[float, List[float], RangoSimulacion]] = None
+    en_relacion_dependencia: Union[bool, List[bool]] = False
+    grilla: bool = True
+    fecha_vigencia: Optional[str] = None
+    jurisdiccion: Optional[str] = None
+
 # =====================================================================================
-# BASE DE CONOCIMIENTO (KNOWLEDGE BASE) - SISTEMA EXPERTO MONOTRIBUTO
+# CARGA DINÁMICA Y GESTIÓN DE DATOS (HECHOS)
 # =====================================================================================
 
-# Base de conocimiento cargada dinámicamente desde rules.json
-knowledge_base = {}
+# Sesiones en memoria, con checkpoint periódico y al apagar en data/sesiones/
+# (se restauran de forma perezosa al reiniciar)
+sesiones = AlmacenSesiones()
+INTERVALO_CHECKPOINT_SESIONES = 30
+tarea_checkpoint = None
 
-# Funciones auxiliares para evaluación de condiciones complejas
-def evaluar_precio_unitario_maximo(estado, respuesta, valor_numerico=None):
-    """Evalúa si el precio unitario supera el límite de categoría A"""
-    try:
-        # Verificar que los datos estén cargados
-        if not datos_categorias:
-            return False
-        
-        # Acceder a los datos correctamente (manejar ambos formatos)
-        if "datos" in datos_categorias:
-            precio_max = datos_categorias["datos"]["venta"]["A"]["precio_unitario_maximo"]
-        else:
-            precio_max = datos_categorias["venta"]["A"]["precio_unitario_maximo"]
-        
-        # La respuesta debe comenzar con "SÍ" para indicar que supera el límite
-        resultado = respuesta.startswith("SÍ")
-        return resultado
-    except Exception as e:
-        return False
+# Eventos de analítica de las entrevistas: se registran en un buffer en memoria
+# y una tarea en segundo plano los vuelca a data/analitica/ (sin I/O en las peticiones)
+analitica = RegistroAnalitica()
+INTERVALO_VOLCADO_ANALITICA = 5
+tarea_volcado = None
 
-def evaluar_ingresos_limite(estado, respuesta, valor_numerico):
-    """Evalúa si los ingresos exceden el límite máximo permitido"""
-    if valor_numerico is None:
-        return False
-    
-    try:
-        # Verificar que los datos estén cargados
-        if not datos_categorias:
-            return False
-        
-        # Acceder a los datos correctamente (manejar ambos formatos)
-        if "datos" in datos_categorias:
-            categorias_data = datos_categorias["datos"]
-        else:
-            categorias_data = datos_categorias
-            
-        tipo_actividad = estado.get("tipo_actividad", "servicios")
-        
-        if tipo_actividad == "venta":
-            categoria_maxima = estado.get("categoria_maxima", "K")
-            limite_maximo = categorias_data[tipo_actividad][categoria_maxima]["ingresos"]
-        else:
-            limite_maximo = categorias_data[tipo_actividad]["H"]["ingresos"]
-        
-        resultado = valor_numerico > limite_maximo
-        return resultado
-    except Exception as e:
-        return False
+# Captura de tráfico (opcional): con CAPTURA_TRAFICO=<archivo> se graban las
+# peticiones de la entrevista para reproducirlas con herramientas/reproducir_trafico.py;
+# con CAPTURA_ANONIMIZAR=1 no se graban los valores numéricos reales
+captura = CapturaTrafico(os.environ["CAPTURA_TRAFICO"], anonimizar=os.environ.get("CAPTURA_ANONIMIZAR") == "1") \
+    if os.environ.get("CAPTURA_TRAFICO") else None
 
-def evaluar_ingresos_dentro_limite(estado, respuesta, valor_numerico):
-    """Evalúa si los ingresos están dentro del límite permitido"""
-    return not evaluar_ingresos_limite(estado, respuesta, valor_numerico)
-
-def evaluar_supera_parametro(estado, respuesta, parametro_tipo):
-    """Evalúa si se supera un parámetro específico (superficie, energía, alquileres)"""
-    return respuesta.startswith("SÍ")
-
-def evaluar_supera_parametro_superficie(estado, respuesta, valor_numerico=None):
-    """Evalúa si se supera el parámetro de superficie"""
-    return evaluar_supera_parametro(estado, respuesta, "superficie")
-
-def evaluar_no_supera_parametro_superficie(estado, respuesta, valor_numerico=None):
-    """Evalúa si NO se supera el parámetro de superficie"""
-    return not evaluar_supera_parametro(estado, respuesta, "superficie")
-
-def evaluar_supera_parametro_energia(estado, respuesta, valor_numerico=None):
-    """Evalúa si se supera el parámetro de energía"""
-    return evaluar_supera_parametro(estado, respuesta, "energia")
-
-def evaluar_no_supera_parametro_energia(estado, respuesta, valor_numerico=None):
-    """Evalúa si NO se supera el parámetro de energía"""
-    return not evaluar_supera_parametro(estado, respuesta, "energia")
-
-def evaluar_supera_parametro_alquileres(estado, respuesta, valor_numerico=None):
-    """Evalúa si se supera el parámetro de alquileres"""
-    return evaluar_supera_parametro(estado, respuesta, "alquileres")
-
-def evaluar_no_supera_parametro_alquileres(estado, respuesta, valor_numerico=None):
-    """Evalúa si NO se supera el parámetro de alquileres"""
-    return not evaluar_supera_parametro(estado, respuesta, "alquileres")
-
-# Funciones de post-acción para cálculos complejos
-def establecer_tipo_actividad(estado, respuesta):
-    """Establece el tipo de actividad basado en la respuesta"""
-    estado["tipo_actividad"] = "servicios" if respuesta.startswith("SÍ") else "venta"
-    if estado["tipo_actividad"] == "venta":
-        estado["categoria_actual"] = "A"
-    return estado
-
-def calcular_categoria_por_ingresos(estado, valor_numerico):
-    """Calcula la categoría basada en los ingresos anuales"""
-    tipo_actividad = estado["tipo_actividad"]
-    
-    # Acceder a los datos correctamente (manejar ambos formatos)
-    if "datos" in datos_categorias:
-        categorias_data = datos_categorias["datos"]
-    else:
-        categorias_data = datos_categorias
-    
-    for categoria in sorted(categorias_data[tipo_actividad].keys()):
-        if valor_numerico <= categorias_data[tipo_actividad][categoria]["ingresos"]:
-            if tipo_actividad == "venta" and estado.get("categoria_maxima"):
-                if categoria > estado["categoria_maxima"]:
-                    categoria = estado["categoria_maxima"]
-            estado["categoria_actual"] = categoria
-            estado["categoria_final"] = categoria
-            break
-    return estado
-
-def avanzar_categoria_por_parametro(estado, parametro_tipo):
-    """Avanza a la siguiente categoría cuando se supera un parámetro"""
-    categoria_actual = estado["categoria_actual"]
-    tipo_actividad = estado["tipo_actividad"]
-    
-    # Acceder a los datos correctamente (manejar ambos formatos)
-    if "datos" in datos_categorias:
-        categorias_data = datos_categorias["datos"]
-    else:
-        categorias_data = datos_categorias
-    
-    categorias_ordenadas = sorted(categorias_data[tipo_actividad].keys())
-    idx_actual = categorias_ordenadas.index(categoria_actual)
-    
-    if parametro_tipo == "alquileres":
-        # Para alquileres, buscar categoría con valor diferente
-        valor_actual = categorias_data[tipo_actividad][categoria_actual]["alquileres"]
-        for cat in categorias_ordenadas[idx_actual + 1:]:
-            if categorias_data[tipo_actividad][cat]["alquileres"] > valor_actual:
-                estado["categoria_actual"] = cat
-                return estado
-    else:
-        # Para superficie y energía, avanzar a la siguiente categoría
-        if idx_actual + 1 < len(categorias_ordenadas):
-            estado["categoria_actual"] = categorias_ordenadas[idx_actual + 1]
-            return estado
-    
-    # Si no se puede avanzar más, marcar para régimen general
-    estado["excede_parametros"] = True
-    return estado
-
-def establecer_categoria_final(estado):
-    """Establece la categoría final cuando no se superan más parámetros"""
-    estado["categoria_final"] = estado["categoria_actual"]
-    return estado
-
-def establecer_categoria_inicial(estado, respuesta):
-    """Establece la categoría inicial A para emprendedores sin ingresos"""
-    estado["categoria_actual"] = "A"
-    estado["categoria_final"] = "A"
-    return estado
-
-def establecer_categoria_para_superficie(estado, respuesta):
-    """Establece la categoría actual para evaluar superficie cuando tiene local"""
-    # Si no hay categoría actual establecida, usar la categoría basada en ingresos
-    if "categoria_actual" not in estado:
-        # Si se calculó categoría por ingresos anteriormente, usar esa
-        if "categoria_final" in estado:
-            estado["categoria_actual"] = estado["categoria_final"]
-        else:
-            # Por defecto, usar categoría A si no hay otra información
-            estado["categoria_actual"] = "A"
-    
-    print(f"Estableciendo categoría para evaluación de superficie: {estado['categoria_actual']}")
-    return estado
+# Contabilidad de memoria por subsistema (GET /memoria), con el muestreo de
+# tracemalloc activable en caliente; con MUESTREO_MEMORIA=<marcos> se activa
+# desde el arranque, para contar también las reglas y las tablas iniciales
+contabilidad_memoria = ContabilidadMemoria()
+atribuir_modulos(contabilidad_memoria)
+if os.environ.get("MUESTREO_MEMORIA"):
+    contabilidad_memoria.activar(int(os.environ["MUESTREO_MEMORIA"]))
 
-def avanzar_categoria_por_parametro_superficie(estado, respuesta):
-    """Avanza a la siguiente categoría cuando se supera el parámetro de superficie"""
-    return avanzar_categoria_por_parametro(estado, "superficie")
+# Locks por sesión, repartidos en un número fijo de shards: dos respuestas a la
+# misma sesión se procesan de a una, y sesiones distintas no compiten entre sí
+# salvo que caigan en el mismo shard
+CANTIDAD_SHARDS_SESIONES = 64
+locks_sesiones = [asyncio.Lock() for _ in range(CANTIDAD_SHARDS_SESIONES)]
 
-def avanzar_categoria_por_parametro_energia(estado, respuesta):
-    """Avanza a la siguiente categoría cuando se supera el parámetro de energía"""
-    return avanzar_categoria_por_parametro(estado, "energia")
+def lock_de_sesion(sesion_id):
+    """Devuelve el lock del shard al que pertenece una sesión"""
+    return locks_sesiones[zlib.crc32(sesion_id.encode('utf-8')) % CANTIDAD_SHARDS_SESIONES]
 
-def avanzar_categoria_por_parametro_alquileres(estado, respuesta):
-    """Avanza a la siguiente categoría cuando se supera el parámetro de alquileres"""
-    return avanzar_categoria_por_parametro(estado, "alquileres")
+# Control de admisión: peticiones atendidas a la vez y colas por prioridad.
+# Las respuestas a sesiones existentes se atienden antes que las sesiones
+# nuevas; con la cola llena o el plazo de espera vencido se responde 503
+control_admision = ControlAdmision(
+    maximo_en_curso=int(os.environ.get("ADMISION_MAXIMO_EN_CURSO", 16)),
+    colas_maximas={"respuesta": int(os.environ.get("ADMISION_COLA_RESPUESTAS", 256)),
+                   "nueva_sesion": int(os.environ.get("ADMISION_COLA_NUEVAS_SESIONES", 32))},
+    esperas_maximas={"respuesta": 2.0, "nueva_sesion": 0.5},
+    reintentar_en={"respuesta": 1, "nueva_sesion": 5}
+)
 
-def calcular_pagos_finales(estado, respuesta_dependencia):
-    """Calcula los pagos finales basado en la categoría y relación de dependencia"""
-    categoria_final = estado["categoria_final"]
-    tipo_actividad = estado["tipo_actividad"]
-    
-    # Convertir la respuesta del usuario a un booleano
-    # La respuesta es "SÍ" si contiene "SÍ" al inicio
-    respuesta_str = str(respuesta_dependencia).upper().strip()
-    en_relacion_dependencia = respuesta_str.startswith("SÍ")
-    
+@asynccontextmanager
+async def admitir(prioridad):
+    """Ocupa un lugar del control de admisión durante el bloque, o responde 503 con Retry-After"""
     try:
-        # Acceder a los datos correctamente (manejar formato con metadatos)
-        if "datos" in datos_pagos:
-            pagos_categoria = datos_pagos["datos"][tipo_actividad][categoria_final]
-        else:
-            pagos_categoria = datos_pagos[tipo_actividad][categoria_final]
-        
-        # Preparar estructura de pagos
-        solo_impuesto = float(pagos_categoria["solo_impuesto"])
-        pago_completo = float(pagos_categoria["completo"])
-        
-        # Calcular SIPA y Obra Social como la diferencia
-        sipa_y_obra_social = pago_completo - solo_impuesto
-        # Aproximadamente SIPA es 60% y Obra Social 40% del total
-        sipa_valor = sipa_y_obra_social * 0.6
-        obra_social_valor = sipa_y_obra_social * 0.4
-        
-        pagos_nacionales = {"impuesto": f"{solo_impuesto:.2f}"}
-        
-        if en_relacion_dependencia:
-            pagos_nacionales["sipa"] = "No aplica - Cubierto por tu empleo actual"
-            pagos_nacionales["obra_social"] = "No aplica - Cubierto por tu empleo actual"
-            total_nacional = solo_impuesto
-        else:
-            pagos_nacionales["sipa"] = f"{sipa_valor:.2f}"
-            pagos_nacionales["obra_social"] = f"{obra_social_valor:.2f}"
-            total_nacional = pago_completo
-        
-        # Preparar pagos provinciales (AREF)
-        pagos_provinciales = {}
-        total_provincial = 0
-        if datos_aref and categoria_final in datos_aref:
-            pagos_provinciales["aref"] = datos_aref[categoria_final]
-            total_provincial = float(datos_aref[categoria_final])
-        
-        total_general = total_nacional + total_provincial
-        
-        estado["resultado_final"] = {
-            "categoria": categoria_final,
-            "tipo_actividad": tipo_actividad,
-            "pagos_nacionales": pagos_nacionales,
-            "pagos_provinciales": pagos_provinciales,
-            "total_nacional": total_nacional,
-            "total_provincial": total_provincial,
-            "total_general": total_general,
-            "en_relacion_dependencia": en_relacion_dependencia
-        }
-    except KeyError as e:
-        estado["error"] = f"Error al calcular pagos: {e}"
-    
-    return estado
-
-# Mapeo de nombres de funciones para carga dinámica
-FUNCTION_MAP = {
-    "evaluar_precio_unitario_maximo": evaluar_precio_unitario_maximo,
-    "evaluar_ingresos_limite": evaluar_ingresos_limite,
-    "evaluar_ingresos_dentro_limite": evaluar_ingresos_dentro_limite,
-    "evaluar_supera_parametro_superficie": evaluar_supera_parametro_superficie,
-    "evaluar_no_supera_parametro_superficie": evaluar_no_supera_parametro_superficie,
-    "evaluar_supera_parametro_energia": evaluar_supera_parametro_energia,
-    "evaluar_no_supera_parametro_energia": evaluar_no_supera_parametro_energia,
-    "evaluar_supera_parametro_alquileres": evaluar_supera_parametro_alquileres,
-    "evaluar_no_supera_parametro_alquileres": evaluar_no_supera_parametro_alquileres,
-    "establecer_tipo_actividad": establecer_tipo_actividad,
-    "calcular_categoria_por_ingresos": calcular_categoria_por_ingresos,
-    "avanzar_categoria_por_parametro": avanzar_categoria_por_parametro,
-    "establecer_categoria_final": establecer_categoria_final,
-    "establecer_categoria_inicial": establecer_categoria_inicial,
-    "establecer_categoria_para_superficie": establecer_categoria_para_superficie,
-    "avanzar_categoria_por_parametro_superficie": avanzar_categoria_por_parametro_superficie,
-    "avanzar_categoria_por_parametro_energia": avanzar_categoria_por_parametro_energia,
-    "avanzar_categoria_por_parametro_alquileres": avanzar_categoria_por_parametro_alquileres,
-    "calcular_pagos_finales": calcular_pagos_finales
-}
-
-def cargar_reglas_desde_json():
-    """Carga las reglas de la base de conocimiento desde el archivo rules.json"""
-    global knowledge_base
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    rules_path = os.path.join(current_dir, 'src', 'knowledge_base', 'rules.json')
-    
+        await control_admision.entrar(prioridad)
+    except Sobrecarga as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.reintentar_en)})
     try:
-        with open(rules_path, 'r', encoding='utf-8') as f:
-            rules_data = json.load(f)
-        
-        # Procesar las reglas cargadas
-        for rule_name, rule_data in rules_data.items():
-            rule = {
-                "condition": rule_data["condition"],
-                "action": rule_data["action"],
-                "description": rule_data["description"],
-                "explanation": rule_data["explanation"]
-            }
-            
-            # Mapear funciones de evaluación si existen
-            if "eval_func" in rule_data["condition"]:
-                func_name = rule_data["condition"]["eval_func"]
-                if func_name in FUNCTION_MAP:
-                    rule["condition"]["eval_func"] = FUNCTION_MAP[func_name]
-                else:
-                    print(f"Advertencia: Función {func_name} no encontrada en FUNCTION_MAP")
-            
-            # Mapear funciones de post-acción si existen
-            if "post_action_func" in rule_data:
-                func_name = rule_data["post_action_func"]
-                if func_name in FUNCTION_MAP:
-                    rule["post_action_func"] = FUNCTION_MAP[func_name]
-                else:
-                    print(f"Advertencia: Función {func_name} no encontrada en FUNCTION_MAP")
-            
-            knowledge_base[rule_name] = rule
-        
-        print(f"Cargadas {len(knowledge_base)} reglas desde rules.json")
-        return True
-        
-    except Exception as e:
-        print(f"Error cargando reglas desde JSON: {e}")
-        return False
-
-def generar_explicacion_detallada(reglas_aplicadas):
-    """Genera explicaciones detalladas y legibles para las reglas aplicadas"""
-    explicaciones = []
-    
-    for rule_name in reglas_aplicadas:
-        if rule_name in knowledge_base:
-            rule = knowledge_base[rule_name]
-            explicacion = {
-                "regla": rule_name,
-                "descripcion": rule.get("description", "Regla del sistema"),
-                "explicacion": rule.get("explanation", "Esta regla se activó según las condiciones del sistema."),
-                "tipo": "activada"
-            }
-            explicaciones.append(explicacion)
-        else:
-            # Fallback para reglas que no están en el knowledge_base
-            explicaciones.append({
-                "regla": rule_name,
-                "descripcion": "Regla heredada del sistema",
-                "explicacion": f"Se aplicó la regla {rule_name} según la lógica del sistema experto.",
-                "tipo": "heredada"
-            })
-    
-    return explicaciones
-
-# =====================================================================================
-# CARGA DINÁMICA Y GESTIÓN DE DATOS (HECHOS)
-# =====================================================================================
-
-# Almacenamiento en memoria de las sesiones
-sesiones = {}
+        yield
+    finally:
+        control_admision.salir()
 
 # Cargar datos del monotributo al inicio
 datos_categorias = None
 datos_pagos = None
 datos_aref = None
+# Datos vigentes de las fuentes con copia en caché (AREF, municipales...)
+datos_fuentes = {}
+
+# Snapshot binario (data/snapshot.bin) mapeado en memoria
+snapshot_datos = None
+
+# Reglas tal como están en rules.json, para compilar el snapshot
+reglas_fuente = {}
+
+# Motor de inferencia sobre las reglas y las tablas vigentes (se crea en inicializar_datos)
+motor = None
+
+# Motores de las últimas versiones de reglas publicadas: cada sesión sigue con
+# la versión con la que empezó aunque rules.json se recargue en caliente
+MAXIMO_VERSIONES_REGLAS = 8
+motores_por_version = OrderedDict()
+# Los motores se publican desde hilos aparte: publicar y recorrer
+# motores_por_version se hace con este lock
+lock_publicacion = threading.Lock()
+
+# Modo sin estado: el estado de la sesión viaja en un token firmado (HMAC) con
+# CLAVE_TOKENS_SESION, verificado con el codificador de su versión de reglas
+clave_tokens_sesion = clave_tokens()
+codificadores_tokens = {}
+
+# Motores de las demás jurisdicciones (provincias y municipios con su tabla en
+# data/jurisdicciones/): se crean cuando una sesión los pide y se guardan en
+# un cache LRU de MAXIMO_JURISDICCIONES motores
+jurisdicciones = CacheJurisdicciones()
+
+# Cada cuántos segundos se revisa si cambió rules.json
+INTERVALO_VIGILANCIA_REGLAS = 2
+tarea_vigilancia_reglas = None
+
+# Resultado de la última consulta a ARCA (estado y duración)
+ultimo_scraping = None
+
+# Las fuentes se consultan a la vez desde el event loop; inicializar_datos hace
+# I/O bloqueante (escrituras con fsync) y se ejecuta en un hilo aparte. De a
+# una actualización por vez, y nunca a la vez que una recarga de rules.json
+lock_actualizacion = asyncio.Lock()
+
+@lru_cache(maxsize=8)
+def tablas_a_fecha(fecha_vigencia):
+    """Devuelve las tablas vigentes a una fecha (YYYY-MM-DD) o None si no hay datos"""
+    datos = obtener_historial().cargar_a_fecha(fecha_vigencia)
+    if datos is None:
+        return None
+    return construir_tablas(datos["categorias"], datos["pagos"], datos["aref"], version=datos["version"])
+
+def obtener_motor():
+    """Devuelve el motor de inferencia, o 503 si el sistema todavía no se inicializó"""
+    if motor is None:
+        raise HTTPException(status_code=503, detail="El sistema experto se está inicializando")
+    return motor
+
+def motor_de(estado):
+    """Motor de la jurisdicción o de la versión de reglas de una sesión (el vigente si esa versión ya no está)"""
+    if estado.get("jurisdiccion"):
+        return jurisdicciones.motor(estado["jurisdiccion"])
+    return motores_por_version.get(estado.get("version_reglas")) or obtener_motor()
 
-def inicializar_datos():
-    global datos_categorias, datos_pagos, datos_aref
+async def motor_jurisdiccion(jurisdiccion):
+    """
+    Motor de una jurisdicción, o None para la predeterminada (la del motor
+    vigente). Si no está en el cache se crea en un hilo aparte; 404 si la
+    jurisdicción no existe.
+    """
+    if not jurisdiccion or jurisdiccion == JURISDICCION_PREDETERMINADA:
+        return None
+    obtener_motor()
+    motor_cacheado = jurisdicciones.obtener(jurisdiccion)
+    if motor_cacheado is not None:
+        return motor_cacheado
+    try:
+        return await asyncio.to_thread(jurisdicciones.motor, jurisdiccion)
+    except JurisdiccionDesconocida as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def publicar_motor(nuevo, reemplaza=None):
+    """
+    Publica un motor como vigente y lo registra (con su codificador de tokens)
+    por su versión de reglas. Con reemplaza, sólo lo publica si ese sigue
+    siendo el motor vigente; devuelve si lo publicó.
+    """
+    global motor
+    codificador = CodificadorTokens(nuevo, clave_tokens_sesion)
+    with lock_publicacion:
+        if reemplaza is not None and motor is not reemplaza:
+            return False
+        codificadores_tokens[nuevo.version_reglas] = codificador
+        motores_por_version[nuevo.version_reglas] = nuevo
+        motores_por_version.move_to_end(nuevo.version_reglas)
+        while len(motores_por_version) > MAXIMO_VERSIONES_REGLAS:
+            version_retirada, _ = motores_por_version.popitem(last=False)
+            codificadores_tokens.pop(version_retirada, None)
+        motor = nuevo
+        jurisdicciones.configurar(nuevo, datos_categorias, datos_pagos)
+    return True
+
+def motores_publicados():
+    """Motores de las versiones de reglas publicadas, del más reciente al más antiguo"""
+    with lock_publicacion:
+        return list(reversed(motores_por_version.values()))
+
+async def actualizar_desde_fuentes():
+    """Consulta todas las fuentes a la vez con el cliente HTTP compartido y reinicializa los datos"""
+    async with lock_actualizacion:
+        huellas = await asyncio.to_thread(huellas_previas_fuentes)
+        print(f"Consultando fuentes de datos: {', '.join(FUENTES)}")
+        resultados = await consultar_fuentes(huellas_previas=huellas, cliente=cliente_compartido())
+        return await asyncio.to_thread(inicializar_datos, resultados)
+
+def inicializar_datos(resultados=None):
+    """
+    Carga reglas y datos y publica el motor. resultados son los de
+    consultar_fuentes (nombre -> ResultadoFuente); sin ellos se consultan
+    las fuentes aquí mismo. Se llama con lock_actualizacion tomado (ver
+    actualizar_desde_fuentes): así lee rules.json sin competir con una recarga.
+    """
+    global datos_categorias, datos_pagos, datos_aref, snapshot_datos, reglas_fuente, ultimo_scraping, datos_fuentes
     
     print("Inicializando sistema experto...")
     
+    # Consultar ARCA y las demás fuentes comparando huellas con la última
+    # consulta guardada (sólo de las fuentes que tienen copia en disco)
+    if resultados is None:
+        print("Obteniendo datos actualizados de ARCA...")
+        resultados = asyncio.run(consultar_fuentes(huellas_previas=huellas_previas_fuentes()))
+    afip = resultados["afip"]
+    resultado_scraping = ResultadoScraping(
+        afip.estado, (afip.datos or {}).get("categorias"), (afip.datos or {}).get("pagos"),
+        afip.huellas.get("huella_html"), afip.huellas.get("huella_tabla"), afip.duracion, afip.detalle
+    )
+    otras_fuentes = {nombre: resultado for nombre, resultado in resultados.items() if nombre != "afip"}
+    
+    # Sin cambios en ARCA, en las demás fuentes ni en los archivos fuente (snapshot vigente): no hay nada que reconstruir
+    if resultado_scraping.estado == "sin_cambios" and motor is not None and snapshot_datos is not None \
+            and all(resultado.estado == "sin_cambios" for resultado in otras_fuentes.values()) and snapshot_datos.vigente():
+        ultimo_scraping = registrar_scraping(resultado_scraping, fuentes=otras_fuentes)
+        print("Datos y reglas sin cambios, se mantiene el motor vigente")
+        return True
+    
+    # Guardar las fuentes con copia en caché que cambiaron (antes de abrir el
+    # snapshot, que así deja de estar vigente) y usar la copia de las que fallaron
+    datos_fuentes, otras_fuentes = datos_con_cache(otras_fuentes)
+    
+    # 0. Abrir el snapshot binario (un único mmap, sin parsear JSON) si está vigente.
+    # El anterior no se cierra: lo siguen leyendo las tablas de los motores
+    # que todavía atienden sesiones, y se libera cuando ya nadie lo usa
+    snapshot_datos = abrir_snapshot()
+    tablas_snapshot = snapshot_datos.tablas() if snapshot_datos else None
+    if snapshot_datos:
+        print("Snapshot binario vigente abierto")
+    
     # 1. Cargar reglas de la base de conocimiento
-    if not cargar_reglas_desde_json():
+    try:
+        reglas_fuente = snapshot_datos.reglas() if snapshot_datos else cargar_reglas()
+    except Exception as e:
+        print(f"Error cargando reglas desde JSON: {e}")
         print("Error crítico: No se pudieron cargar las reglas del sistema")
         return False
     
     # 2. Cargar datos AREF (hechos provinciales)
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    try:
-        with open(os.path.join(current_dir, 'data', 'aref.json'), 'r') as f:
-            datos_aref = json.load(f)
-        print("Datos AREF cargados correctamente")
-    except Exception as e:
-        print(f"Error al cargar aref.json: {e}")
-        datos_aref = {}
-    
-    # 3. Intentar obtener datos actualizados de la web (hechos nacionales)
-    print("Obteniendo datos actualizados de ARCA...")
-    datos_web_cat, datos_web_pagos = obtener_datos_monotributo_web()
+    if snapshot_datos:
+        datos_aref = tablas_snapshot.aref
+    else:
+        try:
+            with open(os.path.join(current_dir, 'data', 'aref.json'), 'r') as f:
+                datos_aref = json.load(f)
+            print("Datos AREF cargados correctamente")
+        except Exception as e:
+            print(f"Error al cargar aref.json: {e}")
+            datos_aref = {}
+    aref_cambiado = otras_fuentes.get("aref") is not None and otras_fuentes["aref"].estado == "cambiado"
+    if datos_fuentes.get("aref"):
+        datos_aref = datos_fuentes["aref"]
     
-    if datos_web_cat and datos_web_pagos:
-        datos_categorias = datos_web_cat
-        datos_pagos = datos_web_pagos
-        guardar_datos_json_locales(datos_categorias, datos_pagos)
+    # 3. Datos actualizados de la web (hechos nacionales), si la página cambió
+    # Los datos reflejan lo que hay en disco (y se pueden compilar al snapshot)
+    # salvo que vengan de la web y no se hayan podido guardar
+    datos_en_disco = True
+    sin_cambios = resultado_scraping.estado == "sin_cambios"
+    if resultado_scraping.estado == "cambiado":
+        datos_categorias = resultado_scraping.categorias
+        datos_pagos = resultado_scraping.pagos
+        datos_en_disco = guardar_datos_json_locales(datos_categorias, datos_pagos, datos_aref)
         print("Datos del Monotributo actualizados desde ARCA")
+    elif snapshot_datos:
+        datos_categorias = tablas_snapshot.categorias
+        datos_pagos = tablas_snapshot.pagos
+        print("Datos de ARCA sin cambios, usando el snapshot binario" if sin_cambios
+              else "Fallo la conexión web, usando datos del snapshot binario")
     else:
-        # Si falla, intentar cargar datos locales
-        print("Fallo la conexión web, cargando datos locales...")
+        # Sin cambios o si falla, cargar datos locales
+        print("Datos de ARCA sin cambios, cargando datos locales..." if sin_cambios
+              else "Fallo la conexión web, cargando datos locales...")
         datos_local_cat, datos_local_pagos = cargar_datos_json_locales()
         if datos_local_cat and datos_local_pagos:
             datos_categorias = datos_local_cat
             datos_pagos = datos_local_pagos
             print("Datos locales del Monotributo cargados")
+            # Sembrar el historial con los datos locales si todavía está vacío
+            historial = obtener_historial()
+            if not historial.versiones():
+                historial.registrar_version(datos_categorias, datos_pagos, datos_aref,
+                                            fecha_vigencia=obtener_fecha_actualizacion_local(),
+                                            fuente="Datos locales")
         else:
             datos_categorias = {"servicios": {}, "venta": {}}
             datos_pagos = {"servicios": {}, "venta": {}}
             print("Usando datos por defecto")
+    if aref_cambiado and resultado_scraping.estado != "cambiado":
+        # Sólo cambió AREF: registrar la nueva versión en el historial
+        obtener_historial().registrar_version(datos_categorias, datos_pagos, datos_aref, fuente="AREF")
+    ultimo_scraping = registrar_scraping(resultado_scraping, huellas_confirmadas=datos_en_disco, fuentes=otras_fuentes)
     
-    # 4. Actualizar pregunta dinámica del precio unitario
-    try:
-        precio_max = datos_categorias["venta"]["A"]["precio_unitario_maximo"]
-        # Actualizar la regla dinámicamente
-        if "actividad_servicios_NO" in knowledge_base:
-            knowledge_base["actividad_servicios_NO"]["action"]["pregunta"]["texto"] = f"¿El precio unitario de los productos que vas a vender supera los ${precio_max:,.2f}?"
-            print(f"Pregunta de precio unitario actualizada: ${precio_max:,.2f}")
-    except Exception as e:
-        print(f"Error actualizando pregunta de precio unitario: {e}")
+    # Recompilar el snapshot si no había uno vigente o las fuentes cambiaron
+    if datos_en_disco and (snapshot_datos is None or not snapshot_datos.vigente()):
+        try:
+            snapshot_datos = abrir_snapshot(compilar_snapshot(datos_categorias, datos_pagos, datos_aref, reglas_fuente))
+            tablas_snapshot = snapshot_datos.tablas()
+            datos_categorias, datos_pagos, datos_aref = tablas_snapshot.categorias, tablas_snapshot.pagos, tablas_snapshot.aref
+        except Exception as e:
+            print(f"No se pudo compilar el snapshot binario: {e}")
+            snapshot_datos = tablas_snapshot = None
+    
+    # 4. Construir las tablas normalizadas (incluye la matriz de pagos precalculada):
+    # directamente sobre el snapshot si los datos son los suyos
+    if tablas_snapshot is not None and (datos_categorias, datos_pagos, datos_aref) == \
+            (tablas_snapshot.categorias, tablas_snapshot.pagos, tablas_snapshot.aref):
+        tablas_actuales = tablas_snapshot
+    else:
+        tablas_actuales = construir_tablas(datos_categorias, datos_pagos, datos_aref)
+    tablas_a_fecha.cache_clear()
+    print(f"Matriz de pagos precalculada: {len(tablas_actuales.matriz_pagos['resultados'])} combinaciones")
+    
+    # 5. Crear el motor de inferencia sobre las reglas y las tablas vigentes
+    publicar_motor(MotorInferencia(reglas_fuente, tablas_actuales, tablas_por_fecha=tablas_a_fecha, verbose=True))
+    print(f"Cargadas {len(motor.knowledge_base)} reglas desde rules.json")
     
     print("Sistema experto inicializado correctamente")
     return True
 
+async def volcar_registros_periodico():
+    """
+    Vuelca la analítica (y la captura de tráfico, si está activa) cada
+    INTERVALO_VOLCADO_ANALITICA segundos y compacta los días cerrados
+    """
+    dia_compactado = None
+    while True:
+        await asyncio.sleep(INTERVALO_VOLCADO_ANALITICA)
+        await asyncio.to_thread(analitica.volcar)
+        if captura:
+            await asyncio.to_thread(captura.volcar)
+        dia = time.strftime("%Y-%m-%d")
+        if dia != dia_compactado:
+            dia_compactado = dia
+            await asyncio.to_thread(analitica.compactar)
+
+async def checkpoint_periodico():
+    """Guarda en disco, cada INTERVALO_CHECKPOINT_SESIONES segundos, las sesiones modificadas"""
+    while True:
+        await asyncio.sleep(INTERVALO_CHECKPOINT_SESIONES)
+        await asyncio.to_thread(sesiones.checkpoint)
+
+def huella_archivo_reglas():
+    try:
+        estado_archivo = os.stat(RUTA_REGLAS)
+    except OSError:
+        return None
+    return (estado_archivo.st_mtime_ns, estado_archivo.st_size)
+
+def recargar_reglas():
+    """
+    Relee sólo rules.json y, si es válido y cambió, publica un motor con la
+    nueva versión de reglas (recompilando sólo las reglas modificadas) sobre
+    las tablas del motor vigente al publicarlo. Las sesiones en curso siguen
+    con la versión con la que empezaron. Se llama con lock_actualizacion
+    tomado (ver vigilar_reglas).
+    """
+    global reglas_fuente
+    actual = obtener_motor()
+    try:
+        reglas = cargar_reglas()
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ rules.json ilegible, se mantiene la versión {actual.version_reglas}: {e}")
+        return False
+    errores = validar_reglas(reglas)
+    if errores:
+        print(f"❌ rules.json inválido, se mantiene la versión {actual.version_reglas}:")
+        for error in errores:
+            print(f"   - {error}")
+        return False
+    if version_reglas(reglas) == actual.version_reglas:
+        return False
+
+    nuevo = actual.con_reglas(reglas)
+    while not publicar_motor(nuevo, reemplaza=actual):
+        # Se publicó otro motor mientras se compilaba: recompilar sobre sus tablas
+        actual = obtener_motor()
+        nuevo = actual.con_reglas(reglas)
+    reglas_fuente = reglas
+    print(f"🔁 Reglas recargadas: versión {nuevo.version_reglas} "
+          f"({len(nuevo.reglas_recompiladas)} de {len(nuevo.knowledge_base)} reglas recompiladas)")
+    return True
+
+async def vigilar_reglas():
+    """Recarga las reglas cuando cambia rules.json (revisión cada INTERVALO_VIGILANCIA_REGLAS segundos)"""
+    huella = huella_archivo_reglas()
+    while True:
+        await asyncio.sleep(INTERVALO_VIGILANCIA_REGLAS)
+        nueva_huella = huella_archivo_reglas()
+        if nueva_huella != huella:
+            huella = nueva_huella
+            async with lock_actualizacion:
+                await asyncio.to_thread(recargar_reglas)
+
 @app.on_event("startup")
 async def startup_event():
-    inicializar_datos()
+    global tarea_checkpoint, tarea_vigilancia_reglas, tarea_volcado
+    await actualizar_desde_fuentes()
+    inicializar_recursos_estaticos()
+    tarea_checkpoint = asyncio.create_task(checkpoint_periodico())
+    tarea_volcado = asyncio.create_task(volcar_registros_periodico())
+    if "CLAVE_TOKENS_SESION" not in os.environ:
+        print("⚠️  Sin CLAVE_TOKENS_SESION: los tokens del modo sin estado sólo valen en este proceso")
+    if captura:
+        print(f"📼 Capturando el tráfico de la entrevista en {captura.ruta}"
+              f"{' (anonimizado)' if captura.anonimizar else ''}")
+    tarea_vigilancia_reglas = asyncio.create_task(vigilar_reglas())
 
-# Inicializar datos al importar el módulo
-if __name__ != "__main__":
-    inicializar_datos()
+@app.on_event("shutdown")
+async def shutdown_event():
+    # uvicorn ejecuta este evento al recibir SIGTERM/SIGINT
+    for tarea in (tarea_checkpoint, tarea_vigilancia_reglas, tarea_volcado):
+        if tarea:
+            tarea.cancel()
+    escritas = sesiones.checkpoint()
+    print(f"💾 Checkpoint de sesiones al apagar: {escritas} sesiones guardadas")
+    analitica.volcar()
+    if captura:
+        captura.volcar()
+    await cerrar_cliente()
+
+def resolver_fecha_vigencia(fecha_vigencia):
+    """Valida una fecha de vigencia y verifica que haya datos históricos para ella"""
+    try:
+        return obtener_motor().resolver_fecha_vigencia(fecha_vigencia)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Fecha de vigencia inválida: {fecha_vigencia}")
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def parametros_no_predeterminados(**parametros):
+    """Parámetros de URL con un valor distinto del predeterminado (para la captura de tráfico)"""
+    return {nombre: valor for nombre, valor in parametros.items() if valor}
 
 @app.post("/iniciar_sesion")
-async def iniciar_sesion():
-    """Inicia una nueva sesión del sistema experto"""
+async def iniciar_sesion(fecha_vigencia: Optional[str] = None, anticipar: bool = False, compacto: bool = False,
+                         sin_estado: bool = False, jurisdiccion: Optional[str] = None):
+    """
+    Inicia una nueva sesión del sistema experto (opcionalmente evaluada a una fecha histórica).
+    Con anticipar=true incluye el paso siguiente para cada opción de la primera pregunta
+    (en formato compacto con compacto=true).
+
+    Con sin_estado=true la sesión no se guarda en el servidor: la respuesta
+    incluye un "token" firmado con el estado, que se envía a POST /responder.
+
+    Con jurisdiccion=<id> la sesión usa las reglas y la tabla provincial de
+    esa jurisdicción (ver /info_sistema); sin ella, las de la predeterminada.
+    Las fechas históricas y el modo sin estado son sólo de la predeterminada.
+    """
     from uuid import uuid4
-    sesion_id = str(uuid4())
-    sesiones[sesion_id] = {
-        "estado": "inicio",
-        "respuestas": {},
-        "categoria_actual": None,
-        "tipo_actividad": None,
-        "applied_rules": []  # Lista de reglas aplicadas para explicación
-    }
-    
-    return {
-        "sesion_id": sesion_id,
-        "siguiente_pregunta": {
-            "id": "persona_juridica",
-            "texto": "¿Sos persona jurídica (empresa o sociedad)?",
-            "opciones": ["SÍ", "NO (Persona Física)"],
-            "tipo": "opcion"
+    if jurisdiccion == JURISDICCION_PREDETERMINADA:
+        jurisdiccion = None
+    if jurisdiccion and (sin_estado or fecha_vigencia):
+        raise HTTPException(status_code=400,
+                            detail=f"sin_estado y fecha_vigencia no están disponibles para la jurisdicción {jurisdiccion}")
+    if fecha_vigencia:
+        fecha_vigencia = resolver_fecha_vigencia(fecha_vigencia)
+    motor_sesion = await motor_jurisdiccion(jurisdiccion) or obtener_motor()
+    async with admitir("nueva_sesion"):
+        estado, paso = motor_sesion.iniciar(fecha_vigencia)
+        if jurisdiccion:
+            estado["jurisdiccion"] = jurisdiccion
+        estado["secuencia"] = 0  # Cantidad de respuestas procesadas
+        estado["ultima_respuesta"] = None  # Última respuesta procesada, para reintentos idempotentes
+        estado["iniciada"] = time.time()
+
+        if sin_estado:
+            sesion_id = nuevo_sesion_id()
+        else:
+            sesion_id = str(uuid4())
+            sesiones.guardar(sesion_id, estado)
+        analitica.inicio(sesion_id, estado, paso)
+        if captura and not sin_estado:
+            captura.iniciar(sesion_id, parametros_no_predeterminados(fecha_vigencia=fecha_vigencia, anticipar=anticipar,
+                                                                     compacto=compacto, jurisdiccion=jurisdiccion),
+                            estado, paso)
+
+        respuesta = {
+            "sesion_id": sesion_id,
+            "secuencia": 0,
+            "siguiente_pregunta": paso["pregunta"]
         }
-    }
+        if sin_estado:
+            respuesta["token"] = codificadores_tokens[estado["version_reglas"]].codificar(sesion_id, estado)
+        if anticipar:
+            siguientes = await asyncio.to_thread(preparar_respuesta, estado, paso, anticipar, compacto)
+            respuesta["siguientes"] = siguientes["siguientes"]
+        return respuesta
 
 # =====================================================================================
 # MOTOR DE INFERENCIA - SISTEMA EXPERTO
 # =====================================================================================
 
-def evaluar_condicion(rule_name, rule, estado, respuesta, valor_numerico=None):
-    """Evalúa si una regla se activa basada en su condición"""
-    condition = rule["condition"]
-    
-    print(f"  Condición: {condition}")
-    
-    # Verificar coincidencia de pregunta_id
-    if "pregunta_id" in condition:
-        if respuesta.pregunta_id != condition["pregunta_id"]:
-            print(f"  Pregunta ID no coincide: {respuesta.pregunta_id} != {condition['pregunta_id']}")
-            return False
-        print(f"  Pregunta ID coincide: {respuesta.pregunta_id}")
-    
-    # Verificar patrón de pregunta (para preguntas dinámicas)
-    if "pregunta_pattern" in condition:
-        if not respuesta.pregunta_id.startswith(condition["pregunta_pattern"]):
-            print(f"  Patrón no coincide: {respuesta.pregunta_id} no empieza con {condition['pregunta_pattern']}")
-            return False
-        print(f"  Patrón coincide: {respuesta.pregunta_id}")
-    
-    # Verificar respuesta exacta
-    if "respuesta" in condition:
-        if respuesta.respuesta != condition["respuesta"]:
-            print(f"  Respuesta no coincide: '{respuesta.respuesta}' != '{condition['respuesta']}'")
-            return False
-        print(f"  Respuesta coincide: '{respuesta.respuesta}'")
-    
-    # Evaluar función de evaluación personalizada
-    if "eval_func" in condition:
+@app.post("/responder/{sesion_id}")
+async def procesar_respuesta(sesion_id: str, respuesta: RespuestaUsuario, anticipar: bool = False,
+                             compacto: bool = False):
+    """
+    Motor de Inferencia - Procesa la respuesta del usuario consultando la Base de Conocimiento.
+
+    Las respuestas de una misma sesión se serializan con su lock. Si se envía
+    el número de secuencia, un reintento de la última respuesta devuelve el
+    resultado ya calculado, y una respuesta fuera de orden se rechaza con 409.
+
+    Con anticipar=true, si el resultado es una pregunta de opciones se agrega
+    en "siguientes" el paso que seguiría a cada opción, para que el cliente
+    pueda mostrarlo sin esperar la ida y vuelta.
+
+    Con compacto=true los resultados llevan sólo identificadores de mensaje y
+    de reglas y los valores calculados; los textos están en /catalogo.
+
+    Pasa por el control de admisión con prioridad sobre las sesiones nuevas;
+    si el servicio está sobrecargado responde 503 con Retry-After.
+    """
+    async with admitir("respuesta"), lock_de_sesion(sesion_id):
+        estado = sesiones.obtener(sesion_id)
+        if estado is None:
+            raise HTTPException(status_code=404, detail="Sesión no encontrada")
+
+        secuencia_actual = estado.get("secuencia", 0)
+        solicitud = respuesta.dict(exclude={"secuencia"})
+
+        if respuesta.secuencia is not None and respuesta.secuencia != secuencia_actual + 1:
+            ultima = estado.get("ultima_respuesta")
+            if respuesta.secuencia == secuencia_actual and ultima and ultima["solicitud"] == solicitud:
+                print(f"Reintento de la respuesta {secuencia_actual} de la sesión {sesion_id[:8]}, se devuelve la ya calculada")
+                return await asyncio.to_thread(preparar_respuesta, estado, ultima["resultado"], anticipar, compacto)
+            raise HTTPException(
+                status_code=409,
+                detail=f"Secuencia inválida: se esperaba {secuencia_actual + 1} y se recibió {respuesta.secuencia}"
+            )
+
+        # El motor trabaja sobre una copia: si la inferencia falla, la sesión queda intacta.
+        # Corre en un hilo para que el event loop siga aceptando (o rechazando) peticiones
+        inicio = time.perf_counter()
+        estado_previo = estado
+        # El motor de una jurisdicción descartada del cache se vuelve a crear fuera del event loop
+        motor_sesion = await motor_jurisdiccion(estado.get("jurisdiccion")) or motor_de(estado)
         try:
-            func = condition["eval_func"]
-            resultado = func(estado, respuesta.respuesta, valor_numerico)
-            return resultado
-        except Exception as e:
-            return False
-    
-    print(f"  Condición cumplida (sin restricciones adicionales)")
-    return True
+            estado, resultado = await asyncio.to_thread(
+                motor_sesion.responder,
+                estado, respuesta.pregunta_id, respuesta.respuesta, respuesta.valor_numerico
+            )
+        except ValueError as e:
+            if captura:
+                captura.responder(sesion_id, parametros_no_predeterminados(anticipar=anticipar, compacto=compacto),
+                                  respuesta.dict(exclude_none=True), 400)
+            raise HTTPException(status_code=400, detail=str(e))
 
-def generar_pregunta_dinamica(tipo_pregunta, categoria_actual, tipo_actividad):
-    """Genera preguntas dinámicas basadas en la categoría actual"""
-    print(f"Generando pregunta dinámica:")
-    print(f"   - tipo_pregunta: {tipo_pregunta}")
-    print(f"   - categoria_actual: {categoria_actual}")
-    print(f"   - tipo_actividad: {tipo_actividad}")
-    print(f"   - datos_categorias disponible: {datos_categorias is not None}")
-    
+        resultado["secuencia"] = secuencia_actual + 1
+        estado["secuencia"] = secuencia_actual + 1
+        estado["ultima_respuesta"] = {"solicitud": solicitud, "resultado": resultado}
+        if sesiones.obtener(sesion_id) is not None:
+            sesiones.guardar(sesion_id, estado)
+        # Los valores numéricos (ingresos, alquileres...) no se registran
+        analitica.respuesta(sesion_id, estado, respuesta.pregunta_id,
+                            respuesta.respuesta if respuesta.valor_numerico is None else None,
+                            resultado, time.perf_counter() - inicio)
+        if captura:
+            captura.responder(sesion_id, parametros_no_predeterminados(anticipar=anticipar, compacto=compacto),
+                              respuesta.dict(exclude_none=True), 200, resultado,
+                              motor_sesion.tablas_de(estado_previo), estado_previo.get("tipo_actividad"))
+        return await asyncio.to_thread(preparar_respuesta, estado, resultado, anticipar, compacto)
+
+def decodificar_token(token):
+    """(codificador, sesion_id, estado) de un token; 400 si es inválido y 410 si su versión fue retirada"""
     try:
-        # Acceder a los datos correctamente (manejar tanto formato directo como con metadatos)
-        if isinstance(datos_categorias, dict):
-            if "datos" in datos_categorias:
-                # Formato con metadatos (cuando se carga desde JSON)
-                limites = datos_categorias["datos"][tipo_actividad][categoria_actual]
-                print(f"   - Usando formato con metadatos")
-            else:
-                # Formato directo (cuando viene del scraper)
-                limites = datos_categorias[tipo_actividad][categoria_actual]
-                print(f"   - Usando formato directo")
-        else:
-            print("Error: datos_categorias no está inicializado correctamente")
-            return None
-        
-        print(f"   - Límites encontrados: {limites}")
-        
-        if tipo_pregunta == "superficie":
-            pregunta = {
-                "id": f"superficie_cat_{categoria_actual}",
-                "texto": f"¿La superficie afectada de tu local supera los {limites['superficie']} m2?",
-                "opciones": ["SÍ (Supera el límite)", "NO (No supera el límite / Desconozco)"],
-                "tipo": "opcion",
-                "categoria_actual": categoria_actual
-            }
-            print(f"Pregunta de superficie generada: {pregunta['texto']}")
-            return pregunta
-        elif tipo_pregunta == "energia":
-            pregunta = {
-                "id": f"energia_cat_{categoria_actual}",
-                "texto": f"¿El consumo de energía eléctrica supera los {limites['energia']} Kw?",
-                "opciones": ["SÍ (Supera el límite)", "NO (No supera el límite / Desconozco)"],
-                "tipo": "opcion",
-                "categoria_actual": categoria_actual
-            }
-            print(f"Pregunta de energía generada: {pregunta['texto']}")
-            return pregunta
-        elif tipo_pregunta == "alquileres":
-            # Formatear el valor de alquileres como moneda
-            alquileres_formateado = f"${limites['alquileres']:,.0f}".replace(',', '.')
-            pregunta = {
-                "id": f"alquileres_cat_{categoria_actual}",
-                "texto": f"¿Los alquileres devengados anuales superan los {alquileres_formateado}?",
-                "opciones": ["SÍ (Supera el límite)", "NO (No supera el límite / Desconozco)"],
-                "tipo": "opcion",
-                "categoria_actual": categoria_actual
-            }
-            print(f"Pregunta de alquileres generada: {pregunta['texto']}")
-            return pregunta
-    except Exception as e:
-        print(f"Error generando pregunta dinámica: {e}")
-        print(f"   - tipo_pregunta: {tipo_pregunta}")
-        print(f"   - categoria_actual: {categoria_actual}")
-        print(f"   - tipo_actividad: {tipo_actividad}")
-        print(f"   - datos_categorias tipo: {type(datos_categorias)}")
-        if isinstance(datos_categorias, dict):
-            print(f"   - claves en datos_categorias: {list(datos_categorias.keys())}")
-        import traceback
-        traceback.print_exc()
-        return None
+        version_reglas_token, _ = versiones_del_token(token)
+        codificador = codificadores_tokens.get(version_reglas_token)
+        if codificador is None:
+            raise TokenRetirado(f"La versión de reglas {version_reglas_token} del token fue retirada")
+        return (codificador, *codificador.decodificar(token))
+    except TokenInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TokenRetirado as e:
+        raise HTTPException(status_code=410, detail=f"{e}; iniciar una sesión nueva")
 
-def ejecutar_accion(rule_name, action, estado, respuesta, valor_numerico=None):
-    """Ejecuta la acción asociada a una regla activada"""
-    tipo_accion = action["tipo"]
-    
-    print(f"EJECUTANDO ACCIÓN:")
-    print(f"   Regla: {rule_name}")
-    print(f"   Tipo: {tipo_accion}")
-    print(f"   Estado actual: {estado}")
-    
-    if tipo_accion == "resultado":
-        return {
-            "tipo": "resultado",
-            "mensaje": action["mensaje"],
-            "detalles": {
-                "razonamiento_aplicado": generar_explicacion_detallada(estado.get("applied_rules", [])),
-                "reglas_raw": estado.get("applied_rules", [])  # Para backward compatibility
-            }
-        }
-    
-    elif tipo_accion == "pregunta":
-        return {
-            "tipo": "pregunta",
-            "pregunta": action["pregunta"]
-        }
-    
-    elif tipo_accion == "pregunta_superficie":
-        categoria_actual = estado.get("categoria_actual", "A")
-        tipo_actividad = estado.get("tipo_actividad", "servicios")
-        print(f"   Generando pregunta de superficie:")
-        print(f"      categoria_actual: {categoria_actual}")
-        print(f"      tipo_actividad: {tipo_actividad}")
-        
-        pregunta = generar_pregunta_dinamica("superficie", categoria_actual, tipo_actividad)
-        if pregunta:
-            print(f"   Pregunta generada exitosamente")
-            return {
-                "tipo": "pregunta",
-                "pregunta": pregunta
-            }
-        else:
-            print(f"   Error: No se pudo generar pregunta")
-            return {
-                "tipo": "error",
-                "mensaje": "Error generando pregunta de superficie"
-            }
-    
-    elif tipo_accion == "pregunta_energia":
-        categoria_actual = estado.get("categoria_actual", "A")
-        tipo_actividad = estado.get("tipo_actividad", "servicios")
-        pregunta = generar_pregunta_dinamica("energia", categoria_actual, tipo_actividad)
-        if pregunta:
-            return {
-                "tipo": "pregunta",
-                "pregunta": pregunta
-            }
-        else:
-            return {
-                "tipo": "error",
-                "mensaje": "Error generando pregunta de energía"
-            }
-    
-    elif tipo_accion == "pregunta_alquileres":
-        categoria_actual = estado.get("categoria_actual", "A")
-        tipo_actividad = estado.get("tipo_actividad", "servicios")
-        pregunta = generar_pregunta_dinamica("alquileres", categoria_actual, tipo_actividad)
-        if pregunta:
-            return {
-                "tipo": "pregunta",
-                "pregunta": pregunta
-            }
-        else:
-            return {
-                "tipo": "error",
-                "mensaje": "Error generando pregunta de alquileres"
-            }
-    
-    elif tipo_accion == "avanzar_categoria":
-        # Verificar si se puede avanzar o se debe ir a régimen general
-        if estado.get("excede_parametros"):
-            return {
-                "tipo": "resultado",
-                "mensaje": "Régimen General (Excede límites de parámetros)",
-                "detalles": {
-                    "razonamiento_aplicado": generar_explicacion_detallada(estado.get("applied_rules", [])),
-                    "reglas_raw": estado.get("applied_rules", [])
-                }
-            }
-        else:
-            # Generar la siguiente pregunta del mismo tipo de parámetro
-            parametro = action["parametro"]
-            categoria_actual = estado.get("categoria_actual", "A")
-            tipo_actividad = estado.get("tipo_actividad", "servicios")
-            
-            if parametro == "superficie":
-                pregunta = generar_pregunta_dinamica("superficie", categoria_actual, tipo_actividad)
-            elif parametro == "energia":
-                pregunta = generar_pregunta_dinamica("energia", categoria_actual, tipo_actividad)
-            elif parametro == "alquileres":
-                pregunta = generar_pregunta_dinamica("alquileres", categoria_actual, tipo_actividad)
-            
-            if pregunta:
-                return {
-                    "tipo": "pregunta",
-                    "pregunta": pregunta
-                }
-            else:
-                return {
-                    "tipo": "resultado",
-                    "mensaje": "Régimen General (Excede límites de parámetros)",
-                    "detalles": {
-                        "razonamiento_aplicado": generar_explicacion_detallada(estado.get("applied_rules", [])),
-                        "reglas_raw": estado.get("applied_rules", [])
-                    }
-                }
-    
-    elif tipo_accion == "resultado_final":
-        # Generar resultado final con la información calculada
-        if "error" in estado:
-            return {
-                "tipo": "error",
-                "mensaje": estado["error"],
-                "detalles": {
-                    "razonamiento_aplicado": generar_explicacion_detallada(estado.get("applied_rules", [])),
-                    "reglas_raw": estado.get("applied_rules", [])
-                }
-            }
-        elif "resultado_final" in estado:
-            resultado = estado["resultado_final"]
-            return {
-                "tipo": "resultado",
-                "mensaje": f"Te corresponde la Categoría {resultado['categoria']}",
-                "detalles": {
-                    **resultado,
-                    "razonamiento_aplicado": generar_explicacion_detallada(estado.get("applied_rules", [])),
-                    "reglas_raw": estado.get("applied_rules", [])
-                }
-            }
-        else:
-            return {
-                "tipo": "error",
-                "mensaje": "Error al calcular el resultado final",
-                "detalles": {
-                    "razonamiento_aplicado": generar_explicacion_detallada(estado.get("applied_rules", [])),
-                    "reglas_raw": estado.get("applied_rules", [])
-                }
-            }
-    
-    return None
+@app.post("/responder")
+async def procesar_respuesta_sin_estado(respuesta: RespuestaConToken, anticipar: bool = False,
+                                        compacto: bool = False):
+    """
+    Motor de Inferencia sin estado en el servidor: procesa una respuesta de
+    una sesión iniciada con sin_estado=true. El estado llega en el token y el
+    resultado incluye el token nuevo para la próxima respuesta; cualquier
+    proceso con la misma CLAVE_TOKENS_SESION puede atenderla.
 
-@app.post("/responder/{sesion_id}")
-async def procesar_respuesta(sesion_id: str, respuesta: RespuestaUsuario):
-    """Motor de Inferencia - Procesa la respuesta del usuario consultando la Base de Conocimiento"""
-    if sesion_id not in sesiones:
-        raise HTTPException(status_code=404, detail="Sesión no encontrada")
-    
-    estado = sesiones[sesion_id]
-    estado["respuestas"][respuesta.pregunta_id] = respuesta.dict()
-    
-    # Debugging
-    print(f"\n=== MOTOR DE INFERENCIA ===")
-    print(f"Procesando respuesta - ID: {respuesta.pregunta_id}")
-    print(f"Respuesta: {respuesta.respuesta}")
-    if respuesta.valor_numerico:
-        print(f"Valor numérico: {respuesta.valor_numerico}")
-    
-    # Manejar pregunta dinámica para precio unitario
-    if respuesta.pregunta_id == "precio_unitario":
+    Reenviar el mismo token con la misma respuesta devuelve el mismo
+    resultado (los reintentos son idempotentes sin guardar nada). Si se envía
+    el número de secuencia, una respuesta fuera de orden se rechaza con 409.
+    """
+    async with admitir("respuesta"):
+        codificador, sesion_id, estado = decodificar_token(respuesta.token)
+        secuencia_actual = estado["secuencia"]
+        if respuesta.secuencia is not None and respuesta.secuencia != secuencia_actual + 1:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Secuencia inválida: se esperaba {secuencia_actual + 1} y se recibió {respuesta.secuencia}"
+            )
+
+        inicio = time.perf_counter()
         try:
-            # Acceder a los datos correctamente (manejar ambos formatos)
-            if "datos" in datos_categorias:
-                precio_max = datos_categorias["datos"]["venta"]["A"]["precio_unitario_maximo"]
-            else:
-                precio_max = datos_categorias["venta"]["A"]["precio_unitario_maximo"]
-            # Actualizar la regla dinámicamente
-            knowledge_base["actividad_servicios_NO"]["action"]["pregunta"]["texto"] = f"¿El precio unitario de los productos que vas a vender supera los ${precio_max:,.2f}?"
-        except:
-            pass
-    
-    # MOTOR DE INFERENCIA: Consultar la Base de Conocimiento
-    # Priorizar reglas de respuesta exacta sobre reglas con funciones de evaluación
-    reglas_ordenadas = []
-    reglas_con_funciones = []
-    
-    for rule_name, rule in knowledge_base.items():
-        if "eval_func" in rule["condition"]:
-            reglas_con_funciones.append((rule_name, rule))
-        else:
-            reglas_ordenadas.append((rule_name, rule))
-    
-    # Evaluar primero reglas exactas, luego reglas con funciones
-    reglas_ordenadas.extend(reglas_con_funciones)
-    
-    for rule_name, rule in reglas_ordenadas:
-        # Evaluar si la regla se activa
-        if evaluar_condicion(rule_name, rule, estado, respuesta, respuesta.valor_numerico):
-            
-            print(f"REGLA ACTIVADA: {rule_name}")
-            print(f"   Acción: {rule['action']['tipo']}")
-            if 'post_action_func' in rule:
-                print(f"   Post-action: {rule['post_action_func']}")
-            
-            # Registrar la regla aplicada para explicación
-            estado["applied_rules"].append(rule_name)
-            
-            # Ejecutar post_action_func si existe
-            if "post_action_func" in rule:
-                try:
-                    func = rule["post_action_func"]
-                    # Si es un string, buscar la función en FUNCTION_MAP
-                    if isinstance(func, str):
-                        print(f"Ejecutando post_action_func (por nombre): {func}")
-                        func = FUNCTION_MAP.get(func)
-                    else:
-                        print(f"Ejecutando post_action_func (función directa): {func}")
-                    
-                    if func and callable(func):
-                        if respuesta.valor_numerico is not None:
-                            estado = func(estado, respuesta.valor_numerico)
-                        else:
-                            estado = func(estado, respuesta.respuesta)
-                        print(f"Post-action ejecutada correctamente")
-                        print(f"   Estado actualizado: categoria_actual = {estado.get('categoria_actual', 'NO ESTABLECIDA')}")
-                    else:
-                        print(f"Función post_action no encontrada o no es callable: {rule['post_action_func']}")
-                        print(f"   Tipo: {type(rule['post_action_func'])}")
-                        if isinstance(rule['post_action_func'], str):
-                            print(f"   Funciones disponibles: {list(FUNCTION_MAP.keys())}")
-                except Exception as e:
-                    print(f"Error ejecutando post_action: {e}")
-                    import traceback
-                    traceback.print_exc()
-            
-            # Ejecutar la acción principal
-            print(f"Ejecutando acción principal: {rule['action']['tipo']}")
-            resultado = ejecutar_accion(rule_name, rule["action"], estado, respuesta, respuesta.valor_numerico)
-            
-            if resultado:
-                print(f"Acción ejecutada, retornando resultado")
-                return resultado
-            else:
-                print(f"Acción no retornó resultado")
-    
-    # Si ninguna regla se activó, es un error
-    print(f"Ninguna regla se activó para pregunta_id: {respuesta.pregunta_id}, respuesta: {respuesta.respuesta}")
-    raise HTTPException(status_code=400, detail=f"Pregunta no reconocida o secuencia inválida. ID: {respuesta.pregunta_id}, Respuesta: {respuesta.respuesta}")
+            estado, resultado = await asyncio.to_thread(
+                codificador.motor.responder,
+                estado, respuesta.pregunta_id, respuesta.respuesta, respuesta.valor_numerico
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        resultado["secuencia"] = secuencia_actual + 1
+        estado["secuencia"] = secuencia_actual + 1
+        analitica.respuesta(sesion_id, estado, respuesta.pregunta_id,
+                            respuesta.respuesta if respuesta.valor_numerico is None else None,
+                            resultado, time.perf_counter() - inicio)
+        preparada = await asyncio.to_thread(preparar_respuesta, estado, resultado, anticipar, compacto)
+        return {**preparada, "token": codificador.codificar(sesion_id, estado)}
+
+def preparar_respuesta(estado, resultado, anticipar=False, compacto=False):
+    """Agrega los pasos anticipados de la pregunta, si se pidieron, y compacta la respuesta"""
+    motor = motor_de(estado)
+    if anticipar and resultado.get("tipo") == "pregunta":
+        siguientes = motor.anticipar(estado, resultado["pregunta"])
+        if compacto:
+            siguientes = {opcion: motor.compactar(paso) for opcion, paso in siguientes.items()}
+        resultado = {**resultado, "siguientes": siguientes}
+    return motor.compactar(resultado) if compacto else resultado
 
 # =====================================================================================
 # FIN DEL MOTOR DE INFERENCIA
 # =====================================================================================
 
+# =====================================================================================
+# CANAL WEBSOCKET DE LA ENTREVISTA
+# =====================================================================================
+
+# Cada cuántos segundos sin mensajes el servidor envía un latido ("ping")
+INTERVALO_LATIDO_WS = 15
+# Segundos sin ningún mensaje del cliente tras los cuales la sesión expira
+EXPIRACION_WS = 45
+# Mensajes recibidos pendientes de procesar; con la cola llena se deja de leer el socket
+MAXIMO_MENSAJES_PENDIENTES_WS = 8
+
+def error_ws(status_code, detail):
+    return {"tipo": "error", "status": status_code, "detail": detail}
+
+async def responder_mensaje_ws(sesion_id, mensaje, anticipar, compacto):
+    """Procesa una respuesta recibida por WebSocket con el mismo motor que /responder"""
+    if not isinstance(mensaje, dict):
+        return error_ws(422, "El mensaje debe ser un objeto JSON")
+    try:
+        respuesta = RespuestaUsuario(**mensaje)
+    except ValidationError as e:
+        return error_ws(422, json.loads(e.json()))
+    try:
+        return await procesar_respuesta(sesion_id, respuesta, anticipar, compacto)
+    except HTTPException as e:
+        error = error_ws(e.status_code, e.detail)
+        if e.headers and "Retry-After" in e.headers:
+            error["reintentar_en"] = int(e.headers["Retry-After"])
+        return error
+
+@app.websocket("/ws/entrevista")
+async def entrevista_websocket(websocket: WebSocket, sesion_id: Optional[str] = None,
+                               anticipar: bool = False, compacto: bool = False,
+                               fecha_vigencia: Optional[str] = None, jurisdiccion: Optional[str] = None):
+    """
+    Entrevista completa sobre una única conexión WebSocket.
+
+    Sin sesion_id se inicia una sesión nueva; con sesion_id se retoma una
+    existente. El cliente envía las mismas respuestas que a /responder
+    ({"pregunta_id", "respuesta", "valor_numerico", "secuencia"}) y recibe los
+    mismos resultados, o {"tipo": "error", "status", "detail"}.
+
+    Latidos: sin tráfico, el servidor envía {"tipo": "ping"} cada
+    INTERVALO_LATIDO_WS segundos y el cliente contesta {"tipo": "pong"} (el
+    cliente también puede enviar "ping"). Si el cliente no envía nada durante
+    EXPIRACION_WS segundos, la sesión expira y se cierra la conexión.
+    """
+    await websocket.accept()
+
+    if sesion_id:
+        estado = sesiones.obtener(sesion_id)
+        if estado is None:
+            await websocket.send_json(error_ws(404, "Sesión no encontrada"))
+            await websocket.close(code=1008)
+            return
+        inicio = {"sesion_id": sesion_id, "secuencia": estado.get("secuencia", 0)}
+        if estado.get("ultima_respuesta"):
+            inicio["ultimo_resultado"] = await asyncio.to_thread(
+                preparar_respuesta, estado, estado["ultima_respuesta"]["resultado"], anticipar, compacto
+            )
+    else:
+        try:
+            inicio = await iniciar_sesion(fecha_vigencia=fecha_vigencia, anticipar=anticipar, compacto=compacto,
+                                          jurisdiccion=jurisdiccion)
+        except HTTPException as e:
+            await websocket.send_json(error_ws(e.status_code, e.detail))
+            await websocket.close(code=1008)
+            return
+        sesion_id = inicio["sesion_id"]
+
+    await websocket.send_json({"tipo": "sesion", **inicio})
+
+    loop = asyncio.get_running_loop()
+    cola = asyncio.Queue(maxsize=MAXIMO_MENSAJES_PENDIENTES_WS)
+    ultima_actividad = loop.time()
+
+    async def recibir():
+        nonlocal ultima_actividad
+        try:
+            while True:
+                texto = await websocket.receive_text()
+                ultima_actividad = loop.time()
+                try:
+                    mensaje = json.loads(texto)
+                except json.JSONDecodeError:
+                    mensaje = None
+                if isinstance(mensaje, dict) and mensaje.get("tipo") == "pong":
+                    continue
+                # Con la cola llena esta espera deja de leer el socket, y el
+                # control de flujo de TCP frena al cliente (backpressure)
+                await cola.put(mensaje if mensaje is not None else {"tipo": "invalido"})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await cola.put(None)
+
+    receptor = asyncio.create_task(recibir())
+    try:
+        while True:
+            try:
+                mensaje = await asyncio.wait_for(cola.get(), timeout=INTERVALO_LATIDO_WS)
+            except asyncio.TimeoutError:
+                if loop.time() - ultima_actividad > EXPIRACION_WS:
+                    print(f"⏱️  Sesión {sesion_id[:8]} expirada por falta de latidos")
+                    sesiones.eliminar(sesion_id)
+                    await websocket.close(code=1001)
+                    break
+                await websocket.send_json({"tipo": "ping"})
+                continue
+
+            if mensaje is None:
+                # El cliente cerró la conexión; la sesión queda disponible para retomarla
+                break
+            if mensaje.get("tipo") == "ping":
+                await websocket.send_json({"tipo": "pong"})
+            elif mensaje.get("tipo") == "invalido":
+                await websocket.send_json(error_ws(400, "Mensaje JSON inválido"))
+            else:
+                await websocket.send_json(await responder_mensaje_ws(sesion_id, mensaje, anticipar, compacto))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receptor.cancel()
+
 @app.get("/reiniciar/{sesion_id}")
-async def reiniciar_sesion(sesion_id: str):
-    """Reinicia una sesión existente"""
-    if sesion_id in sesiones:
-        del sesiones[sesion_id]
-    return await iniciar_sesion()
+async def reiniciar_sesion(sesion_id: str, anticipar: bool = False, compacto: bool = False):
+    """Reinicia una sesión existente (en la misma jurisdicción)"""
+    estado = sesiones.obtener(sesion_id)
+    sesiones.eliminar(sesion_id)
+    return await iniciar_sesion(anticipar=anticipar, compacto=compacto,
+                                jurisdiccion=estado.get("jurisdiccion") if estado else None)
 
 @app.get("/actualizar_datos")
 async def actualizar_datos():
     """Actualiza los datos del monotributo desde la web"""
-    if inicializar_datos():
-        return {"mensaje": "Datos actualizados correctamente", "reglas_cargadas": len(knowledge_base)}
+    if await actualizar_desde_fuentes():
+        return {"mensaje": "Datos actualizados correctamente", "reglas_cargadas": len(motor.knowledge_base),
+                "scraping": ultimo_scraping}
     else:
         return {"error": "Error al actualizar los datos"}
 
+# Catálogo serializado por versión (es inmutable: cambia de versión si cambian las reglas)
+catalogos_serializados = OrderedDict()
+
+def catalogo_serializado(motor_catalogo):
+    """Devuelve (versión, JSON en bytes) del catálogo de un motor"""
+    catalogo = motor_catalogo.catalogo()
+    version = catalogo["version"]
+    if version not in catalogos_serializados:
+        catalogos_serializados[version] = json.dumps(catalogo, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        while len(catalogos_serializados) > MAXIMO_VERSIONES_REGLAS:
+            catalogos_serializados.popitem(last=False)
+    return version, catalogos_serializados[version]
+
+def respuesta_catalogo(request, motor_catalogo, cache_control):
+    version, contenido = catalogo_serializado(motor_catalogo)
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=contenido, media_type="application/json", headers=headers)
+
+@app.get("/catalogo")
+async def catalogo(request: Request):
+    """Catálogo de textos de reglas y mensajes vigente (revalidable con ETag)"""
+    return respuesta_catalogo(request, obtener_motor(), "no-cache")
+
+@app.get("/catalogo/{version}")
+async def catalogo_version(version: str, request: Request):
+    """Catálogo de una versión (la vigente o la de una sesión en curso): inmutable, cacheable por un año"""
+    obtener_motor()
+    for motor_version in [*motores_publicados(), *reversed(jurisdicciones.motores())]:
+        if motor_version.catalogo()["version"] == version:
+            return respuesta_catalogo(request, motor_version, "public, max-age=31536000, immutable")
+    raise HTTPException(status_code=404, detail=f"Versión de catálogo no disponible: {version}")
+
+@app.post("/simular")
+async def simular(parametros: ParametrosSimulacion):
+    """
+    Simula categoría y pagos sobre rangos o grillas de ingresos y parámetros
+    del local. Hasta MAXIMO_PUNTOS_SIMULACION puntos; el cálculo y la
+    serialización se hacen en un hilo aparte, con la prioridad de las
+    sesiones nuevas en el control de admisión.
+    """
+    def _especificacion(valor):
+        return valor.dict() if isinstance(valor, RangoSimulacion) else valor
+    
+    def _calcular(tablas):
+        resultado = simular_escenarios(
+            tablas.umbrales,
+            tablas.matriz_pagos,
+            parametros.tipo_actividad,
+            ingresos=_especificacion(parametros.ingresos),
+            superficie=_especificacion(parametros.superficie),
+            energia=_especificacion(parametros.energia),
+            alquileres=_especificacion(parametros.alquileres),
+            en_relacion_dependencia=parametros.en_relacion_dependencia,
+            grilla=parametros.grilla,
+            maximo_puntos=MAXIMO_PUNTOS_SIMULACION
+        )
+        respuesta = {
+            **resultado_a_json(resultado),
+            "version_datos": tablas.version,
+            "saltos_de_categoria": saltos_de_categoria(
+                tablas.umbrales, tablas.matriz_pagos, parametros.tipo_actividad,
+                en_relacion_dependencia=parametros.en_relacion_dependencia
+            )
+        }
+        return json.dumps(respuesta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    async with admitir("nueva_sesion"):
+        tablas = (await motor_jurisdiccion(parametros.jurisdiccion) or obtener_motor()).tablas
+        if parametros.fecha_vigencia:
+            if parametros.jurisdiccion and parametros.jurisdiccion != JURISDICCION_PREDETERMINADA:
+                raise HTTPException(status_code=400, detail="fecha_vigencia sólo está disponible para la jurisdicción "
+                                                            f"{JURISDICCION_PREDETERMINADA}")
+            tablas = tablas_a_fecha(resolver_fecha_vigencia(parametros.fecha_vigencia))
+        
+        try:
+            contenido = await asyncio.to_thread(_calcular, tablas)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=contenido, media_type="application/json")
+
+@app.get("/historial_datos")
+async def historial_datos(fecha_vigencia: Optional[str] = None):
+    """Lista las versiones de datos registradas o la vigente a una fecha"""
+    if fecha_vigencia:
+        try:
+            version = obtener_historial().version_a_fecha(fecha_vigencia)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Fecha de vigencia inválida: {fecha_vigencia}")
+        if version is None:
+            raise HTTPException(status_code=404, detail=f"No hay datos vigentes a la fecha {fecha_vigencia}")
+        return version
+    return {"versiones": obtener_historial().versiones()}
+
 @app.get("/info_sistema")
 async def info_sistema():
     """Proporciona información sobre el estado del sistema experto"""
     return {
-        "reglas_cargadas": len(knowledge_base),
-        "reglas_disponibles": list(knowledge_base.keys()),
-        "datos_categorias_disponibles": bool(datos_categorias),
+        "reglas_cargadas": len(motor.knowledge_base) if motor else 0,
+        "version_reglas": motor.version_reglas if motor else None,
+        "reglas_disponibles": list(motor.knowledge_base.keys()) if motor else [],
+        "datos_categorias_disponibles": bool(motor and motor.tablas),
         "datos_pagos_disponibles": bool(datos_pagos),
         "datos_aref_disponibles": bool(datos_aref),
+        "jurisdiccion_predeterminada": JURISDICCION_PREDETERMINADA,
+        "jurisdicciones_disponibles": jurisdicciones.disponibles(),
         "sistema": "Sistema Experto Monotributo v2.0 - Modular"
     }
 
-# Montar la carpeta static para archivos estáticos
+@app.get("/metricas")
+async def metricas():
+    """Métricas de carga: control de admisión (en curso, colas, rechazos), sesiones en memoria, analítica y motores por jurisdicción"""
+    return {
+        "admision": control_admision.metricas(),
+        "sesiones_en_memoria": len(sesiones),
+        "analitica": analitica.metricas(),
+        "jurisdicciones": jurisdicciones.metricas(),
+        **({"captura": captura.metricas()} if captura else {})
+    }
+
+@app.get("/cobertura_reglas")
+async def cobertura_reglas(version: Optional[str] = None):
+    """Disparos, fallos y tiempo de evaluación por regla: calientes, frías, nunca disparadas y orden de los grupos"""
+    motor_cobertura = motores_por_version.get(version) if version else obtener_motor()
+    if motor_cobertura is None:
+        raise HTTPException(status_code=404, detail=f"Versión de reglas no publicada: {version}")
+    return motor_cobertura.cobertura_reglas()
+
+def consultar_analitica(desde, hasta):
+    analitica.volcar()
+    return analitica.agregados(desde, hasta)
+
+@app.get("/analitica")
+async def analitica_entrevistas(desde: Optional[str] = None, hasta: Optional[str] = None):
+    """Agregados de las entrevistas: categorías, abandono por pregunta y duración (p50/p95)"""
+    try:
+        desde = normalizar_fecha(desde) if desde else None
+        hasta = normalizar_fecha(hasta) if hasta else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas inválidas: se esperaba YYYY-MM-DD")
+    return await asyncio.to_thread(consultar_analitica, desde, hasta)
+
+# Lo asignado en los endpoints de la entrevista y en la carga de datos y reglas
+contabilidad_memoria.atribuir("sesiones", iniciar_sesion, procesar_respuesta, procesar_respuesta_sin_estado,
+                              decodificar_token, preparar_respuesta, responder_mensaje_ws, entrevista_websocket)
+contabilidad_memoria.atribuir("knowledge_base", recargar_reglas, catalogo_serializado)
+contabilidad_memoria.atribuir("datos", inicializar_datos, tablas_a_fecha)
+
+def verificar_clave_admin(request):
+    """
+    Los endpoints de administración exigen la cabecera X-Clave-Admin con la
+    clave de CLAVE_ADMIN; sin CLAVE_ADMIN definida no están disponibles (404)
+    """
+    clave = os.environ.get("CLAVE_ADMIN")
+    if not clave:
+        raise HTTPException(status_code=404, detail="Endpoint de administración no habilitado (falta CLAVE_ADMIN)")
+    if not hmac.compare_digest(request.headers.get("x-clave-admin", "").encode('utf-8'), clave.encode('utf-8')):
+        raise HTTPException(status_code=403, detail="Clave de administración inválida")
+
+@app.post("/memoria/muestreo")
+async def muestreo_memoria(request: Request, activo: bool = True, marcos: Optional[int] = None):
+    """Activa (o reconfigura) y desactiva en caliente el muestreo de memoria con tracemalloc"""
+    verificar_clave_admin(request)
+    if marcos is not None and not 1 <= marcos <= 100:
+        raise HTTPException(status_code=400, detail="marcos debe estar entre 1 y 100")
+    if activo:
+        return contabilidad_memoria.activar(marcos)
+    return contabilidad_memoria.desactivar()
+
+@app.get("/memoria")
+async def memoria(request: Request, principales: int = 5, comparar: bool = True):
+    """Memoria viva por subsistema, bytes por sesión y diferencia con la medición anterior"""
+    verificar_clave_admin(request)
+    if not contabilidad_memoria.activo:
+        raise HTTPException(status_code=409, detail="El muestreo de memoria no está activo (POST /memoria/muestreo)")
+    try:
+        return await asyncio.to_thread(contabilidad_memoria.medir, len(sesiones), principales, comparar)
+    except RuntimeError as e:
+        # Muestreo desactivado mientras se medía
+        raise HTTPException(status_code=409, detail=str(e))
+
+# Recursos estáticos y página principal: precomprimidos, con huella y servidos desde memoria
 current_dir = os.path.dirname(os.path.abspath(__file__))
 frontend_static_dir = os.path.join(current_dir, 'frontend', 'static')
 frontend_templates_dir = os.path.join(current_dir, 'frontend', 'templates')
 
-app.mount("/static", StaticFiles(directory=frontend_static_dir), name="static")
+recursos_estaticos = None
+
+def inicializar_recursos_estaticos():
+    """Lee, precomprime y calcula las huellas de los recursos del frontend"""
+    global recursos_estaticos
+    recursos_estaticos = RecursosEstaticos(frontend_static_dir, os.path.join(frontend_templates_dir, 'index.html'))
+    tamanos = recursos_estaticos.resumen()["index.html"]
+    print(f"Recursos estáticos precomprimidos: {len(recursos_estaticos.recursos)} archivos, "
+          f"index.html {tamanos['identity']} B -> {min(tamanos.values())} B")
+
+def respuesta_recurso(request, recurso, cache_control):
+    """Variante según Accept-Encoding, con ETag fuerte y 304 ante If-None-Match"""
+    codificacion, contenido = recurso.variante(request.headers.get("accept-encoding"))
+    etag = recurso.etag(codificacion)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if codificacion != "identity":
+        headers["Content-Encoding"] = codificacion
+    return Response(content=contenido, media_type=recurso.tipo, headers=headers)
+
+@app.api_route("/static/{ruta:path}", methods=["GET", "HEAD"])
+def recurso_estatico(ruta: str, request: Request):
+    """Recurso de frontend/static: inmutable con huella en la URL, revalidable sin ella"""
+    encontrado = recursos_estaticos.buscar(ruta) if recursos_estaticos else None
+    if encontrado is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return respuesta_recurso(request, *encontrado)
 
-@app.get("/")
-def root():
-    return FileResponse(os.path.join(frontend_templates_dir, 'index.html'))
+@app.api_route("/", methods=["GET", "HEAD"])
+def root(request: Request):
+    if recursos_estaticos is None:
+        raise HTTPException(status_code=503, detail="Sistema experto inicializándose")
+    return respuesta_recurso(request, recursos_estaticos.index, "no-cache")
 
 # Punto de entrada para ejecución directa - ACTUALIZACIÓN 7 MODULAR
 if __name__ == "__main__":
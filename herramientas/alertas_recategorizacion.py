@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ALERTAS DE RECATEGORIZACIÓN - SISTEMA EXPERTO MONOTRIBUTO
+=========================================================
+
+Tarea programada sobre el padrón de perfiles (src/padron_perfiles.py):
+
+    1. Si las tablas locales (data/categorias.json) cambiaron desde la última
+       ejecución, recategoriza el padrón re-evaluando sólo los perfiles
+       afectados y lista quiénes cambiaron de categoría.
+    2. Lista quiénes están a menos de --porcentaje del límite de su
+       categoría en ingresos, superficie, energía o alquileres.
+
+Uso:
+    python herramientas/alertas_recategorizacion.py --importar perfiles.csv   # alta/actualización
+    python herramientas/alertas_recategorizacion.py --porcentaje 10 --salida alertas/
+
+El CSV a importar tiene las columnas id, tipo_actividad, ingresos,
+superficie, energia y alquileres (vacío = no aplica). Con --salida se
+escriben cambios_categoria.csv y cercanos_al_limite.csv en esa carpeta.
+
+Para ejecutarla cada día (cron):
+    0 6 * * * cd /ruta/al/proyecto && python herramientas/alertas_recategorizacion.py --salida alertas/
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+
+from data_manager import cargar_tablas_locales
+from padron_perfiles import PARAMETROS, PadronPerfiles
+
+
+# Filas de cada lista que se muestran por pantalla
+MAXIMO_FILAS_MOSTRADAS = 10
+
+
+def escribir(datos, salida, nombre):
+    """Escribe una lista (dict de arrays) como CSV en la carpeta de salida"""
+    if not salida:
+        return
+    os.makedirs(salida, exist_ok=True)
+    ruta = os.path.join(salida, nombre)
+    pd.DataFrame({clave: valores for clave, valores in datos.items() if clave != "evaluados"}).to_csv(ruta, index=False)
+    print(f"💾 {ruta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alertas de recategorización sobre el padrón de perfiles")
+    parser.add_argument("--importar", help="CSV de perfiles a agregar o actualizar")
+    parser.add_argument("--porcentaje", type=float, default=10.0,
+                        help="Margen respecto del límite de la categoría, en %% (por defecto 10)")
+    parser.add_argument("--salida", help="Carpeta donde escribir los CSV de resultados")
+    parser.add_argument("--directorio", help="Carpeta del padrón (por defecto data/perfiles)")
+    args = parser.parse_args()
+
+    tablas = cargar_tablas_locales()
+    if tablas is None:
+        print("❌ No hay tablas locales (data/categorias.json y data/pagos.json)")
+        return 1
+
+    padron = PadronPerfiles(args.directorio)
+    t0 = time.perf_counter()
+    if padron.cargar():
+        print(f"📂 Padrón abierto: {len(padron)} perfiles en {time.perf_counter() - t0:.2f} s")
+    modificado = False
+
+    # 1. Tabla nueva: recategorizar antes de importar (los perfiles nuevos usan la tabla vigente)
+    if padron.desactualizado(tablas):
+        t0 = time.perf_counter()
+        cambios = padron.recategorizar(tablas)
+        modificado = True
+        print(f"🔄 Tabla nueva: {len(cambios['id'])} perfiles cambiaron de categoría "
+              f"({cambios['evaluados']} de {len(padron)} re-evaluados en {time.perf_counter() - t0:.2f} s)")
+        for fila in list(zip(*(cambios[clave] for clave in ("id", "tipo_actividad", "anterior", "nueva"))))[:MAXIMO_FILAS_MOSTRADAS]:
+            print(f"   {fila[0]} ({fila[1]}): {fila[2] or 'Régimen General'} -> {fila[3] or 'Régimen General'}")
+        escribir(cambios, args.salida, "cambios_categoria.csv")
+
+    if args.importar:
+        perfiles = pd.read_csv(args.importar)
+        padron.registrar_columnas(perfiles["id"].to_numpy(), perfiles["tipo_actividad"].to_numpy(), tablas,
+                                  **{campo: perfiles[campo].to_numpy(dtype=float)
+                                     for campo in PARAMETROS if campo in perfiles})
+        modificado = True
+        print(f"📥 {len(perfiles)} perfiles importados de {args.importar} (padrón: {len(padron)})")
+
+    # 2. Perfiles cerca del límite de su categoría
+    t0 = time.perf_counter()
+    cercanos = padron.cercanos(args.porcentaje)
+    print(f"🔔 {len(cercanos['id'])} perfiles a menos del {args.porcentaje:g}% del límite de su categoría "
+          f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+    for fila in list(zip(*(cercanos[clave] for clave in ("id", "tipo_actividad", "categoria", "parametro",
+                                                           "proximidad"))))[:MAXIMO_FILAS_MOSTRADAS]:
+        print(f"   {fila[0]} ({fila[1]}, {fila[2]}): {fila[3]} al {fila[4] * 100:.1f}% del límite")
+    escribir(cercanos, args.salida, "cercanos_al_limite.csv")
+
+    if modificado:
+        padron.guardar()
+        print(f"💾 Padrón guardado en {padron.ruta}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
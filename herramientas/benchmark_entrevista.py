@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK DE LA ENTREVISTA: HTTP vs WEBSOCKET - SISTEMA EXPERTO MONOTRIBUTO
+===========================================================================
+
+Recorre entrevistas completas contra un servidor en marcha, primero con una
+petición HTTP por respuesta (/iniciar_sesion + /responder) y luego sobre una
+única conexión WebSocket (/ws/entrevista), y compara la latencia por
+respuesta y el tiempo total por entrevista. Como referencia, mide también el
+motor de inferencia en proceso (MotorInferencia), sin red ni serialización.
+
+Uso:
+    python herramientas/benchmark_entrevista.py                  # levanta un servidor local
+    python herramientas/benchmark_entrevista.py --url http://host:8000 --entrevistas 200
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+import websockets
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+
+from data_manager import cargar_tablas_locales
+from motor_inferencia import MotorInferencia, cargar_reglas
+
+
+# Respuestas de la entrevista de referencia: servicios, con ingresos y local
+RESPUESTAS = {
+    "persona_juridica": "NO (Persona Física)",
+    "socio_sociedad": "NO",
+    "actividades_diferentes": "NO (3 o menos actividades)",
+    "actividad_servicios": "SÍ (Prestación de Servicios)",
+    "genera_ingresos": "SÍ",
+    "tiene_local": "SÍ (Tiene local)",
+    "relacion_dependencia": "NO",
+}
+INGRESOS_ANUALES = 12_000_000
+
+
+def elegir_respuesta(pregunta, secuencia):
+    """Arma la respuesta a una pregunta según la entrevista de referencia"""
+    if pregunta["tipo"] == "numero":
+        return {"pregunta_id": pregunta["id"], "respuesta": str(INGRESOS_ANUALES),
+                "valor_numerico": INGRESOS_ANUALES, "secuencia": secuencia}
+    # Preguntas de parámetros del local: no supera el límite
+    respuesta = RESPUESTAS.get(pregunta["id"], pregunta["opciones"][-1])
+    return {"pregunta_id": pregunta["id"], "respuesta": respuesta, "secuencia": secuencia}
+
+
+def entrevista_http(sesion, url):
+    """Una entrevista completa por HTTP; devuelve la latencia de cada respuesta"""
+    latencias = []
+    inicio = sesion.post(f"{url}/iniciar_sesion").json()
+    sesion_id = inicio["sesion_id"]
+    paso = {"tipo": "pregunta", "pregunta": inicio["siguiente_pregunta"]}
+    secuencia = 0
+    while paso["tipo"] == "pregunta":
+        secuencia += 1
+        t0 = time.perf_counter()
+        paso = sesion.post(f"{url}/responder/{sesion_id}", json=elegir_respuesta(paso["pregunta"], secuencia)).json()
+        latencias.append(time.perf_counter() - t0)
+    return latencias
+
+
+async def entrevista_websocket(url_ws):
+    """Una entrevista completa sobre una conexión WebSocket; devuelve la latencia de cada respuesta"""
+    latencias = []
+    async with websockets.connect(f"{url_ws}/ws/entrevista") as ws:
+        inicio = json.loads(await ws.recv())
+        paso = {"tipo": "pregunta", "pregunta": inicio["siguiente_pregunta"]}
+        secuencia = 0
+        while paso["tipo"] == "pregunta":
+            secuencia += 1
+            t0 = time.perf_counter()
+            await ws.send(json.dumps(elegir_respuesta(paso["pregunta"], secuencia)))
+            paso = json.loads(await ws.recv())
+            while paso.get("tipo") == "ping":
+                await ws.send(json.dumps({"tipo": "pong"}))
+                paso = json.loads(await ws.recv())
+            latencias.append(time.perf_counter() - t0)
+    return latencias
+
+
+def entrevista_en_proceso(motor):
+    """Una entrevista completa llamando directamente al motor; devuelve la latencia de cada respuesta"""
+    latencias = []
+    estado, paso = motor.iniciar()
+    secuencia = 0
+    while paso["tipo"] == "pregunta":
+        secuencia += 1
+        respuesta = elegir_respuesta(paso["pregunta"], secuencia)
+        t0 = time.perf_counter()
+        estado, paso = motor.responder(estado, respuesta["pregunta_id"], respuesta["respuesta"],
+                                       respuesta.get("valor_numerico"))
+        latencias.append(time.perf_counter() - t0)
+    return latencias
+
+
+def resumen(nombre, latencias_por_entrevista, duracion):
+    latencias = sorted(l * 1000 for entrevista in latencias_por_entrevista for l in entrevista)
+    p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+    print(f"{nombre:<10} entrevistas: {len(latencias_por_entrevista):>5}  "
+          f"respuestas: {len(latencias):>6}  "
+          f"media: {statistics.mean(latencias):7.3f} ms  "
+          f"p50: {statistics.median(latencias):7.3f} ms  "
+          f"p95: {p95:7.3f} ms  "
+          f"entrevistas/s: {len(latencias_por_entrevista) / duracion:8.1f}")
+
+
+def esperar_servidor(url, segundos=30):
+    limite = time.time() + segundos
+    while time.time() < limite:
+        try:
+            requests.get(f"{url}/info_sistema", timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la entrevista por HTTP y por WebSocket")
+    parser.add_argument("--url", help="URL de un servidor en marcha (por defecto se levanta uno local)")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto del servidor local")
+    parser.add_argument("--entrevistas", type=int, default=100, help="Entrevistas por transporte")
+    args = parser.parse_args()
+
+    servidor = None
+    url = args.url
+    if not url:
+        url = f"http://127.0.0.1:{args.puerto}"
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(args.puerto), "--log-level", "warning"],
+            cwd=RAIZ, stdout=subprocess.DEVNULL
+        )
+    url = url.rstrip("/")
+
+    try:
+        if not esperar_servidor(url):
+            print(f"❌ El servidor no responde en {url}")
+            return 1
+
+        print(f"📏 {args.entrevistas} entrevistas por transporte contra {url}")
+
+        with requests.Session() as sesion:
+            entrevista_http(sesion, url)  # calentamiento
+            t0 = time.perf_counter()
+            resultados_http = [entrevista_http(sesion, url) for _ in range(args.entrevistas)]
+            resumen("HTTP", resultados_http, time.perf_counter() - t0)
+
+        async def correr_websocket():
+            url_ws = "ws" + url[len("http"):]
+            await entrevista_websocket(url_ws)  # calentamiento
+            t0 = time.perf_counter()
+            resultados = [await entrevista_websocket(url_ws) for _ in range(args.entrevistas)]
+            return resultados, time.perf_counter() - t0
+
+        resultados_ws, duracion_ws = asyncio.run(correr_websocket())
+        resumen("WebSocket", resultados_ws, duracion_ws)
+
+        motor = MotorInferencia(cargar_reglas(), cargar_tablas_locales())
+        t0 = time.perf_counter()
+        resultados_motor = [entrevista_en_proceso(motor) for _ in range(args.entrevistas)]
+        resumen("En proceso", resultados_motor, time.perf_counter() - t0)
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FUZZING DIFERENCIAL DEL MOTOR DE INFERENCIA - SISTEMA EXPERTO MONOTRIBUTO
+=========================================================================
+
+Genera entrevistas aleatorias válidas (y algunas respuestas inválidas) sobre
+los datos de data/categorias.json, data/pagos.json y data/aref.json, las
+recorre con el motor de referencia (MotorInferencia con FUNCTION_MAP sobre
+las tablas de los JSON) y con un motor alternativo, y compara paso a paso
+preguntas, categorías, pagos y errores.
+
+Los ingresos se eligen sobre todo en los límites de las categorías (justo
+en el límite, apenas por encima y por debajo), donde es más fácil que una
+implementación alternativa se equivoque.
+
+Cuando hay diferencias, cada contraejemplo se reduce ("shrinking") a la
+entrevista más corta y con los valores más simples que sigue mostrando la
+diferencia (para los ingresos, los límites de categoría más cercanos y sus
+vecinos se prueban antes que redondear). Los contraejemplos se agrupan por
+su primer paso distinto: la pregunta y lo que respondió cada motor. Al
+final se informa el rendimiento relativo de los dos motores.
+
+Motores alternativos incluidos:
+    snapshot   Reglas y tablas leídas del snapshot binario (snapshot_binario.py)
+    evaluar    MotorInferencia.evaluar: la entrevista completa de una vez
+
+Un motor propio se indica como modulo:funcion, donde funcion(reglas, tablas)
+devuelve un objeto con iniciar() y responder(estado, pregunta_id, respuesta,
+valor_numerico) como MotorInferencia.
+
+Uso:
+    python herramientas/fuzz_diferencial.py                          # snapshot, 2000 casos
+    python herramientas/fuzz_diferencial.py --alternativo evaluar --casos 10000
+    python herramientas/fuzz_diferencial.py --alternativo mi_motor:crear_motor --semilla 7
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import argparse
+import bisect
+import copy
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+
+from data_manager import cargar_datos_json_locales, cargar_tablas_locales
+from motor_inferencia import MotorInferencia, cargar_reglas
+from snapshot_binario import abrir_snapshot, compilar_snapshot
+
+
+# Pasos como máximo por entrevista (corta ciclos de un motor defectuoso)
+MAXIMO_PASOS = 40
+# Probabilidad de responder una opción inexistente
+PROBABILIDAD_RESPUESTA_INVALIDA = 0.03
+# Contraejemplos que se muestran en detalle
+MAXIMO_CONTRAEJEMPLOS = 5
+# Entrevistas con diferencias que se reducen (para agrupar contraejemplos iguales)
+MAXIMO_REDUCCIONES = 50
+
+
+# =====================================================================================
+# MOTORES
+# =====================================================================================
+
+def motor_referencia(reglas, tablas):
+    return MotorInferencia(reglas, tablas)
+
+
+def motor_snapshot(reglas, tablas):
+    """MotorInferencia sobre las reglas y tablas de un snapshot binario compilado de los JSON"""
+    categorias, pagos = cargar_datos_json_locales()
+    with open(os.path.join(RAIZ, 'data', 'aref.json'), 'r', encoding='utf-8') as f:
+        aref = json.load(f)
+    ruta = os.path.join(tempfile.mkdtemp(prefix="fuzz_snapshot_"), "snapshot.bin")
+    compilar_snapshot(categorias, pagos, aref, reglas, ruta_destino=ruta)
+    snapshot = abrir_snapshot(ruta, verificar_vigencia=False)
+    return MotorInferencia(snapshot.reglas(), snapshot.tablas())
+
+
+class MotorEvaluar:
+    """
+    Adapta MotorInferencia.evaluar (entrevista completa de una vez) a la
+    interfaz paso a paso: cada respuesta reevalúa la entrevista acumulada.
+    """
+
+    def __init__(self, reglas, tablas):
+        self.motor = MotorInferencia(reglas, tablas)
+
+    def iniciar(self):
+        estado, paso = self.motor.iniciar()
+        return {"respuestas": {}}, paso
+
+    def responder(self, estado, pregunta_id, respuesta, valor_numerico=None):
+        respuestas = {**estado["respuestas"], pregunta_id: valor_numerico if valor_numerico is not None else respuesta}
+        paso = self.motor.evaluar(respuestas)
+        return {"respuestas": respuestas}, paso
+
+
+MOTORES_ALTERNATIVOS = {
+    "snapshot": motor_snapshot,
+    "evaluar": MotorEvaluar,
+}
+
+
+def cargar_fabrica(nombre):
+    if nombre in MOTORES_ALTERNATIVOS:
+        return MOTORES_ALTERNATIVOS[nombre]
+    modulo, _, funcion = nombre.partition(":")
+    if not funcion:
+        raise SystemExit(f"Motor alternativo desconocido: {nombre} (usar snapshot, evaluar o modulo:funcion)")
+    sys.path.insert(0, os.getcwd())
+    return getattr(importlib.import_module(modulo), funcion)
+
+
+# =====================================================================================
+# GENERACIÓN DE ENTREVISTAS
+# =====================================================================================
+
+def valores_de_ingresos(tablas):
+    """Ingresos interesantes por tipo de actividad: límites de categoría y sus vecinos"""
+    valores = {}
+    for tipo_actividad, acumulados in tablas.ingresos_acumulados.items():
+        candidatos = {0.0, 1.0}
+        for limite in acumulados:
+            candidatos.update(round(limite + delta, 2) for delta in (-1, -0.01, 0, 0.01, 1))
+        valores[tipo_actividad] = sorted(candidatos)
+    return valores
+
+
+class Generador:
+    """
+    Decisiones al azar para las preguntas. Las opciones que ya terminaron
+    muchas entrevistas (p. ej. "SÍ" a persona jurídica) se eligen con menos
+    probabilidad, para que más entrevistas lleguen a los resultados finales.
+    """
+
+    def __init__(self, rng, ingresos):
+        self.rng = rng
+        self.ingresos = ingresos
+        # (pregunta_id, opción) -> entrevistas que terminaron al elegirla
+        self.terminales = Counter()
+
+    def eleccion(self, pregunta, estado):
+        if pregunta.get("tipo") != "numero" and self.rng.random() >= PROBABILIDAD_RESPUESTA_INVALIDA:
+            opciones = range(len(pregunta.get("opciones") or [None]))
+            pesos = [1 / (1 + self.terminales[(pregunta["id"], opcion)]) for opcion in opciones]
+            return self.rng.choices(opciones, pesos)[0]
+        return generar_eleccion(self.rng, pregunta, estado, self.ingresos)
+
+    def terminada(self, pregunta_id, eleccion):
+        self.terminales[(pregunta_id, eleccion)] += 1
+
+
+def generar_eleccion(rng, pregunta, estado_referencia, ingresos):
+    """Una decisión al azar para una pregunta: índice de opción o ingresos"""
+    if pregunta.get("tipo") == "numero":
+        tipo_actividad = (estado_referencia or {}).get("tipo_actividad") or "servicios"
+        candidatos = ingresos.get(tipo_actividad) or [0.0]
+        sorteo = rng.random()
+        if sorteo < 0.6:
+            return rng.choice(candidatos)
+        if sorteo < 0.9:
+            return round(rng.uniform(0, candidatos[-1] * 1.2), 2)
+        return rng.choice([-1.0, 10 ** rng.randint(9, 13)])
+    if rng.random() < PROBABILIDAD_RESPUESTA_INVALIDA:
+        return -1  # Opción inexistente: el motor debe rechazarla
+    return rng.randrange(len(pregunta.get("opciones") or [None]))
+
+
+def respuesta_de(pregunta, eleccion):
+    """
+    (respuesta, valor_numerico) de una decisión para una pregunta. Al reducir
+    un contraejemplo el camino puede cambiar, así que una decisión puede
+    caer en una pregunta de otro tipo: se convierte.
+    """
+    if pregunta.get("tipo") == "numero":
+        return f"{eleccion:.2f}", float(eleccion)
+    opciones = pregunta.get("opciones") or []
+    if eleccion < 0 or not opciones:
+        return "RESPUESTA INEXISTENTE", None
+    return opciones[int(eleccion) % len(opciones)], None
+
+
+def normalizar_paso(paso):
+    """Parte comparable de un paso: sin los textos de la explicación"""
+    paso = copy.deepcopy(paso)
+    paso.get("detalles", {}).pop("razonamiento_aplicado", None)
+    return paso
+
+
+def recorrer(motor, elecciones, generador=None):
+    """
+    Recorre una entrevista con un motor.
+
+    Con un generador, las elecciones se generan (y se agregan a la lista) hasta llegar
+    a un resultado; sin rng, se usan las dadas y la entrevista termina al
+    acabarse. Devuelve la transcripción: [(pregunta_id, respuesta, valor, paso o error)].
+    """
+    estado, paso = motor.iniciar()
+    transcripcion = [(None, None, None, normalizar_paso(paso))]
+    i = 0
+    while paso.get("tipo") == "pregunta" and i < MAXIMO_PASOS:
+        pregunta = paso["pregunta"]
+        if i == len(elecciones):
+            if generador is None:
+                break
+            elecciones.append(generador.eleccion(pregunta, estado))
+        respuesta, valor = respuesta_de(pregunta, elecciones[i])
+        i += 1
+        try:
+            estado, paso = motor.responder(estado, pregunta["id"], respuesta, valor)
+        except ValueError as e:
+            # El motor rechazó la respuesta: la sesión sigue en la misma pregunta
+            transcripcion.append((pregunta["id"], respuesta, valor, f"ValueError: {e}"))
+            continue
+        transcripcion.append((pregunta["id"], respuesta, valor, normalizar_paso(paso)))
+        if generador is not None and paso.get("tipo") != "pregunta":
+            generador.terminada(pregunta["id"], elecciones[i - 1])
+    return transcripcion
+
+
+def primera_diferencia(referencia, alternativo):
+    """Índice del primer paso distinto entre dos transcripciones (None si coinciden)"""
+    for i, (paso_ref, paso_alt) in enumerate(zip(referencia, alternativo)):
+        if paso_ref != paso_alt:
+            return i
+    if len(referencia) != len(alternativo):
+        return min(len(referencia), len(alternativo))
+    return None
+
+
+# =====================================================================================
+# REDUCCIÓN DE CONTRAEJEMPLOS
+# =====================================================================================
+
+# Límites de categoría (y vecinos) más cercanos que se prueban al reducir unos ingresos, de cada lado
+LIMITES_CERCANOS = 2
+
+
+def simplicidad(valor, especiales=()):
+    """
+    Orden de simplicidad de unos ingresos: 0 y 1, luego los valores
+    especiales (límites de categoría y sus vecinos), luego los demás por
+    cantidad de cifras significativas. Cada reducción lo hace bajar.
+    """
+    if valor in (0.0, 1.0):
+        return (0, 0, valor)
+    if valor in especiales:
+        return (1, 0, abs(valor))
+    cifras = f"{abs(valor):.15g}".replace(".", "").strip("0")
+    return (2, len(cifras), abs(valor))
+
+
+def simplificaciones(eleccion, especiales=()):
+    """
+    Valores más simples que una decisión, del más al menos simple. Para los
+    ingresos se prueban los valores especiales (ordenados) más cercanos: un
+    error en un límite de categoría se reduce a ese límite.
+    """
+    if isinstance(eleccion, int) and eleccion >= 0:
+        return list(range(eleccion))
+    if isinstance(eleccion, float):
+        posicion = bisect.bisect_left(especiales, eleccion)
+        candidatos = [0.0, 1.0, *especiales[max(0, posicion - LIMITES_CERCANOS):posicion + LIMITES_CERCANOS + 1],
+                      float(round(eleccion))]
+        for cifras in range(1, 4):
+            candidatos.append(float(f"{eleccion:.{cifras}g}"))
+        actual = simplicidad(eleccion, especiales)
+        return sorted((c for c in dict.fromkeys(candidatos) if simplicidad(c, especiales) < actual),
+                      key=lambda c: simplicidad(c, especiales))
+    return []
+
+
+def reducir(elecciones, falla, especiales=()):
+    """
+    Reduce una lista de decisiones mientras falla(elecciones) siga siendo
+    verdadero: primero acorta la entrevista y luego simplifica cada valor
+    (especiales: ingresos interesantes ordenados, ver valores_de_ingresos).
+    """
+    elecciones = list(elecciones)
+    mejorado = True
+    while mejorado:
+        mejorado = False
+        for largo in range(len(elecciones)):
+            if falla(elecciones[:largo]):
+                elecciones = elecciones[:largo]
+                mejorado = True
+                break
+        for i in range(len(elecciones)):
+            for candidato in simplificaciones(elecciones[i], especiales):
+                prueba = elecciones[:i] + [candidato] + elecciones[i + 1:]
+                if falla(prueba):
+                    elecciones = prueba
+                    mejorado = True
+                    break
+    return elecciones
+
+
+# =====================================================================================
+# EJECUCIÓN
+# =====================================================================================
+
+def medir(motor, casos):
+    t0 = time.perf_counter()
+    pasos = sum(len(recorrer(motor, list(elecciones))) for elecciones in casos)
+    return pasos / (time.perf_counter() - t0)
+
+
+def firma_diferencia(referencia, alternativo):
+    """Primer paso distinto: la pregunta y lo que respondió cada motor (para agrupar contraejemplos)"""
+    i = primera_diferencia(referencia, alternativo)
+    pregunta_id = (referencia[i] if i < len(referencia) else alternativo[i])[0]
+
+    def _salida(transcripcion):
+        return json.dumps(transcripcion[i][3], sort_keys=True, default=str) if i < len(transcripcion) else None
+
+    return pregunta_id, _salida(referencia), _salida(alternativo)
+
+
+def describir_valor(valor, limites):
+    """Un valor numérico, indicando el límite de categoría del que es vecino (si lo es)"""
+    if not limites:
+        return f"{valor}"
+    posicion = bisect.bisect_left(limites, valor)
+    limite = min(limites[max(0, posicion - 1):posicion + 1], key=lambda l: abs(l - valor))
+    delta = round(valor - limite, 2)
+    if abs(delta) > 1:
+        return f"{valor}"
+    return f"{valor} (límite {limite:.2f}{f' {delta:+}' if delta else ''})"
+
+
+def mostrar_contraejemplo(numero, elecciones, referencia, alternativo, limites=()):
+    i = primera_diferencia(referencia, alternativo)
+    print(f"\n❌ Contraejemplo {numero} ({len(elecciones)} respuestas):")
+    for pregunta_id, respuesta, valor, _ in referencia[1:i + 1]:
+        print(f"   {pregunta_id} = {describir_valor(valor, limites) if valor is not None else respuesta}")
+    print(f"   referencia : {referencia[i] if i < len(referencia) else '(fin)'}")
+    print(f"   alternativo: {alternativo[i] if i < len(alternativo) else '(fin)'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzing diferencial entre el motor de referencia y uno alternativo")
+    parser.add_argument("--alternativo", default="snapshot", help="snapshot, evaluar o modulo:funcion")
+    parser.add_argument("--casos", type=int, default=2000, help="Entrevistas generadas")
+    parser.add_argument("--semilla", type=int, help="Semilla del generador (por defecto, al azar)")
+    args = parser.parse_args()
+
+    semilla = args.semilla if args.semilla is not None else random.randrange(2 ** 32)
+    rng = random.Random(semilla)
+    reglas = cargar_reglas()
+    tablas = cargar_tablas_locales()
+    if tablas is None:
+        print("❌ No hay datos locales (data/categorias.json y data/pagos.json)")
+        return 1
+    referencia = motor_referencia(reglas, tablas)
+    alternativo = cargar_fabrica(args.alternativo)(reglas, tablas)
+    ingresos = valores_de_ingresos(tablas)
+    especiales = sorted({valor for valores in ingresos.values() for valor in valores})
+    limites = sorted({limite for acumulados in tablas.ingresos_acumulados.values() for limite in acumulados})
+    generador = Generador(rng, ingresos)
+
+    print(f"🎲 {args.casos} entrevistas, semilla {semilla}, motor alternativo: {args.alternativo}")
+    casos = []
+    fallas = []
+    for _ in range(args.casos):
+        elecciones = []
+        transcripcion = recorrer(referencia, elecciones, generador)
+        casos.append(elecciones)
+        if primera_diferencia(transcripcion, recorrer(alternativo, list(elecciones))) is not None:
+            fallas.append(elecciones)
+
+    resultados = {}
+    for transcripcion in (recorrer(referencia, list(e)) for e in casos):
+        paso = transcripcion[-1][-1]
+        clave = paso.get("mensaje_id", paso.get("tipo")) if isinstance(paso, dict) else "rechazada"
+        resultados[clave] = resultados.get(clave, 0) + 1
+    print(f"📋 Finales cubiertos: {dict(sorted(resultados.items(), key=lambda r: -r[1]))}")
+
+    def falla(elecciones):
+        return primera_diferencia(recorrer(referencia, list(elecciones)),
+                                  recorrer(alternativo, list(elecciones))) is not None
+
+    vistos = set()
+    for elecciones in fallas[:MAXIMO_REDUCCIONES]:
+        reducido = reducir(elecciones, falla, especiales)
+        transcripcion_referencia = recorrer(referencia, list(reducido))
+        transcripcion_alternativa = recorrer(alternativo, list(reducido))
+        firma = firma_diferencia(transcripcion_referencia, transcripcion_alternativa)
+        if firma in vistos:
+            continue
+        vistos.add(firma)
+        if len(vistos) <= MAXIMO_CONTRAEJEMPLOS:
+            mostrar_contraejemplo(len(vistos), reducido, transcripcion_referencia, transcripcion_alternativa, limites)
+
+    ritmo_referencia = medir(referencia, casos)
+    ritmo_alternativo = medir(alternativo, casos)
+    print(f"\n⏱️  Referencia:  {ritmo_referencia:10.0f} pasos/s")
+    print(f"⏱️  Alternativo: {ritmo_alternativo:10.0f} pasos/s ({ritmo_alternativo / ritmo_referencia:.2f}x)")
+
+    if fallas:
+        print(f"\n❌ {len(fallas)} de {args.casos} entrevistas difieren ({len(vistos)} contraejemplos distintos entre las primeras {MAXIMO_REDUCCIONES}); "
+              f"repetir con --semilla {semilla}")
+        return 1
+    print(f"\n✅ Las {args.casos} entrevistas coinciden")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MEDICIÓN DE MEMORIA POR SUBSISTEMA - SISTEMA EXPERTO MONOTRIBUTO
+================================================================
+
+Reparte la memoria entre sesiones, base de conocimiento, datos (categorías,
+pagos y AREF) y scraper con src/contabilidad_memoria.py, de dos formas:
+
+    - En proceso (por defecto): carga reglas y tablas, abre --sesiones
+      entrevistas a medio camino y, con --scraper, consulta AFIP con
+      obtener_datos_monotributo_web (o procesa la página guardada en --html).
+      Muestra la memoria de cada etapa y lo que quedó vivo del scraping.
+    - Contra un servidor en marcha (--url): activa o desactiva el muestreo
+      (--activar, --desactivar) o pide una medición a GET /memoria, que se
+      compara con la anterior; repetirla con tráfico estable muestra las
+      pérdidas.
+
+Uso:
+    python herramientas/medir_memoria.py --sesiones 5000 --scraper
+    python herramientas/medir_memoria.py --html categorias.html
+    python herramientas/medir_memoria.py --url http://host:8000 --activar --marcos 25
+    python herramientas/medir_memoria.py --url http://host:8000            # medir (repetir para comparar)
+    python herramientas/medir_memoria.py --url http://host:8000 --desactivar
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'src'))
+
+from contabilidad_memoria import MARCOS_POR_DEFECTO, PRINCIPALES_POR_DEFECTO, SUBSISTEMAS, ContabilidadMemoria, \
+    atribuir_modulos
+
+
+# Respuestas de las entrevistas abiertas: servicios, hasta la pregunta del local
+RESPUESTAS = [
+    ("persona_juridica", "NO (Persona Física)", None), ("socio_sociedad", "NO", None),
+    ("actividades_diferentes", "NO (3 o menos actividades)", None),
+    ("actividad_servicios", "SÍ (Prestación de Servicios)", None), ("genera_ingresos", "SÍ", None),
+    ("ingresos_anuales", "12000000", 12000000.0),
+]
+
+
+def kb(valor):
+    return f"{valor / 1024:>10,.1f} KB"
+
+
+def mostrar_informe(informe, titulo):
+    print(f"\n📊 {titulo}")
+    for subsistema in SUBSISTEMAS:
+        datos = informe["subsistemas"][subsistema]
+        print(f"  {subsistema:<15} {kb(datos['bytes'])} {datos['bloques']:>9,} bloques")
+        for sitio in datos["principales"]:
+            print(f"      {kb(sitio['bytes'])}  {sitio['sitio']}")
+    print(f"  {'total':<15} {kb(informe['total_bytes'])}")
+    if informe.get("bytes_por_sesion") is not None:
+        print(f"  {informe['sesiones_vivas']:,} sesiones vivas: {informe['bytes_por_sesion']:,} bytes por sesión")
+
+
+def mostrar_diferencia(diferencia, titulo):
+    print(f"\n🔍 {titulo} ({diferencia['segundos']:.1f} s)")
+    for subsistema, datos in diferencia["subsistemas"].items():
+        if datos["bytes"]:
+            print(f"  {subsistema:<15} {kb(datos['bytes'])} {datos['bloques']:>+9,} bloques")
+    print(f"  {'total':<15} {kb(diferencia['total_bytes'])}")
+    for sitio in diferencia["crecimiento"]:
+        print(f"      {kb(sitio['bytes'])}  [{sitio['subsistema']}] {sitio['sitio']}")
+
+
+def medir_en_proceso(args):
+    # Los módulos se importan antes de activar el muestreo (importar con
+    # tracemalloc activo es muy lento y no interesa medirlo)
+    contabilidad = ContabilidadMemoria(args.marcos)
+    atribuir_modulos(contabilidad)
+    from checkpoint_sesiones import AlmacenSesiones
+    from data_manager import cargar_tablas_locales
+    from motor_inferencia import MotorInferencia, cargar_reglas
+    from monotributo_scraper import obtener_datos_monotributo_web, procesar_pagina_categorias
+    contabilidad.activar()
+
+    inicial = contabilidad.tomar()
+    motor = MotorInferencia(cargar_reglas(), cargar_tablas_locales())
+    cargado = contabilidad.tomar()
+    mostrar_diferencia(contabilidad.diferencia(inicial, cargado, args.principales), "Reglas y tablas cargadas")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sesiones = AlmacenSesiones(directorio=directorio)
+        for numero in range(args.sesiones):
+            estado, _ = motor.iniciar()
+            for pregunta_id, respuesta, valor in RESPUESTAS:
+                estado, _ = motor.responder(estado, pregunta_id, respuesta, valor)
+            sesiones.guardar(f"{numero:016x}", estado)
+        con_sesiones = contabilidad.tomar()
+        mostrar_informe(contabilidad.informe(con_sesiones, len(sesiones), args.principales),
+                        f"Con {len(sesiones):,} sesiones abiertas")
+
+        if args.scraper or args.html:
+            inicio = time.perf_counter()
+            if args.html:
+                with open(args.html, 'rb') as f:
+                    resultado = procesar_pagina_categorias(f.read(), None, None)
+                categorias, pagos = resultado.categorias, resultado.pagos
+            else:
+                categorias, pagos = obtener_datos_monotributo_web()
+            print(f"\n🕷️  Scraping: {'datos obtenidos' if categorias else 'sin datos'} "
+                  f"en {time.perf_counter() - inicio:.1f} s")
+            del categorias, pagos
+            despues = contabilidad.tomar()
+            mostrar_diferencia(contabilidad.diferencia(con_sesiones, despues, args.principales),
+                               "Vivo tras el scraping (descartados sus resultados)")
+    contabilidad.desactivar()
+
+
+def medir_servidor(args):
+    cabeceras = {"X-Clave-Admin": args.clave} if args.clave else {}
+    if args.activar or args.desactivar:
+        parametros = {"activo": str(bool(args.activar)).lower()}
+        if args.activar and args.marcos != MARCOS_POR_DEFECTO:
+            parametros["marcos"] = args.marcos
+        respuesta = requests.post(f"{args.url}/memoria/muestreo", params=parametros, headers=cabeceras, timeout=10)
+        respuesta.raise_for_status()
+        print(json.dumps(respuesta.json(), indent=2, ensure_ascii=False))
+        return
+    respuesta = requests.get(f"{args.url}/memoria", params={"principales": args.principales},
+                             headers=cabeceras, timeout=120)
+    if respuesta.status_code == 409:
+        print(f"⚠️  {respuesta.json()['detail']}")
+        return
+    respuesta.raise_for_status()
+    informe = respuesta.json()
+    mostrar_informe(informe, f"Memoria del servidor {args.url}")
+    if "diferencia" in informe:
+        mostrar_diferencia(informe["diferencia"], "Desde la medición anterior")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por subsistema con tracemalloc")
+    parser.add_argument("--url", help="URL de un servidor en marcha (por defecto se mide en proceso)")
+    parser.add_argument("--clave", default=os.environ.get("CLAVE_ADMIN"), help="Clave de administración del servidor")
+    parser.add_argument("--activar", action="store_true", help="Activar el muestreo en el servidor")
+    parser.add_argument("--desactivar", action="store_true", help="Desactivar el muestreo en el servidor")
+    parser.add_argument("--marcos", type=int, default=MARCOS_POR_DEFECTO, help="Marcos guardados por bloque")
+    parser.add_argument("--principales", type=int, default=PRINCIPALES_POR_DEFECTO,
+                        help="Sitios de asignación listados por subsistema")
+    parser.add_argument("--sesiones", type=int, default=1000, help="Sesiones abiertas en la medición en proceso")
+    parser.add_argument("--scraper", action="store_true", help="Consultar AFIP en la medición en proceso")
+    parser.add_argument("--html", help="Procesar una página de categorías guardada en lugar de consultar AFIP")
+    args = parser.parse_args()
+
+    if args.url:
+        medir_servidor(args)
+    else:
+        medir_en_proceso(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PRUEBA DE CARGA DE LA ENTREVISTA - SISTEMA EXPERTO MONOTRIBUTO
+==============================================================
+
+Simula un pico de vencimiento: muchos clientes concurrentes que recorren
+entrevistas completas por HTTP durante un tiempo fijo. Cuenta las
+respuestas por código de estado y por tipo de petición (sesión nueva o
+respuesta), respeta el Retry-After de los 503 y al final muestra las
+métricas del control de admisión (/metricas).
+
+Con el control de admisión funcionando, bajo sobrecarga los 503 deben
+concentrarse en las sesiones nuevas y la latencia de las respuestas a
+sesiones ya empezadas debe mantenerse acotada.
+
+Uso:
+    python herramientas/prueba_carga.py                       # levanta un servidor local
+    python herramientas/prueba_carga.py --clientes 128 --segundos 20
+    python herramientas/prueba_carga.py --url http://host:8000 --clientes 64
+
+Para forzar la sobrecarga en una máquina de desarrollo, el servidor local se
+puede levantar con límites bajos (--maximo-en-curso, --cola-respuestas,
+--cola-nuevas-sesiones).
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_entrevista import RAIZ, elegir_respuesta, esperar_servidor
+
+
+class Resultados:
+    """Contadores y latencias compartidos entre los clientes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.estados = Counter()
+        self.latencias = {"nueva_sesion": [], "respuesta": []}
+        self.entrevistas_completas = 0
+
+    def registrar(self, tipo, status, latencia):
+        with self.lock:
+            self.estados[(tipo, status)] += 1
+            if status == 200:
+                self.latencias[tipo].append(latencia)
+
+
+def pedir(sesion, resultados, tipo, metodo, url, **kwargs):
+    """Una petición medida; devuelve la respuesta, o None si hubo que reintentar"""
+    t0 = time.perf_counter()
+    try:
+        respuesta = metodo(url, timeout=30, **kwargs)
+    except requests.RequestException:
+        resultados.registrar(tipo, "error_conexion", 0)
+        time.sleep(0.5)
+        return None
+    resultados.registrar(tipo, respuesta.status_code, time.perf_counter() - t0)
+    if respuesta.status_code == 503:
+        time.sleep(float(respuesta.headers.get("Retry-After", 1)))
+        # Tras la espera el servidor pudo cerrar la conexión keep-alive: se abre una nueva
+        sesion.close()
+        return None
+    return respuesta
+
+
+def cliente(url, limite, resultados):
+    """Recorre entrevistas completas hasta el límite de tiempo"""
+    with requests.Session() as sesion:
+        while time.time() < limite:
+            inicio = pedir(sesion, resultados, "nueva_sesion", sesion.post, f"{url}/iniciar_sesion")
+            if inicio is None or inicio.status_code != 200:
+                continue
+            datos = inicio.json()
+            sesion_id = datos["sesion_id"]
+            paso = {"tipo": "pregunta", "pregunta": datos["siguiente_pregunta"]}
+            secuencia = 0
+            while paso["tipo"] == "pregunta" and time.time() < limite:
+                cuerpo = elegir_respuesta(paso["pregunta"], secuencia + 1)
+                respuesta = pedir(sesion, resultados, "respuesta", sesion.post, f"{url}/responder/{sesion_id}", json=cuerpo)
+                if respuesta is None:
+                    continue  # Se reintenta la misma respuesta (idempotente por la secuencia)
+                if respuesta.status_code != 200:
+                    break
+                paso = respuesta.json()
+                secuencia += 1
+            else:
+                if paso["tipo"] != "pregunta":
+                    with resultados.lock:
+                        resultados.entrevistas_completas += 1
+
+
+def percentil(valores, proporcion):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * proporcion))]
+
+
+def mostrar(resultados, duracion, metricas):
+    print(f"\n📊 Entrevistas completas: {resultados.entrevistas_completas} "
+          f"({resultados.entrevistas_completas / duracion:.1f}/s)")
+    for tipo in ("nueva_sesion", "respuesta"):
+        estados = {status: cantidad for (t, status), cantidad in sorted(resultados.estados.items(), key=str) if t == tipo}
+        latencias = [l * 1000 for l in resultados.latencias[tipo]]
+        linea = f"{tipo:<13} estados: {estados}"
+        if latencias:
+            linea += (f"  p50: {statistics.median(latencias):7.2f} ms"
+                      f"  p95: {percentil(latencias, 0.95):7.2f} ms"
+                      f"  p99: {percentil(latencias, 0.99):7.2f} ms")
+        print(linea)
+    if metricas:
+        print("\n🚦 Control de admisión:")
+        print(f"   en curso: {metricas['admision']['en_curso']}/{metricas['admision']['maximo_en_curso']}")
+        for prioridad, contadores in metricas["admision"]["prioridades"].items():
+            print(f"   {prioridad:<13} {contadores}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la entrevista por HTTP")
+    parser.add_argument("--url", help="URL de un servidor en marcha (por defecto se levanta uno local)")
+    parser.add_argument("--puerto", type=int, default=8766, help="Puerto del servidor local")
+    parser.add_argument("--clientes", type=int, default=64, help="Clientes concurrentes")
+    parser.add_argument("--segundos", type=float, default=10, help="Duración de la prueba")
+    parser.add_argument("--maximo-en-curso", type=int, help="ADMISION_MAXIMO_EN_CURSO del servidor local")
+    parser.add_argument("--cola-respuestas", type=int, help="ADMISION_COLA_RESPUESTAS del servidor local")
+    parser.add_argument("--cola-nuevas-sesiones", type=int, help="ADMISION_COLA_NUEVAS_SESIONES del servidor local")
+    args = parser.parse_args()
+
+    servidor = None
+    url = args.url
+    if not url:
+        url = f"http://127.0.0.1:{args.puerto}"
+        entorno = dict(os.environ)
+        for variable, valor in (("ADMISION_MAXIMO_EN_CURSO", args.maximo_en_curso),
+                                ("ADMISION_COLA_RESPUESTAS", args.cola_respuestas),
+                                ("ADMISION_COLA_NUEVAS_SESIONES", args.cola_nuevas_sesiones)):
+            if valor is not None:
+                entorno[variable] = str(valor)
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(args.puerto), "--log-level", "warning"],
+            cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL
+        )
+    url = url.rstrip("/")
+
+    try:
+        if not esperar_servidor(url):
+            print(f"❌ El servidor no responde en {url}")
+            return 1
+
+        print(f"🔥 {args.clientes} clientes durante {args.segundos:.0f} s contra {url}")
+        resultados = Resultados()
+        t0 = time.perf_counter()
+        limite = time.time() + args.segundos
+        with ThreadPoolExecutor(max_workers=args.clientes) as ejecutor:
+            for _ in range(args.clientes):
+                ejecutor.submit(cliente, url, limite, resultados)
+        duracion = time.perf_counter() - t0
+
+        try:
+            metricas = requests.get(f"{url}/metricas", timeout=5).json()
+        except requests.RequestException:
+            metricas = None
+        mostrar(resultados, duracion, metricas)
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
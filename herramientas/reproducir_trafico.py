@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+REPRODUCCIÓN DE TRÁFICO CAPTURADO - SISTEMA EXPERTO MONOTRIBUTO
+===============================================================
+
+Reproduce contra una instancia de api.py una captura grabada con
+CAPTURA_TRAFICO (ver src/captura_trafico.py): cada sesión repite sus
+peticiones de /iniciar_sesion y /responder en el mismo orden y, por
+defecto, con los mismos intervalos que en la grabación.
+
+Por cada petición se compara el código de estado y la firma del resultado
+con lo grabado (categoría, total, pregunta siguiente...), de modo que una
+captura de un día de vencimiento sirve a la vez de benchmark de capacidad y
+de prueba de regresión. Los 503 se reintentan respetando Retry-After.
+
+Uso:
+    CAPTURA_TRAFICO=vencimiento.jsonl.gz python api.py           # grabar
+    python herramientas/reproducir_trafico.py vencimiento.jsonl.gz        # al ritmo original
+    python herramientas/reproducir_trafico.py vencimiento.jsonl.gz --velocidad 10
+    python herramientas/reproducir_trafico.py vencimiento.jsonl.gz --velocidad 0 --copias 5
+
+--velocidad 0 envía cada petición apenas termina la anterior de su sesión;
+--copias N reproduce cada sesión N veces a la vez (carga N veces mayor).
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_entrevista import RAIZ, esperar_servidor
+from prueba_carga import percentil
+
+from captura_trafico import firma_resultado, leer_captura
+
+
+# Reintentos de una petición rechazada con 503 antes de darla por fallida
+MAXIMO_REINTENTOS_503 = 20
+# Diferencias que se muestran en detalle
+MAXIMO_DIFERENCIAS_MOSTRADAS = 10
+
+
+class Resultados:
+    """Latencias, diferencias con la grabación y atraso respecto del ritmo pedido"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = {"iniciar": [], "responder": []}
+        self.estados = Counter()
+        self.coincidencias = 0
+        self.diferencias = []
+        self.reintentos_503 = 0
+        self.atraso_maximo = 0.0
+        self.sesiones_cortadas = 0
+
+    def registrar(self, op, status, latencia):
+        with self.lock:
+            self.estados[(op, status)] += 1
+            if status == 200:
+                self.latencias[op].append(latencia)
+
+    def comparar(self, sesion, registro, status, firma):
+        with self.lock:
+            if status == registro["st"] and firma == registro.get("f"):
+                self.coincidencias += 1
+            else:
+                self.diferencias.append({"sesion": sesion, "op": registro["op"], "t": registro["t"],
+                                         "grabado": (registro["st"], registro.get("f")),
+                                         "obtenido": (status, firma)})
+
+
+def enviar(sesion_http, url, registro, sesion_id, resultados):
+    """Envía una petición grabada; devuelve (status, respuesta JSON o None)"""
+    if registro["op"] == "iniciar":
+        destino = f"{url}/iniciar_sesion"
+        cuerpo = None
+    else:
+        destino = f"{url}/responder/{sesion_id}"
+        cuerpo = registro["c"]
+    for _ in range(MAXIMO_REINTENTOS_503):
+        t0 = time.perf_counter()
+        try:
+            respuesta = sesion_http.post(destino, params=registro.get("p") or None, json=cuerpo, timeout=30)
+        except requests.RequestException:
+            resultados.registrar(registro["op"], "error_conexion", 0)
+            return "error_conexion", None
+        resultados.registrar(registro["op"], respuesta.status_code, time.perf_counter() - t0)
+        if respuesta.status_code != 503:
+            return respuesta.status_code, respuesta.json() if respuesta.status_code == 200 else None
+        with resultados.lock:
+            resultados.reintentos_503 += 1
+        time.sleep(float(respuesta.headers.get("Retry-After", 1)))
+        sesion_http.close()
+    return 503, None
+
+
+def reproducir_sesion(url, numero, registros, inicio, velocidad, resultados):
+    """Repite las peticiones de una sesión grabada y las compara con la grabación"""
+    sesion_id = None
+    with requests.Session() as sesion_http:
+        for registro in registros:
+            if velocidad > 0:
+                espera = inicio + registro["t"] / velocidad - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                else:
+                    with resultados.lock:
+                        resultados.atraso_maximo = max(resultados.atraso_maximo, -espera)
+            status, datos = enviar(sesion_http, url, registro, sesion_id, resultados)
+            if registro["op"] == "iniciar":
+                firma = None
+                if datos:
+                    sesion_id = datos["sesion_id"]
+                    firma = firma_resultado({"tipo": "pregunta", "pregunta": datos["siguiente_pregunta"]})
+            else:
+                firma = firma_resultado(datos) if datos else None
+            resultados.comparar(numero, registro, status, firma)
+            if sesion_id is None:
+                with resultados.lock:
+                    resultados.sesiones_cortadas += 1
+                return
+
+
+def mostrar(resultados, duracion, duracion_grabada, peticiones):
+    total = resultados.coincidencias + len(resultados.diferencias)
+    print(f"\n📊 {peticiones} peticiones en {duracion:.1f} s ({peticiones / duracion:.1f}/s); "
+          f"grabadas en {duracion_grabada:.1f} s")
+    for op in ("iniciar", "responder"):
+        estados = {status: cantidad for (o, status), cantidad in sorted(resultados.estados.items(), key=str) if o == op}
+        latencias = [l * 1000 for l in resultados.latencias[op]]
+        linea = f"{op:<10} estados: {estados}"
+        if latencias:
+            linea += (f"  p50: {statistics.median(latencias):7.2f} ms"
+                      f"  p95: {percentil(latencias, 0.95):7.2f} ms"
+                      f"  p99: {percentil(latencias, 0.99):7.2f} ms")
+        print(linea)
+    print(f"🔁 Reintentos por 503: {resultados.reintentos_503}   "
+          f"atraso máximo respecto del ritmo pedido: {resultados.atraso_maximo * 1000:.0f} ms")
+
+    if not resultados.diferencias:
+        print(f"✅ Las {total} respuestas coinciden con la grabación")
+        return
+    print(f"❌ {len(resultados.diferencias)} de {total} respuestas difieren de la grabación:")
+    for diferencia in sorted(resultados.diferencias, key=lambda d: d["t"])[:MAXIMO_DIFERENCIAS_MOSTRADAS]:
+        print(f"   sesión {diferencia['sesion']} {diferencia['op']} (t={diferencia['t']:.2f} s): "
+              f"grabado {diferencia['grabado']} -> obtenido {diferencia['obtenido']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una captura de tráfico de la entrevista")
+    parser.add_argument("captura", help="Archivo grabado con CAPTURA_TRAFICO")
+    parser.add_argument("--url", help="URL de un servidor en marcha (por defecto se levanta uno local)")
+    parser.add_argument("--puerto", type=int, default=8767, help="Puerto del servidor local")
+    parser.add_argument("--velocidad", type=float, default=1.0,
+                        help="Multiplicador del ritmo grabado (0: sin esperas)")
+    parser.add_argument("--copias", type=int, default=1, help="Veces que se reproduce cada sesión a la vez")
+    parser.add_argument("--hilos", type=int, default=256, help="Sesiones reproducidas en paralelo como máximo")
+    args = parser.parse_args()
+
+    cabeceras, sesiones = leer_captura(args.captura)
+    if not sesiones:
+        print(f"❌ La captura {args.captura} no tiene sesiones completas")
+        return 1
+    peticiones = sum(len(registros) for registros in sesiones) * args.copias
+    duracion_grabada = max(registros[-1]["t"] for registros in sesiones) - sesiones[0][0]["t"]
+    print(f"📼 {len(sesiones)} sesiones y {peticiones // args.copias} peticiones grabadas"
+          f"{' (anonimizadas)' if any(c.get('anonimizada') for c in cabeceras) else ''}")
+
+    servidor = None
+    url = args.url
+    if not url:
+        url = f"http://127.0.0.1:{args.puerto}"
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(args.puerto), "--log-level", "warning"],
+            cwd=RAIZ, stdout=subprocess.DEVNULL
+        )
+    url = url.rstrip("/")
+
+    try:
+        if not esperar_servidor(url):
+            print(f"❌ El servidor no responde en {url}")
+            return 1
+        versiones_grabadas = {registros[0].get("v") for registros in sesiones} - {None}
+        version_actual = requests.get(f"{url}/info_sistema", timeout=5).json().get("version_reglas")
+        if versiones_grabadas and version_actual not in versiones_grabadas:
+            print(f"⚠️  Reglas grabadas con las versiones {sorted(versiones_grabadas)} y el servidor usa "
+                  f"{version_actual}: las diferencias pueden deberse a las reglas")
+
+        ritmo = "sin esperas" if args.velocidad <= 0 else f"a {args.velocidad:g}x el ritmo original"
+        print(f"▶️  Reproduciendo {ritmo}" + (f", {args.copias} copias por sesión" if args.copias > 1 else "") +
+              f" contra {url}")
+        resultados = Resultados()
+        desfase = sesiones[0][0]["t"]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.hilos) as ejecutor:
+            for numero, registros in enumerate(sesiones):
+                registros = [{**registro, "t": registro["t"] - desfase} for registro in registros]
+                for _ in range(args.copias):
+                    ejecutor.submit(reproducir_sesion, url, numero, registros, inicio, args.velocidad, resultados)
+        mostrar(resultados, time.perf_counter() - inicio, duracion_grabada, peticiones)
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait()
+    return 0 if not resultados.diferencias else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE ANALÍTICA DE ENTREVISTAS - SISTEMA EXPERTO MONOTRIBUTO
+================================================================
+
+Este módulo registra cómo transcurren y cómo terminan las entrevistas, sin
+que las peticiones esperen por disco:
+
+    - la API emite un evento por sesión iniciada, por respuesta procesada y
+      por resultado final; registrar() sólo lo agrega a un buffer circular
+      en memoria (si se llena se descartan los más viejos y se cuentan)
+    - una tarea en segundo plano vuelca el buffer en lotes a un log diario
+      de sólo agregado (data/analitica/eventos-YYYY-MM-DD.jsonl)
+    - los logs de días cerrados se compactan a Parquet (columnar), si
+      pyarrow está instalado
+    - agregados() resume los eventos: distribución de categorías, abandono
+      por pregunta y duración de las entrevistas (p50/p95)
+
+Tipos de evento:
+    inicio      {"sesion_id", "version_reglas", "pregunta_id"}
+    respuesta   {"sesion_id", "secuencia", "pregunta_id", "respuesta",
+                 "siguiente", "paso", "duracion_ms"}
+    resultado   {"sesion_id", "paso", "mensaje_id", "categoria",
+                 "tipo_actividad", "total", "respuestas", "duracion_s"}
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow es opcional: sin él los logs quedan en JSONL
+    pyarrow = None
+
+
+# Eventos que pueden esperar en memoria a ser volcados
+CAPACIDAD_BUFFER_ANALITICA = 50_000
+# Eventos por escritura al log
+TAMANO_LOTE_ANALITICA = 5_000
+# Segundos sin actividad tras los cuales una entrevista sin resultado cuenta como abandonada
+INACTIVIDAD_ABANDONO = 30 * 60
+
+# Columnas de los archivos Parquet (los campos que no tiene un evento quedan nulos)
+COLUMNAS_EVENTOS = (
+    "ts", "tipo", "sesion_id", "version_reglas", "secuencia", "pregunta_id", "respuesta",
+    "siguiente", "paso", "duracion_ms", "mensaje_id", "categoria", "tipo_actividad",
+    "total", "respuestas", "duracion_s"
+)
+
+
+def _directorio_por_defecto():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), 'data', 'analitica')
+
+
+def _dia(ts):
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+def percentil(valores, proporcion):
+    """Percentil por rango más cercano (None si no hay valores)"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * proporcion))]
+
+
+class RegistroAnalitica:
+    """
+    Buffer circular de eventos de entrevista con volcado en lotes a un log
+    diario y compactación a Parquet.
+
+    registrar() se llama desde el event loop y no hace I/O; volcar(),
+    compactar() y leer_eventos() hacen I/O y deben correr en un hilo.
+
+    Args:
+        directorio (str, optional): Carpeta de los logs (por defecto data/analitica)
+        capacidad (int): Eventos que pueden esperar en memoria a ser volcados
+    """
+
+    def __init__(self, directorio=None, capacidad=CAPACIDAD_BUFFER_ANALITICA):
+        self.directorio = directorio or _directorio_por_defecto()
+        self._buffer = deque(maxlen=capacidad)
+        self.registrados = 0
+        self.descartados = 0
+        self.volcados = 0
+        self._lock_escritura = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Registro (camino de las peticiones: sin I/O)
+    # ------------------------------------------------------------------
+
+    def registrar(self, tipo, **campos):
+        """Agrega un evento al buffer; si está lleno se descarta el más viejo"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.descartados += 1
+        self._buffer.append({"ts": round(time.time(), 3), "tipo": tipo, **campos})
+        self.registrados += 1
+
+    def inicio(self, sesion_id, estado, paso):
+        """Evento de sesión iniciada"""
+        self.registrar("inicio", sesion_id=sesion_id, version_reglas=estado.get("version_reglas"),
+                       pregunta_id=paso["pregunta"]["id"])
+
+    def respuesta(self, sesion_id, estado, pregunta_id, respuesta, resultado, duracion):
+        """Evento de respuesta procesada y, si la entrevista terminó, de su resultado"""
+        tipo_paso = resultado.get("tipo")
+        siguiente = resultado["pregunta"]["id"] if tipo_paso == "pregunta" else None
+        self.registrar("respuesta", sesion_id=sesion_id, secuencia=estado.get("secuencia"),
+                       pregunta_id=pregunta_id, respuesta=respuesta, siguiente=siguiente,
+                       paso=tipo_paso, duracion_ms=round(duracion * 1000, 3))
+        if tipo_paso in ("resultado", "error"):
+            detalles = resultado.get("detalles", {})
+            iniciada = estado.get("iniciada")
+            self.registrar("resultado", sesion_id=sesion_id, paso=tipo_paso,
+                           mensaje_id=resultado.get("mensaje_id"),
+                           categoria=detalles.get("categoria"),
+                           tipo_actividad=detalles.get("tipo_actividad"),
+                           total=detalles.get("total_general"),
+                           respuestas=estado.get("secuencia"),
+                           duracion_s=round(time.time() - iniciada, 3) if iniciada else None)
+
+    def metricas(self):
+        """📈 Eventos registrados, pendientes de volcar, volcados y descartados"""
+        return {
+            "registrados": self.registrados,
+            "pendientes": len(self._buffer),
+            "volcados": self.volcados,
+            "descartados": self.descartados
+        }
+
+    # ------------------------------------------------------------------
+    # Persistencia (en un hilo aparte)
+    # ------------------------------------------------------------------
+
+    def _ruta_log(self, dia, extension="jsonl"):
+        return os.path.join(self.directorio, f"eventos-{dia}.{extension}")
+
+    def volcar(self):
+        """
+        💾 Agrega los eventos pendientes al log de su día, en lotes.
+
+        Returns:
+            int: Cantidad de eventos volcados
+        """
+        with self._lock_escritura:
+            eventos = []
+            while self._buffer:
+                eventos.append(self._buffer.popleft())
+            if not eventos:
+                return 0
+
+            por_dia = {}
+            for evento in eventos:
+                por_dia.setdefault(_dia(evento["ts"]), []).append(evento)
+
+            os.makedirs(self.directorio, exist_ok=True)
+            volcados = 0
+            for dia, eventos_dia in sorted(por_dia.items()):
+                try:
+                    with open(self._ruta_log(dia), 'a', encoding='utf-8') as f:
+                        for i in range(0, len(eventos_dia), TAMANO_LOTE_ANALITICA):
+                            f.write("".join(json.dumps(evento, ensure_ascii=False, separators=(',', ':')) + "\n"
+                                            for evento in eventos_dia[i:i + TAMANO_LOTE_ANALITICA]))
+                    volcados += len(eventos_dia)
+                except (OSError, TypeError, ValueError) as e:
+                    print(f"❌ Error volcando {len(eventos_dia)} eventos de analítica del {dia}: {e}")
+                    self.descartados += len(eventos_dia)
+            self.volcados += volcados
+            return volcados
+
+    def compactar(self):
+        """
+        🗜️ Convierte a Parquet los logs de días ya cerrados (requiere pyarrow).
+
+        Returns:
+            list: Días compactados
+        """
+        if pyarrow is None:
+            return []
+        hoy = _dia(time.time())
+        compactados = []
+        with self._lock_escritura:
+            for ruta in sorted(glob.glob(self._ruta_log("*"))):
+                dia = os.path.basename(ruta)[len("eventos-"):-len(".jsonl")]
+                if dia >= hoy:
+                    continue
+                eventos = list(self._leer_jsonl(ruta))
+                # Si ya había un Parquet del día (eventos tardíos), se conservan sus filas
+                ruta_parquet = self._ruta_log(dia, "parquet")
+                if os.path.exists(ruta_parquet):
+                    eventos = pyarrow.parquet.read_table(ruta_parquet).to_pylist() + eventos
+                temporal = f"{ruta_parquet}.tmp"
+                try:
+                    tabla = pyarrow.table({columna: [evento.get(columna) for evento in eventos]
+                                           for columna in COLUMNAS_EVENTOS})
+                    pyarrow.parquet.write_table(tabla, temporal, compression="zstd")
+                    os.replace(temporal, ruta_parquet)
+                    os.remove(ruta)
+                except (OSError, pyarrow.ArrowException) as e:
+                    print(f"❌ No se pudo compactar el log de analítica del {dia}: {e}")
+                    continue
+                compactados.append(dia)
+        return compactados
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _leer_jsonl(ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    yield json.loads(linea)
+                except json.JSONDecodeError:
+                    continue  # Línea truncada por un corte durante la escritura
+
+    def leer_eventos(self, desde=None, hasta=None):
+        """
+        Eventos volcados entre dos días (YYYY-MM-DD, inclusive), en orden de día.
+
+        Los archivos Parquet se leen sólo si pyarrow está instalado.
+        """
+        por_dia = {}
+        for ruta in glob.glob(os.path.join(self.directorio, "eventos-*.*")):
+            dia, extension = os.path.basename(ruta)[len("eventos-"):].split(".", 1)
+            if extension in ("jsonl", "parquet") and (not desde or dia >= desde) and (not hasta or dia <= hasta):
+                por_dia.setdefault(dia, []).append((extension, ruta))
+        for dia in sorted(por_dia):
+            # Parquet primero: tiene los eventos anteriores a los que quedaron en JSONL
+            for extension, ruta in sorted(por_dia[dia], key=lambda archivo: archivo[0] != "parquet"):
+                if extension == "jsonl":
+                    yield from self._leer_jsonl(ruta)
+                elif pyarrow is not None:
+                    for evento in pyarrow.parquet.read_table(ruta).to_pylist():
+                        yield {clave: valor for clave, valor in evento.items() if valor is not None}
+
+    def agregados(self, desde=None, hasta=None, inactividad_abandono=INACTIVIDAD_ABANDONO):
+        """
+        📊 Resumen de las entrevistas de los eventos volcados.
+
+        Returns:
+            dict: entrevistas iniciadas y terminadas, distribución de
+            categorías, abandono por pregunta (entrevistas sin resultado
+            inactivas por más de inactividad_abandono segundos, según la
+            pregunta que quedó sin responder) y duración de las entrevistas
+            terminadas (segundos y respuestas, p50/p95)
+        """
+        ahora = time.time()
+        categorias = Counter()
+        resultados_sin_categoria = Counter()
+        duraciones = []
+        cantidades_respuestas = []
+        # sesion_id -> [pregunta pendiente, último evento, terminada]
+        entrevistas = {}
+        alcanzadas = Counter()
+
+        for evento in self.leer_eventos(desde, hasta):
+            tipo = evento.get("tipo")
+            entrevista = entrevistas.setdefault(evento.get("sesion_id"), [None, 0, False])
+            entrevista[1] = max(entrevista[1], evento.get("ts", 0))
+            if tipo == "inicio":
+                entrevista[0] = evento.get("pregunta_id")
+                alcanzadas[entrevista[0]] += 1
+            elif tipo == "respuesta":
+                entrevista[0] = evento.get("siguiente")
+                if entrevista[0]:
+                    alcanzadas[entrevista[0]] += 1
+            elif tipo == "resultado":
+                entrevista[2] = True
+                if evento.get("categoria"):
+                    categorias[f"{evento.get('tipo_actividad')}/{evento['categoria']}"] += 1
+                else:
+                    resultados_sin_categoria[evento.get("mensaje_id") or evento.get("paso")] += 1
+                if evento.get("duracion_s") is not None:
+                    duraciones.append(evento["duracion_s"])
+                if evento.get("respuestas") is not None:
+                    cantidades_respuestas.append(evento["respuestas"])
+
+        abandonos = Counter(
+            pendiente for pendiente, ultimo, terminada in entrevistas.values()
+            if not terminada and pendiente and ahora - ultimo > inactividad_abandono
+        )
+        return {
+            "entrevistas": len(entrevistas),
+            "terminadas": sum(1 for entrevista in entrevistas.values() if entrevista[2]),
+            "categorias": dict(categorias.most_common()),
+            "resultados_sin_categoria": dict(resultados_sin_categoria.most_common()),
+            "abandono_por_pregunta": {
+                pregunta: {"abandonos": cantidad, "alcanzada": alcanzadas[pregunta],
+                           "tasa": round(cantidad / alcanzadas[pregunta], 4) if alcanzadas[pregunta] else None}
+                for pregunta, cantidad in abandonos.most_common()
+            },
+            "duracion_s": {"p50": percentil(duraciones, 0.5), "p95": percentil(duraciones, 0.95)},
+            "respuestas_por_entrevista": {"p50": percentil(cantidades_respuestas, 0.5),
+                                          "p95": percentil(cantidades_respuestas, 0.95)}
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Agregados de la analítica de entrevistas")
+    parser.add_argument("--desde", help="Primer día (YYYY-MM-DD)")
+    parser.add_argument("--hasta", help="Último día (YYYY-MM-DD)")
+    parser.add_argument("--compactar", action="store_true", help="Compactar a Parquet los días cerrados")
+    args = parser.parse_args()
+
+    registro = RegistroAnalitica()
+    if args.compactar:
+        print(f"🗜️ Días compactados: {registro.compactar() or 'ninguno'}")
+    print(json.dumps(registro.agregados(args.desde, args.hasta), ensure_ascii=False, indent=2))
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE CAPTURA DE TRÁFICO - SISTEMA EXPERTO MONOTRIBUTO
+==========================================================
+
+Este módulo graba, si se activa, la secuencia de /iniciar_sesion y
+/responder de cada sesión para reproducirla después contra una instancia
+local (herramientas/reproducir_trafico.py), por ejemplo para convertir el
+tráfico de un día de vencimiento en un benchmark repetible.
+
+Formato del archivo (gzip, una línea JSON por registro):
+    {"formato", "inicio", "anonimizada"}                 cabecera
+    {"t", "s", "op": "iniciar", "p", "st", "f", "v"}     sesión iniciada
+    {"t", "s", "op": "responder", "p", "c", "st", "f"}   respuesta procesada
+
+    t   segundos desde el inicio de la captura
+    s   número de sesión dentro de la captura (los ids reales no se graban)
+    p   parámetros de la URL distintos del valor por defecto
+    c   cuerpo de la respuesta enviada
+    st  código de estado devuelto
+    f   firma del resultado (ver firma_resultado), para comparar al reproducir
+    v   versión de las reglas con la que empezó la sesión
+
+Como la analítica, registrar no hace I/O: los registros se acumulan en
+memoria y volcar() los agrega al archivo desde un hilo aparte.
+
+Con anonimización, los valores numéricos (ingresos) se reemplazan por el
+límite de categoría publicado inmediato superior, que lleva a la misma
+categoría y al mismo camino de la entrevista.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import bisect
+import gzip
+import json
+import math
+import threading
+import time
+from collections import deque
+
+
+FORMATO_CAPTURA = 1
+# Registros que pueden esperar en memoria a ser volcados
+CAPACIDAD_BUFFER_CAPTURA = 100_000
+
+
+def firma_resultado(resultado):
+    """
+    Resumen estable de un paso (completo o compacto) para comparar una
+    reproducción con la grabación: tipo, pregunta o mensaje, categoría y total.
+    """
+    tipo = resultado.get("tipo")
+    if tipo == "pregunta":
+        return f"pregunta:{resultado['pregunta']['id']}"
+    detalles = resultado.get("detalles", {})
+    partes = [tipo, resultado.get("mensaje_id") or resultado.get("mensaje"),
+              detalles.get("categoria"), detalles.get("total_general")]
+    return ":".join("" if parte is None else str(parte) for parte in partes)
+
+
+def anonimizar_valor(tablas, tipo_actividad, valor):
+    """
+    Reemplaza unos ingresos por el límite de categoría inmediato superior
+    (o, por encima de todas, por la potencia de 10 siguiente): la categoría
+    y las comparaciones contra los límites no cambian.
+    """
+    acumulados = tablas.ingresos_acumulados.get(tipo_actividad) or ()
+    posicion = bisect.bisect_left(acumulados, valor)
+    if posicion < len(acumulados):
+        return float(acumulados[posicion])
+    return float(10 ** math.ceil(math.log10(max(valor, 1) + 1)))
+
+
+class CapturaTrafico:
+    """
+    Grabación de las peticiones de la entrevista en un archivo gzip JSONL.
+
+    Args:
+        ruta (str): Archivo de la captura (se agregan registros si ya existe)
+        anonimizar (bool): Reemplazar los valores numéricos (ver anonimizar_valor)
+        capacidad (int): Registros que pueden esperar en memoria a ser volcados
+    """
+
+    def __init__(self, ruta, anonimizar=False, capacidad=CAPACIDAD_BUFFER_CAPTURA):
+        self.ruta = ruta
+        self.anonimizar = anonimizar
+        self.inicio = time.time()
+        self._buffer = deque(maxlen=capacidad)
+        self._buffer.append({"formato": FORMATO_CAPTURA, "inicio": round(self.inicio, 3),
+                             "anonimizada": anonimizar})
+        # sesion_id -> número de sesión en la captura, mientras la entrevista sigue abierta
+        self._sesiones = {}
+        self._cantidad_sesiones = 0
+        self.registrados = 0
+        self.descartados = 0
+        self._lock_escritura = threading.Lock()
+
+    def _registrar(self, registro):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.descartados += 1
+        self._buffer.append({"t": round(time.time() - self.inicio, 4), **registro})
+        self.registrados += 1
+
+    def iniciar(self, sesion_id, parametros, estado, paso):
+        """Graba una sesión iniciada"""
+        numero = self._sesiones[sesion_id] = self._cantidad_sesiones
+        self._cantidad_sesiones += 1
+        self._registrar({"s": numero, "op": "iniciar", "p": parametros, "st": 200,
+                         "f": firma_resultado(paso), "v": estado.get("version_reglas")})
+
+    def responder(self, sesion_id, parametros, cuerpo, status, resultado=None, tablas=None, tipo_actividad=None):
+        """Graba una respuesta de una sesión iniciada durante la captura (las demás se ignoran)"""
+        numero = self._sesiones.get(sesion_id)
+        if numero is None:
+            return
+        if self.anonimizar and cuerpo.get("valor_numerico") is not None and tablas is not None:
+            valor = anonimizar_valor(tablas, tipo_actividad, cuerpo["valor_numerico"])
+            cuerpo = {**cuerpo, "valor_numerico": valor, "respuesta": f"{valor:.0f}"}
+        registro = {"s": numero, "op": "responder", "p": parametros, "c": cuerpo, "st": status}
+        if resultado is not None:
+            registro["f"] = firma_resultado(resultado)
+            if resultado.get("tipo") != "pregunta":
+                # Entrevista terminada: los reintentos posteriores no se graban
+                self._sesiones.pop(sesion_id, None)
+        self._registrar(registro)
+
+    def volcar(self):
+        """
+        💾 Agrega los registros pendientes al archivo (un miembro gzip por volcado).
+
+        Returns:
+            int: Cantidad de registros volcados
+        """
+        with self._lock_escritura:
+            registros = []
+            while self._buffer:
+                registros.append(self._buffer.popleft())
+            if not registros:
+                return 0
+            try:
+                with gzip.open(self.ruta, 'at', encoding='utf-8') as f:
+                    f.write("".join(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + "\n"
+                                    for registro in registros))
+            except OSError as e:
+                print(f"❌ Error volcando {len(registros)} registros de la captura de tráfico: {e}")
+                self.descartados += len(registros)
+                return 0
+            return len(registros)
+
+    def metricas(self):
+        return {"ruta": self.ruta, "registrados": self.registrados, "pendientes": len(self._buffer),
+                "descartados": self.descartados, "sesiones_abiertas": len(self._sesiones)}
+
+
+def leer_captura(ruta):
+    """
+    📼 Lee una captura y agrupa sus registros por sesión.
+
+    Returns:
+        tuple: (cabeceras, sesiones) donde sesiones es una lista de listas de
+        registros ordenadas por el instante de su primera petición. Sólo se
+        incluyen sesiones cuya iniciación quedó grabada.
+    """
+    cabeceras = []
+    por_sesion = {}
+    desplazamiento = 0.0
+    try:
+        with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue  # Línea truncada por un corte durante la escritura
+                if "formato" in registro:
+                    # Capturas sucesivas en el mismo archivo: números de sesión e
+                    # instantes relativos a cada cabecera
+                    if cabeceras:
+                        desplazamiento = registro["inicio"] - cabeceras[0]["inicio"]
+                    cabeceras.append(registro)
+                    continue
+                clave = (len(cabeceras), registro["s"])
+                if registro["op"] == "iniciar":
+                    por_sesion[clave] = []
+                if clave in por_sesion:
+                    por_sesion[clave].append({**registro, "t": registro["t"] + desplazamiento})
+    except EOFError:
+        # Último volcado incompleto (el servidor se cortó): se usa lo leído
+        print(f"⚠️  La captura {ruta} termina incompleta, se usan los registros legibles")
+    sesiones = sorted(por_sesion.values(), key=lambda registros: registros[0]["t"])
+    return cabeceras, sesiones
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE CHECKPOINT DE SESIONES - SISTEMA EXPERTO MONOTRIBUTO
+==============================================================
+
+Este módulo mantiene las sesiones de entrevista en memoria y las guarda en
+disco para que un reinicio o un despliegue no corte las entrevistas en
+curso.
+
+Estructura en disco (carpeta data/sesiones/):
+    shard-XX.jsonl.gz   Una línea JSON por sesión ({"sesion_id", "estado"})
+
+Las sesiones se reparten en shards por el hash de su id:
+
+    - un checkpoint reescribe sólo los shards con cambios, cada uno en un
+      archivo temporal que reemplaza al anterior de forma atómica
+    - al arrancar no se lee nada: cada shard se restaura la primera vez que
+      se busca una sesión que le pertenece, así el tiempo de arranque no
+      depende de cuántas sesiones haya guardadas
+    - las sesiones sin actividad durante más de TTL_SESIONES se descartan
+      al restaurar y en cada checkpoint
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+
+
+CANTIDAD_SHARDS_CHECKPOINT = 16
+# Segundos sin actividad tras los cuales una sesión expira (2 horas)
+TTL_SESIONES = 2 * 60 * 60
+
+
+def _directorio_por_defecto():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), 'data', 'sesiones')
+
+
+class AlmacenSesiones:
+    """
+    Sesiones en memoria con checkpoint en disco por shards y restauración
+    perezosa.
+
+    Cada estado se guarda con la marca "actualizada" (segundos epoch) de su
+    última modificación, que determina su expiración. Los estados guardados
+    no deben modificarse en el lugar: se reemplazan con guardar().
+    """
+
+    def __init__(self, directorio=None, shards=CANTIDAD_SHARDS_CHECKPOINT, ttl=TTL_SESIONES):
+        self.directorio = directorio or _directorio_por_defecto()
+        self.ttl = ttl
+        self._shards = [{} for _ in range(shards)]
+        self._restaurados = [False] * shards
+        self._modificados = set()
+        # Los checkpoints corren en un hilo aparte del event loop
+        self._lock = threading.Lock()
+        self._lock_escritura = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Shards
+    # ------------------------------------------------------------------
+
+    def _indice(self, sesion_id):
+        return zlib.crc32(sesion_id.encode('utf-8')) % len(self._shards)
+
+    def _ruta_shard(self, indice):
+        return os.path.join(self.directorio, f"shard-{indice:02d}.jsonl.gz")
+
+    def _vigente(self, estado, ahora):
+        return ahora - estado.get("actualizada", 0) <= self.ttl
+
+    def _restaurar(self, indice):
+        """Carga un shard de disco (una sola vez); las sesiones en memoria tienen prioridad"""
+        with self._lock:
+            if self._restaurados[indice]:
+                return
+            ruta = self._ruta_shard(indice)
+            if os.path.exists(ruta):
+                ahora = time.time()
+                restauradas = {}
+                try:
+                    with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+                        for linea in f:
+                            entrada = json.loads(linea)
+                            if self._vigente(entrada["estado"], ahora):
+                                restauradas[entrada["sesion_id"]] = entrada["estado"]
+                except (OSError, EOFError, json.JSONDecodeError, KeyError) as e:
+                    # Un shard dañado no impide usar las sesiones leídas hasta el error
+                    print(f"⚠️  Checkpoint de sesiones {os.path.basename(ruta)} ilegible ({e}), se restauran {len(restauradas)}")
+                restauradas.update(self._shards[indice])
+                self._shards[indice] = restauradas
+            self._restaurados[indice] = True
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def obtener(self, sesion_id):
+        """Estado de una sesión vigente, o None si no existe o expiró"""
+        indice = self._indice(sesion_id)
+        if not self._restaurados[indice]:
+            self._restaurar(indice)
+        estado = self._shards[indice].get(sesion_id)
+        if estado is None or not self._vigente(estado, time.time()):
+            return None
+        return estado
+
+    def guardar(self, sesion_id, estado):
+        """Guarda (o reemplaza) el estado de una sesión y marca su actividad"""
+        indice = self._indice(sesion_id)
+        if not self._restaurados[indice]:
+            self._restaurar(indice)
+        estado["actualizada"] = time.time()
+        with self._lock:
+            self._shards[indice][sesion_id] = estado
+            self._modificados.add(indice)
+
+    def eliminar(self, sesion_id):
+        """Elimina una sesión (también de disco en el próximo checkpoint)"""
+        indice = self._indice(sesion_id)
+        if not self._restaurados[indice]:
+            self._restaurar(indice)
+        with self._lock:
+            if self._shards[indice].pop(sesion_id, None) is not None:
+                self._modificados.add(indice)
+
+    def __len__(self):
+        """Sesiones en memoria (sin contar las de shards aún no restaurados)"""
+        return sum(len(shard) for shard in self._shards)
+
+    def checkpoint(self):
+        """
+        💾 Escribe en disco los shards modificados desde el último checkpoint
+        y descarta las sesiones expiradas.
+
+        Returns:
+            int: Cantidad de sesiones escritas
+        """
+        with self._lock_escritura:
+            return self._checkpoint()
+
+    def _checkpoint(self):
+        ahora = time.time()
+        with self._lock:
+            for indice, shard in enumerate(self._shards):
+                expiradas = [sesion_id for sesion_id, estado in shard.items() if not self._vigente(estado, ahora)]
+                for sesion_id in expiradas:
+                    del shard[sesion_id]
+                if expiradas:
+                    self._modificados.add(indice)
+            modificados = sorted(self._modificados)
+            self._modificados.clear()
+            # Copia de las referencias: los estados se reemplazan, no se modifican
+            pendientes = {indice: list(self._shards[indice].items()) for indice in modificados}
+
+        os.makedirs(self.directorio, exist_ok=True)
+        escritas = 0
+        for indice, sesiones in pendientes.items():
+            ruta = self._ruta_shard(indice)
+            temporal = f"{ruta}.tmp"
+            try:
+                with gzip.open(temporal, 'wt', encoding='utf-8', compresslevel=1) as f:
+                    for sesion_id, estado in sesiones:
+                        f.write(json.dumps({"sesion_id": sesion_id, "estado": estado},
+                                           ensure_ascii=False, separators=(',', ':')) + "\n")
+                os.replace(temporal, ruta)
+                escritas += len(sesiones)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"❌ Error en el checkpoint de {os.path.basename(ruta)}: {e}")
+                with self._lock:
+                    self._modificados.add(indice)
+        return escritas
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE CONTABILIDAD DE MEMORIA - SISTEMA EXPERTO MONOTRIBUTO
+===============================================================
+
+Este módulo reparte la memoria del proceso entre sus subsistemas con
+tracemalloc, para saber cuánto cuesta cada sesión, la base de conocimiento
+o las tablas, y para encontrar pérdidas comparando dos mediciones.
+
+Subsistemas:
+    sesiones         estados de las entrevistas (almacén, inferencia, tokens)
+    knowledge_base   reglas cargadas y compiladas, catálogo
+    datos            categorías, pagos y AREF (tablas, matriz de pagos, historial, snapshot)
+    scraper          lo que sigue vivo de las consultas a AFIP/AREF (pandas, lxml, HTTP)
+    otros            todo lo demás
+
+Cada bloque se atribuye recorriendo su traceback desde el marco más
+reciente: el primer marco que cae en una función o un módulo registrado con
+atribuir() decide el subsistema (las funciones tienen prioridad sobre su
+módulo). Las bibliotecas (pandas, lxml...) sólo deciden si ningún marco es
+del proyecto. Por eso los diccionarios que arma el scraper y que siguen en
+uso cuentan como scraper.
+
+El muestreo se activa y desactiva en caliente (cuesta CPU y memoria
+mientras está activo) y sólo ve lo asignado después de activarlo: para
+incluir las reglas y las tablas cargadas al arrancar hay que activarlo
+antes (MUESTREO_MEMORIA en la API) o recargar los datos con el muestreo
+activo. La memoria mapeada (snapshot.bin) no pasa por tracemalloc.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import gc
+import importlib.util
+import inspect
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import NamedTuple
+
+
+SUBSISTEMAS = ("sesiones", "knowledge_base", "datos", "scraper", "otros")
+# Marcos guardados por bloque: más marcos atribuyen mejor pero cuestan más
+MARCOS_POR_DEFECTO = 25
+# Sitios de asignación listados por subsistema
+PRINCIPALES_POR_DEFECTO = 5
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PROPIOS = {tracemalloc.__file__, __file__}
+
+
+class MedicionMemoria(NamedTuple):
+    """Memoria viva agregada de un snapshot de tracemalloc"""
+    instante: float
+    subsistemas: dict  # subsistema -> [bytes, bloques]
+    sitios: dict  # (subsistema, "archivo:línea") -> [bytes, bloques]
+
+
+def _sitio(frame):
+    """"archivo:línea" relativo a la raíz del proyecto (o con la carpeta, fuera de él)"""
+    nombre = frame.filename
+    if nombre.startswith(RAIZ + os.sep):
+        nombre = os.path.relpath(nombre, RAIZ)
+    else:
+        nombre = os.sep.join(nombre.split(os.sep)[-2:])
+    return f"{nombre}:{frame.lineno}"
+
+
+def _ordenados(sitios, principales):
+    return [{"sitio": sitio, "bytes": tamano, "bloques": bloques}
+            for sitio, (tamano, bloques) in sorted(sitios, key=lambda item: -abs(item[1][0]))[:principales]]
+
+
+class ContabilidadMemoria:
+    """
+    Mediciones de memoria por subsistema con tracemalloc.
+
+    Args:
+        marcos (int): Marcos por bloque al activar el muestreo
+    """
+
+    def __init__(self, marcos=MARCOS_POR_DEFECTO):
+        self.marcos = marcos
+        self._archivos = {}  # ruta -> subsistema de todo el módulo
+        self._funciones = defaultdict(list)  # ruta -> [(primera línea, última línea, subsistema)]
+        self._bibliotecas = []  # (prefijo de ruta, subsistema)
+        self._clasificados = {}  # traceback -> (subsistema, marco que decidió)
+        self._ultima = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Atribución
+    # ------------------------------------------------------------------
+
+    def atribuir(self, subsistema, *objetivos):
+        """
+        Atribuye a un subsistema lo asignado dentro de unos objetivos:
+        módulos, funciones, clases (todos sus métodos) o nombres de paquetes
+        instalados (bibliotecas, que no se importan: si no están, se ignoran).
+        """
+        if subsistema not in SUBSISTEMAS:
+            raise ValueError(f"Subsistema desconocido: {subsistema}")
+        for objetivo in objetivos:
+            if isinstance(objetivo, str):
+                spec = importlib.util.find_spec(objetivo)
+                if spec is not None:
+                    rutas = spec.submodule_search_locations or [spec.origin]
+                    self._bibliotecas.extend((os.path.abspath(ruta), subsistema) for ruta in rutas if ruta)
+            elif inspect.ismodule(objetivo):
+                self._archivos[os.path.abspath(objetivo.__file__)] = subsistema
+            elif inspect.isclass(objetivo):
+                self.atribuir(subsistema, *(miembro for miembro in vars(objetivo).values() if inspect.isfunction(miembro)))
+            else:
+                funcion = inspect.unwrap(objetivo)
+                lineas, primera = inspect.getsourcelines(funcion)
+                self._funciones[os.path.abspath(funcion.__code__.co_filename)].append(
+                    (primera, primera + len(lineas) - 1, subsistema))
+        self._clasificados.clear()
+
+    def _clasificar(self, traceback):
+        clasificado = self._clasificados.get(traceback)
+        if clasificado is not None:
+            return clasificado
+        biblioteca = None
+        for frame in reversed(traceback):  # del marco más reciente al más antiguo
+            ruta = os.path.abspath(frame.filename)
+            subsistema = next((subsistema for primera, ultima, subsistema in self._funciones.get(ruta, ())
+                               if primera <= frame.lineno <= ultima), None) or self._archivos.get(ruta)
+            if subsistema:
+                clasificado = (subsistema, frame)
+                break
+            if biblioteca is None:
+                biblioteca = next(((subsistema, frame) for prefijo, subsistema in self._bibliotecas
+                                   if ruta.startswith(prefijo)), None)
+        else:
+            clasificado = biblioteca or ("otros", traceback[-1])
+        self._clasificados[traceback] = clasificado
+        return clasificado
+
+    # ------------------------------------------------------------------
+    # Muestreo
+    # ------------------------------------------------------------------
+
+    @property
+    def activo(self):
+        return tracemalloc.is_tracing()
+
+    def activar(self, marcos=None):
+        """
+        ▶️ Empieza a muestrear (o cambia la cantidad de marcos, reiniciando el
+        muestreo). Descarta la medición anterior.
+        """
+        with self._lock:
+            self.marcos = marcos or self.marcos
+            if tracemalloc.is_tracing():
+                if tracemalloc.get_traceback_limit() == self.marcos:
+                    return self.estado()
+                tracemalloc.stop()
+            tracemalloc.start(self.marcos)
+            self._ultima = None
+            self._clasificados.clear()
+            return self.estado()
+
+    def desactivar(self):
+        """⏹️ Deja de muestrear y libera los datos de tracemalloc"""
+        with self._lock:
+            tracemalloc.stop()
+            self._ultima = None
+            self._clasificados.clear()
+            return self.estado()
+
+    def estado(self):
+        """Muestreo activo, marcos y memoria rastreada (actual y pico) y propia de tracemalloc"""
+        if not tracemalloc.is_tracing():
+            return {"activo": False, "marcos": self.marcos}
+        actual, pico = tracemalloc.get_traced_memory()
+        return {"activo": True, "marcos": tracemalloc.get_traceback_limit(), "rastreada_bytes": actual,
+                "pico_bytes": pico, "sobrecarga_bytes": tracemalloc.get_tracemalloc_memory()}
+
+    def tomar(self, recolectar=True):
+        """
+        📸 Toma un snapshot (tras una recolección de basura completa, para no
+        contar ciclos ya inalcanzables) y lo agrega por subsistema y sitio.
+
+        Raises:
+            RuntimeError: Si el muestreo no está activo
+        """
+        if recolectar:
+            gc.collect()
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("El muestreo de memoria no está activo")
+        snapshot = tracemalloc.take_snapshot()
+        subsistemas = {subsistema: [0, 0] for subsistema in SUBSISTEMAS}
+        sitios = defaultdict(lambda: [0, 0])
+        for estadistica in snapshot.statistics("traceback"):
+            if estadistica.traceback[-1].filename in _PROPIOS:
+                continue  # Lo asignado por tracemalloc y por las mediciones anteriores
+            subsistema, frame = self._clasificar(estadistica.traceback)
+            for acumulado in (subsistemas[subsistema], sitios[(subsistema, _sitio(frame))]):
+                acumulado[0] += estadistica.size
+                acumulado[1] += estadistica.count
+        return MedicionMemoria(time.time(), subsistemas, dict(sitios))
+
+    # ------------------------------------------------------------------
+    # Informes
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def informe(medicion, sesiones_vivas=None, principales=PRINCIPALES_POR_DEFECTO):
+        """
+        Memoria viva por subsistema con sus principales sitios de asignación y,
+        si se indica cuántas sesiones hay vivas, los bytes por sesión.
+        """
+        por_subsistema = defaultdict(list)
+        for (subsistema, sitio), valores in medicion.sitios.items():
+            por_subsistema[subsistema].append((sitio, valores))
+        informe = {
+            "instante": round(medicion.instante, 3),
+            "total_bytes": sum(tamano for tamano, _ in medicion.subsistemas.values()),
+            "subsistemas": {subsistema: {"bytes": tamano, "bloques": bloques,
+                                         "principales": _ordenados(por_subsistema[subsistema], principales)}
+                            for subsistema, (tamano, bloques) in medicion.subsistemas.items()}
+        }
+        if sesiones_vivas is not None:
+            informe["sesiones_vivas"] = sesiones_vivas
+            informe["bytes_por_sesion"] = (round(medicion.subsistemas["sesiones"][0] / sesiones_vivas)
+                                           if sesiones_vivas else None)
+        return informe
+
+    @staticmethod
+    def diferencia(anterior, actual, principales=PRINCIPALES_POR_DEFECTO):
+        """
+        🔍 Lo que cambió entre dos mediciones: por subsistema y los sitios que
+        más crecieron (candidatos a pérdidas: lo que crece medición tras
+        medición sin que crezcan las sesiones).
+        """
+        sitios = {}
+        for clave in actual.sitios.keys() | anterior.sitios.keys():
+            tamano, bloques = actual.sitios.get(clave, (0, 0))
+            tamano_previo, bloques_previos = anterior.sitios.get(clave, (0, 0))
+            if tamano != tamano_previo:
+                sitios[clave] = (tamano - tamano_previo, bloques - bloques_previos)
+        crecimiento = sorted(((clave, valores) for clave, valores in sitios.items() if valores[0] > 0),
+                             key=lambda item: -item[1][0])[:principales]
+        return {
+            "segundos": round(actual.instante - anterior.instante, 3),
+            "total_bytes": sum(tamano for tamano, _ in actual.subsistemas.values())
+                           - sum(tamano for tamano, _ in anterior.subsistemas.values()),
+            "subsistemas": {subsistema: {"bytes": actual.subsistemas[subsistema][0] - anterior.subsistemas[subsistema][0],
+                                         "bloques": actual.subsistemas[subsistema][1] - anterior.subsistemas[subsistema][1]}
+                            for subsistema in SUBSISTEMAS},
+            "crecimiento": [{"subsistema": subsistema, "sitio": sitio, "bytes": tamano, "bloques": bloques}
+                            for (subsistema, sitio), (tamano, bloques) in crecimiento]
+        }
+
+    def medir(self, sesiones_vivas=None, principales=PRINCIPALES_POR_DEFECTO, comparar=True):
+        """
+        📊 Toma una medición, la informa y (con comparar) la compara con la
+        anterior de esta contabilidad, a la que reemplaza.
+
+        Raises:
+            RuntimeError: Si el muestreo no está activo
+        """
+        with self._lock:
+            medicion = self.tomar()
+            informe = {"muestreo": self.estado(), **self.informe(medicion, sesiones_vivas, principales)}
+            if comparar and self._ultima is not None:
+                informe["diferencia"] = self.diferencia(self._ultima, medicion, principales)
+            self._ultima = medicion
+            return informe
+
+
+def atribuir_modulos(contabilidad):
+    """
+    Atribuye los módulos de src/ (y las bibliotecas del scraper) a sus
+    subsistemas. Cada módulo o función pertenece a un único subsistema; en los
+    módulos que sirven a varios se atribuyen sus puntos de entrada, y las
+    funciones auxiliares cuentan para el subsistema de quien las llama.
+    """
+    import checkpoint_sesiones
+    import data_manager
+    import fuentes_datos
+    import historial_datos
+    import jurisdicciones
+    import monotributo_scraper
+    import motor_inferencia
+    import motor_pagos
+    import snapshot_binario
+    import tablas_monotributo
+    import token_sesion
+
+    motor = motor_inferencia.MotorInferencia
+    snapshot = snapshot_binario.SnapshotMonotributo
+    contabilidad.atribuir("sesiones", checkpoint_sesiones, motor_inferencia.estado_inicial,
+                          motor.iniciar, motor.responder, motor.anticipar, motor.evaluar, motor.explicar,
+                          motor.compactar, motor._inferir,
+                          token_sesion.CodificadorTokens.codificar, token_sesion.CodificadorTokens.decodificar,
+                          token_sesion.versiones_del_token, token_sesion.nuevo_sesion_id)
+    contabilidad.atribuir("knowledge_base", motor_inferencia.cargar_reglas, motor_inferencia.validar_reglas,
+                          motor_inferencia.compilar_reglas, motor_inferencia.version_reglas,
+                          motor.__init__, motor._ordenar, motor.con_reglas, motor.catalogo, motor.cobertura_reglas,
+                          snapshot_binario._registro_regla, snapshot.reglas,
+                          token_sesion.CodificadorTokens.__init__, jurisdicciones)
+    contabilidad.atribuir("datos", data_manager, historial_datos, motor_pagos, tablas_monotributo,
+                          snapshot_binario.compilar_snapshot, snapshot_binario.compilar_desde_fuentes,
+                          snapshot_binario.abrir_snapshot, snapshot.__init__, snapshot.tablas,
+                          fuentes_datos.huellas_previas_fuentes, fuentes_datos.datos_con_cache)
+    contabilidad.atribuir("scraper", monotributo_scraper,
+                          fuentes_datos.procesar_pagina_afip, fuentes_datos.extraer_montos_por_categoria,
+                          fuentes_datos.procesar_tabla_por_categoria, fuentes_datos._nuevo_cliente,
+                          fuentes_datos.cliente_compartido, fuentes_datos._sesion_http, fuentes_datos._descargar,
+                          fuentes_datos.consultar_fuente, fuentes_datos.consultar_fuentes,
+                          "pandas", "lxml", "bs4", "html5lib", "httpx", "httpcore", "requests", "urllib3")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE CONTROL DE ADMISIÓN - SISTEMA EXPERTO MONOTRIBUTO
+===========================================================
+
+Este módulo limita el trabajo en curso de la API para que, ante los picos
+de los vencimientos de recategorización, la latencia de las entrevistas ya
+empezadas no se degrade junto con la de todos los demás:
+
+    - hay un máximo de peticiones en curso; las que exceden esperan en una
+      cola por prioridad, con un tamaño máximo y un plazo de espera
+    - las respuestas a sesiones existentes tienen prioridad sobre las
+      sesiones nuevas: al liberarse un lugar se atiende primero la cola de
+      respuestas, y una sesión nueva no entra mientras haya respuestas
+      esperando
+    - con la cola llena o el plazo vencido se rechaza enseguida con
+      Sobrecarga, que la API traduce a 503 con Retry-After
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+# Prioridades, de mayor a menor
+PRIORIDADES = ("respuesta", "nueva_sesion")
+
+
+class Sobrecarga(Exception):
+    """Petición rechazada por el control de admisión"""
+
+    def __init__(self, prioridad, motivo, reintentar_en):
+        super().__init__(f"Servicio sobrecargado ({motivo}), reintentar en {reintentar_en} s")
+        self.prioridad = prioridad
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+
+class ControlAdmision:
+    """
+    Limitador de concurrencia con colas por prioridad y plazos de espera.
+
+    Args:
+        maximo_en_curso (int): Peticiones atendidas a la vez
+        colas_maximas (dict): prioridad -> peticiones que pueden esperar
+        esperas_maximas (dict): prioridad -> segundos máximos de espera en cola
+        reintentar_en (dict): prioridad -> segundos sugeridos en Retry-After
+    """
+
+    def __init__(self, maximo_en_curso, colas_maximas, esperas_maximas, reintentar_en):
+        self.maximo_en_curso = maximo_en_curso
+        self.colas_maximas = colas_maximas
+        self.esperas_maximas = esperas_maximas
+        self.reintentar_en = reintentar_en
+        self.en_curso = 0
+        self._colas = {prioridad: deque() for prioridad in PRIORIDADES}
+        self._contadores = {
+            prioridad: {"admitidas": 0, "encoladas": 0, "rechazadas_cola_llena": 0,
+                        "rechazadas_plazo_vencido": 0}
+            for prioridad in PRIORIDADES
+        }
+        # prioridad -> [segundos esperados en total, peticiones admitidas tras esperar]
+        self._esperas = {prioridad: [0.0, 0] for prioridad in PRIORIDADES}
+
+    def _hay_espera_prioritaria(self, prioridad):
+        """¿Hay alguien esperando con igual o mayor prioridad?"""
+        for otra in PRIORIDADES:
+            if self._colas[otra]:
+                return True
+            if otra == prioridad:
+                return False
+        return False
+
+    def _rechazar(self, prioridad, motivo):
+        self._contadores[prioridad][f"rechazadas_{motivo}"] += 1
+        return Sobrecarga(prioridad, motivo, self.reintentar_en[prioridad])
+
+    async def entrar(self, prioridad):
+        """
+        Ocupa un lugar, esperando en cola si hace falta (liberarlo con salir()).
+
+        Raises:
+            Sobrecarga: Si la cola de esa prioridad está llena o vence el plazo
+        """
+        contadores = self._contadores[prioridad]
+        if self.en_curso < self.maximo_en_curso and not self._hay_espera_prioritaria(prioridad):
+            self.en_curso += 1
+            contadores["admitidas"] += 1
+            return
+
+        cola = self._colas[prioridad]
+        if len(cola) >= self.colas_maximas[prioridad]:
+            raise self._rechazar(prioridad, "cola_llena")
+
+        futuro = asyncio.get_running_loop().create_future()
+        cola.append(futuro)
+        contadores["encoladas"] += 1
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(futuro, timeout=self.esperas_maximas[prioridad])
+        except asyncio.TimeoutError:
+            if not (futuro.done() and not futuro.cancelled()):
+                self._quitar_de_cola(cola, futuro)
+                raise self._rechazar(prioridad, "plazo_vencido")
+        except asyncio.CancelledError:
+            # El cliente se fue mientras esperaba: si ya se le había cedido un lugar, se libera
+            if futuro.done() and not futuro.cancelled():
+                self.salir()
+            else:
+                self._quitar_de_cola(cola, futuro)
+            raise
+        contadores["admitidas"] += 1
+        self._esperas[prioridad][0] += time.perf_counter() - inicio
+        self._esperas[prioridad][1] += 1
+
+    @staticmethod
+    def _quitar_de_cola(cola, futuro):
+        try:
+            cola.remove(futuro)
+        except ValueError:
+            pass
+
+    def salir(self):
+        """Libera un lugar"""
+        # El lugar pasa directamente al primero en espera de mayor prioridad
+        for prioridad in PRIORIDADES:
+            cola = self._colas[prioridad]
+            while cola:
+                futuro = cola.popleft()
+                if not futuro.done():
+                    futuro.set_result(True)
+                    return
+        self.en_curso -= 1
+
+    @asynccontextmanager
+    async def admitir(self, prioridad):
+        """
+        🚦 Ocupa un lugar durante el bloque (ver entrar).
+        """
+        await self.entrar(prioridad)
+        try:
+            yield
+        finally:
+            self.salir()
+
+    def metricas(self):
+        """📈 Trabajo en curso, profundidad de las colas y contadores por prioridad"""
+        por_prioridad = {}
+        for prioridad in PRIORIDADES:
+            contadores = dict(self._contadores[prioridad])
+            espera_total, esperas = self._esperas[prioridad]
+            contadores["en_cola"] = len(self._colas[prioridad])
+            contadores["espera_media_ms"] = round(espera_total * 1000 / esperas, 3) if esperas else 0.0
+            por_prioridad[prioridad] = contadores
+        return {
+            "en_curso": self.en_curso,
+            "maximo_en_curso": self.maximo_en_curso,
+            "prioridades": por_prioridad
+        }
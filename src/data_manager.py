@@ -7,60 +7,289 @@ MÓDULO DE GESTIÓN DE DATOS LOCALES - SISTEMA EXPERTO MONOTRIBUTO
 Este módulo se encarga de la gestión de archivos JSON locales para
 almacenar y cargar datos de categorías y pagos del Monotributo.
 
+Las escrituras son atómicas: cada archivo se escribe en un temporal del
+mismo directorio, se sincroniza con fsync y se renombra sobre el original,
+así un corte a mitad de camino deja la versión anterior intacta. Las
+escrituras concurrentes se serializan con un lock de archivo (entre
+procesos) y, dentro de un proceso, se agrupan: si mientras se escribe
+llegan varios datos nuevos sólo se escribe el último.
+
+Junto a los datos se guarda data/manifiesto.json con el SHA-256, el tamaño
+y el mtime de cada archivo y la huella de sus datos. Al cargar, un archivo
+cuyo tamaño y mtime no cambiaron desde la última lectura no se vuelve a
+leer ni a parsear, y uno que no coincide con el manifiesto se informa.
+
 Autor: Sistema Experto Emprendedor Fueguino
 Fecha: 2025
 """
 
+import hashlib
 import json
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows: sólo se serializan las escrituras del mismo proceso
+    fcntl = None
+
+from historial_datos import obtener_historial
+from tablas_monotributo import construir_tablas
+
+
+ARCHIVOS_DATOS = ("categorias.json", "pagos.json")
+NOMBRE_MANIFIESTO = "manifiesto.json"
+NOMBRE_LOCK = ".datos.lock"
+
+# Escrituras pendientes dentro del proceso: (generación, datos) del último pedido
+_lock_pendiente = threading.Lock()
+_lock_escritura = threading.Lock()
+_pendiente = None
+_generacion_pedida = 0
+_generacion_escrita = 0
+_resultado_escritura = True
+
+# Archivos ya leídos: ruta -> (tamaño, mtime_ns, contenido parseado)
+_cache_lecturas = {}
+_lock_cache = threading.Lock()
+
+
+def _directorio_datos():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), 'data')
+
+
+def _serializar(datos):
+    """JSON compacto (UTF-8, sin espacios)"""
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def huella_datos(datos):
+    """SHA-256 de unos datos en forma canónica (claves ordenadas)"""
+    return hashlib.sha256(json.dumps(datos, ensure_ascii=False, sort_keys=True,
+                                     separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def escribir_atomico(ruta, contenido):
+    """
+    ✍️ Escribe bytes en un archivo de forma atómica: temporal en el mismo
+    directorio, fsync y rename (y fsync del directorio, donde se puede).
+
+    Returns:
+        os.stat_result: Estado del archivo escrito
+    """
+    directorio = os.path.dirname(ruta)
+    descriptor, temporal = tempfile.mkstemp(prefix=f".{os.path.basename(ruta)}.", suffix=".tmp", dir=directorio)
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.unlink(temporal)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        descriptor_directorio = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor_directorio)
+        finally:
+            os.close(descriptor_directorio)
+    return os.stat(ruta)
+
+
+@contextmanager
+def _lock_archivo(data_dir):
+    """Lock exclusivo entre procesos sobre data/.datos.lock (no-op sin fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(data_dir, NOMBRE_LOCK), 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def cargar_manifiesto(data_dir=None):
+    """
+    📜 Lee data/manifiesto.json.
+
+    Returns:
+        dict: {"archivos": {nombre: {"sha256", "tamaño", "mtime_ns", "huella_datos"}}} (vacío si no hay)
+    """
+    try:
+        with open(os.path.join(data_dir or _directorio_datos(), NOMBRE_MANIFIESTO), 'rb') as f:
+            manifiesto = json.loads(f.read())
+    except (OSError, ValueError):
+        return {"archivos": {}}
+    if not isinstance(manifiesto, dict) or not isinstance(manifiesto.get("archivos"), dict):
+        return {"archivos": {}}
+    return manifiesto
+
+
+def _leer_json(ruta, manifiesto=None):
+    """
+    Contenido parseado de un archivo JSON, reutilizando la lectura anterior si
+    su tamaño y mtime no cambiaron. Si hay entrada en el manifiesto se verifica
+    el SHA-256 de lo leído (una diferencia se informa, no impide la carga).
 
-def guardar_datos_json_locales(categorias, pagos):
+    Raises:
+        OSError, json.JSONDecodeError: Si el archivo no se puede leer o parsear
+    """
+    stat = os.stat(ruta)
+    with _lock_cache:
+        previo = _cache_lecturas.get(ruta)
+    if previo and previo[:2] == (stat.st_size, stat.st_mtime_ns):
+        return previo[2]
+
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    entrada = (manifiesto or {}).get("archivos", {}).get(os.path.basename(ruta))
+    if entrada and entrada.get("sha256") != hashlib.sha256(contenido).hexdigest():
+        print(f"⚠️  {os.path.basename(ruta)} no coincide con el manifiesto (¿editado a mano o escritura incompleta?)")
+    datos = json.loads(contenido)
+    with _lock_cache:
+        _cache_lecturas[ruta] = (stat.st_size, stat.st_mtime_ns, datos)
+    return datos
+
+
+def datos_sin_metadatos(contenido):
+    """Datos de un archivo de tablas sin su envoltorio de metadatos ({"fecha_actualizacion", "fuente", "datos"})"""
+    if isinstance(contenido, dict) and "datos" in contenido:
+        return contenido["datos"]
+    return contenido
+
+
+def _entrada_manifiesto(ruta, contenido_datos):
+    """Entrada del manifiesto para un archivo de datos ya escrito"""
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    stat = os.stat(ruta)
+    return {"sha256": hashlib.sha256(contenido).hexdigest(), "tamaño": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "huella_datos": huella_datos(contenido_datos)}
+
+
+def _archivo_actualizado(ruta, entrada, huella):
+    """True si el archivo no cambió desde el manifiesto y sus datos tienen esa huella"""
+    if not entrada or entrada.get("huella_datos") != huella:
+        return False
+    try:
+        stat = os.stat(ruta)
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime_ns) == (entrada.get("tamaño"), entrada.get("mtime_ns"))
+
+
+def guardar_datos_json_locales(categorias, pagos, aref=None):
     """
     💾 Guarda los datos de categorías y pagos en archivos JSON locales.
     
+    Además registra la versión en el historial (data/historial/) para que
+    las tablas anteriores no se pierdan al sobrescribir los archivos. Si los
+    archivos ya tienen exactamente esos datos no se reescriben (así no
+    cambian sus huellas y el snapshot binario sigue vigente).
+    
+    Es seguro llamarla desde varios hilos o procesos a la vez: las escrituras
+    se hacen de a una y, si mientras tanto se pidieron varias, sólo se
+    escriben los datos del último pedido. Hace I/O bloqueante y fsync, así
+    que desde la API se llama en un hilo aparte.
+    
     Args:
         categorias (dict): Diccionario con datos de categorías
         pagos (dict): Diccionario con datos de pagos
+        aref (dict, optional): Datos AREF; si no se indican se leen de aref.json
         
     Returns:
-        bool: True si se guardaron exitosamente, False en caso de error
+        bool: True si se guardaron exitosamente (o los reemplazaron datos más
+        nuevos pedidos mientras tanto), False en caso de error
     """
+    global _pendiente, _generacion_pedida, _generacion_escrita, _resultado_escritura
+    with _lock_pendiente:
+        _generacion_pedida += 1
+        generacion = _generacion_pedida
+        _pendiente = (categorias, pagos, aref)
+    
+    with _lock_escritura:
+        with _lock_pendiente:
+            if _generacion_escrita >= generacion:
+                # Otro hilo ya escribió estos datos o unos pedidos después
+                return _resultado_escritura
+            generacion = _generacion_pedida
+            categorias, pagos, aref = _pendiente
+            _pendiente = None
+        resultado = _escribir_datos(categorias, pagos, aref)
+        with _lock_pendiente:
+            _generacion_escrita = generacion
+            _resultado_escritura = resultado
+        return resultado
+
+
+def _escribir_datos(categorias, pagos, aref):
     try:
-        # Obtener la ruta de la carpeta data
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+        data_dir = _directorio_datos()
         
         # Crear la carpeta data si no existe
         os.makedirs(data_dir, exist_ok=True)
         
         categorias_path = os.path.join(data_dir, 'categorias.json')
         pagos_path = os.path.join(data_dir, 'pagos.json')
+        nuevos = {categorias_path: categorias, pagos_path: pagos}
         
-        # Agregar metadatos de fecha de actualización
-        categorias_con_meta = {
-            "fecha_actualizacion": datetime.now().isoformat(),
-            "fuente": "AFIP - Scraping Web",
-            "datos": categorias
-        }
-        
-        pagos_con_meta = {
-            "fecha_actualizacion": datetime.now().isoformat(),
-            "fuente": "AFIP - Scraping Web", 
-            "datos": pagos
-        }
-        
-        # Guardar archivos
-        with open(categorias_path, 'w', encoding='utf-8') as f:
-            json.dump(categorias_con_meta, f, indent=4, ensure_ascii=False)
+        with _lock_archivo(data_dir):
+            # Dentro del lock: otro proceso puede haber escrito estos mismos datos
+            manifiesto = cargar_manifiesto(data_dir)
+            entradas = manifiesto["archivos"]
+            huellas = {ruta: huella_datos(datos) for ruta, datos in nuevos.items()}
+            if all(_archivo_actualizado(ruta, entradas.get(os.path.basename(ruta)), huellas[ruta])
+                   for ruta in nuevos):
+                print("💾 Los datos locales ya están actualizados, no se reescriben")
+                return True
             
-        with open(pagos_path, 'w', encoding='utf-8') as f:
-            json.dump(pagos_con_meta, f, indent=4, ensure_ascii=False)
-        
-        print(f"💾 Datos guardados exitosamente:")
-        print(f"   - Categorías: {categorias_path}")
-        print(f"   - Pagos: {pagos_path}")
+            # Sin manifiesto (o desactualizado) se comparan los datos leídos
+            if all(_datos_en_archivo(ruta, manifiesto) == datos for ruta, datos in nuevos.items()):
+                for ruta, datos in nuevos.items():
+                    entradas[os.path.basename(ruta)] = _entrada_manifiesto(ruta, datos)
+                escribir_atomico(os.path.join(data_dir, NOMBRE_MANIFIESTO), _serializar(manifiesto))
+                print("💾 Los datos locales ya están actualizados, no se reescriben")
+                return True
+            
+            # Escribir cada archivo (temporal + fsync + rename) y, al final, el manifiesto
+            fecha_actualizacion = datetime.now().isoformat()
+            for ruta, datos in nuevos.items():
+                con_meta = {
+                    "fecha_actualizacion": fecha_actualizacion,
+                    "fuente": "AFIP - Scraping Web",
+                    "datos": datos
+                }
+                contenido = _serializar(con_meta)
+                stat = escribir_atomico(ruta, contenido)
+                entradas[os.path.basename(ruta)] = {
+                    "sha256": hashlib.sha256(contenido).hexdigest(), "tamaño": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns, "huella_datos": huellas[ruta]
+                }
+                with _lock_cache:
+                    _cache_lecturas[ruta] = (stat.st_size, stat.st_mtime_ns, con_meta)
+            manifiesto["actualizado"] = fecha_actualizacion
+            escribir_atomico(os.path.join(data_dir, NOMBRE_MANIFIESTO), _serializar(manifiesto))
+            
+            print(f"💾 Datos guardados exitosamente:")
+            print(f"   - Categorías: {categorias_path}")
+            print(f"   - Pagos: {pagos_path}")
+            
+            # Registrar la versión en el historial (se deduplica si no cambió)
+            if aref is None:
+                aref_path = os.path.join(data_dir, 'aref.json')
+                if os.path.exists(aref_path):
+                    aref = _leer_json(aref_path)
+            obtener_historial().registrar_version(categorias, pagos, aref or {})
         
         return True
         
@@ -69,17 +298,26 @@ def guardar_datos_json_locales(categorias, pagos):
         return False
 
 
+def _datos_en_archivo(path, manifiesto=None):
+    """Datos (sin metadatos) de un archivo JSON local, o None si no se puede leer"""
+    try:
+        return datos_sin_metadatos(_leer_json(path, manifiesto))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
 def cargar_datos_json_locales():
     """
     📁 Carga los datos de categorías y pagos desde archivos JSON locales.
     
+    Los archivos que no cambiaron desde la última carga no se vuelven a
+    parsear: se devuelven los mismos objetos, que no deben modificarse.
+    
     Returns:
         tuple: (categorias, pagos) si se cargan exitosamente, (None, None) si falla
     """
     try:
-        # Obtener la ruta de la carpeta data
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+        data_dir = _directorio_datos()
         
         categorias_path = os.path.join(data_dir, 'categorias.json')
         pagos_path = os.path.join(data_dir, 'pagos.json')
@@ -89,27 +327,20 @@ def cargar_datos_json_locales():
             print("⚠️  No se encontraron archivos JSON locales")
             return None, None
         
-        # Cargar archivos
-        with open(categorias_path, 'r', encoding='utf-8') as f:
-            categorias_data = json.load(f)
-            
-        with open(pagos_path, 'r', encoding='utf-8') as f:
-            pagos_data = json.load(f)
+        # Cargar archivos (verificados contra el manifiesto si lo hay)
+        manifiesto = cargar_manifiesto(data_dir)
+        categorias_data = _leer_json(categorias_path, manifiesto)
+        pagos_data = _leer_json(pagos_path, manifiesto)
         
-        # Extraer datos (manejar tanto formato con metadatos como sin metadatos)
-        if isinstance(categorias_data, dict) and "datos" in categorias_data:
-            categorias = categorias_data["datos"]
-            fecha_cat = categorias_data.get("fecha_actualizacion", "Desconocida")
-        else:
-            categorias = categorias_data
-            fecha_cat = "Formato legacy"
+        # Extraer datos (manejar tanto formato con metadatos como sin metadatos):
+        # de aquí en adelante todo el sistema usa los datos sin el envoltorio
+        categorias = datos_sin_metadatos(categorias_data)
+        fecha_cat = categorias_data.get("fecha_actualizacion", "Desconocida") \
+            if categorias is not categorias_data else "Formato legacy"
             
-        if isinstance(pagos_data, dict) and "datos" in pagos_data:
-            pagos = pagos_data["datos"]
-            fecha_pagos = pagos_data.get("fecha_actualizacion", "Desconocida")
-        else:
-            pagos = pagos_data
-            fecha_pagos = "Formato legacy"
+        pagos = datos_sin_metadatos(pagos_data)
+        fecha_pagos = pagos_data.get("fecha_actualizacion", "Desconocida") \
+            if pagos is not pagos_data else "Formato legacy"
         
         print(f"📁 Datos locales cargados exitosamente:")
         print(f"   - Categorías: {len(categorias.get('servicios', {}))} categorías (Actualizado: {fecha_cat})")
@@ -127,6 +358,95 @@ def cargar_datos_json_locales():
         return None, None
 
 
+def guardar_datos_fuente(archivo, datos):
+    """
+    💾 Guarda la copia en caché de una fuente de datos (p. ej. aref.json) de
+    forma atómica y la registra en el manifiesto. No la reescribe si ya tiene
+    esos datos.
+    
+    Args:
+        archivo (str): Nombre del archivo dentro de data/
+        datos (dict): Datos de la fuente
+        
+    Returns:
+        bool: True si quedaron guardados, False en caso de error
+    """
+    try:
+        data_dir = _directorio_datos()
+        os.makedirs(data_dir, exist_ok=True)
+        ruta = os.path.join(data_dir, archivo)
+        with _lock_archivo(data_dir):
+            manifiesto = cargar_manifiesto(data_dir)
+            huella = huella_datos(datos)
+            if _archivo_actualizado(ruta, manifiesto["archivos"].get(archivo), huella) or \
+                    _datos_en_archivo(ruta, manifiesto) == datos:
+                return True
+            contenido = _serializar(datos)
+            stat = escribir_atomico(ruta, contenido)
+            manifiesto["archivos"][archivo] = {
+                "sha256": hashlib.sha256(contenido).hexdigest(), "tamaño": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns, "huella_datos": huella
+            }
+            with _lock_cache:
+                _cache_lecturas[ruta] = (stat.st_size, stat.st_mtime_ns, datos)
+            escribir_atomico(os.path.join(data_dir, NOMBRE_MANIFIESTO), _serializar(manifiesto))
+        print(f"💾 Copia de {archivo} actualizada")
+        return True
+    except Exception as e:
+        print(f"❌ Error al guardar {archivo}: {e}")
+        return False
+
+
+def cargar_datos_fuente(archivo):
+    """
+    📁 Carga la copia en caché de una fuente de datos.
+    
+    Returns:
+        dict or None: Datos guardados, o None si no hay copia legible
+    """
+    data_dir = _directorio_datos()
+    return _datos_en_archivo(os.path.join(data_dir, archivo), cargar_manifiesto(data_dir))
+
+
+def cargar_tablas_locales(aref=None):
+    """
+    🧱 Carga los archivos JSON locales y construye sus MonotributoTables.
+    
+    Args:
+        aref (dict, optional): Datos AREF; si no se indican se leen de aref.json
+        
+    Returns:
+        MonotributoTables or None: Tablas normalizadas, o None si no hay datos locales
+    """
+    categorias, pagos = cargar_datos_json_locales()
+    if not categorias or not pagos:
+        return None
+    
+    if aref is None:
+        try:
+            aref = _leer_json(os.path.join(_directorio_datos(), 'aref.json'))
+        except (OSError, json.JSONDecodeError):
+            aref = {}
+    
+    return construir_tablas(categorias, pagos, aref, version=obtener_fecha_actualizacion_local() or "local")
+
+
+def obtener_fecha_actualizacion_local():
+    """
+    📅 Obtiene la fecha de actualización registrada en categorias.json.
+    
+    Returns:
+        str or None: Fecha ISO de actualización, o None si no está disponible
+    """
+    try:
+        categorias_data = _leer_json(os.path.join(_directorio_datos(), 'categorias.json'))
+        if isinstance(categorias_data, dict):
+            return categorias_data.get("fecha_actualizacion")
+    except Exception:
+        pass
+    return None
+
+
 def verificar_integridad_datos(categorias, pagos):
     """
     🔍 Verifica la integridad de los datos cargados.
@@ -251,3 +571,78 @@ def obtener_info_archivos():
             }
     
     return info
+
+
+# Cantidad de consultas de scraping que se conservan en data/scraping.json
+MAXIMO_REGISTROS_SCRAPING = 50
+
+
+def _ruta_estado_scraping():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), 'data', 'scraping.json')
+
+
+def cargar_estado_scraping():
+    """
+    🕷️ Carga el estado del scraping: huellas de la última página y tabla
+    cuyos datos están guardados, y registro de las últimas consultas.
+    
+    Returns:
+        dict: {"huella_html", "huella_tabla", "consultas": [...]} (vacío si no hay)
+    """
+    try:
+        with open(_ruta_estado_scraping(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"huella_html": None, "huella_tabla": None, "consultas": []}
+
+
+def registrar_scraping(resultado, huellas_confirmadas=True, fuentes=None):
+    """
+    📝 Registra el resultado de una consulta de scraping (estado y duración)
+    y, si sus datos quedaron guardados, sus huellas para la próxima consulta.
+    
+    Args:
+        resultado (ResultadoScraping): Resultado de consultar_datos_monotributo_web
+        huellas_confirmadas (bool): False si los datos no se pudieron guardar
+        fuentes (dict, optional): Resultados de las demás fuentes (nombre -> ResultadoFuente),
+            con las huellas vacías si sus datos no se pudieron guardar
+        
+    Returns:
+        dict: Entrada agregada al registro
+    """
+    estado = cargar_estado_scraping()
+    if huellas_confirmadas and resultado.estado != "fallido":
+        estado["huella_html"] = resultado.huella_html
+        estado["huella_tabla"] = resultado.huella_tabla
+    
+    entrada = {
+        "fecha": datetime.now().isoformat(),
+        "estado": resultado.estado,
+        "duracion_ms": round(resultado.duracion * 1000, 1),
+        "detalle": resultado.detalle
+    }
+    if fuentes:
+        huellas_fuentes = estado.setdefault("fuentes", {})
+        entrada["fuentes"] = {}
+        for nombre, resultado_fuente in fuentes.items():
+            if resultado_fuente.estado != "fallido":
+                huellas_fuentes[nombre] = resultado_fuente.huellas
+            entrada["fuentes"][nombre] = {
+                "estado": resultado_fuente.estado,
+                "duracion_ms": round(resultado_fuente.duracion * 1000, 1),
+                "detalle": resultado_fuente.detalle
+            }
+    estado["consultas"] = (estado.get("consultas", []) + [entrada])[-MAXIMO_REGISTROS_SCRAPING:]
+    
+    ruta = _ruta_estado_scraping()
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        escribir_atomico(ruta, _serializar(estado))
+    except OSError as e:
+        print(f"⚠️  No se pudo guardar el registro de scraping: {e}")
+    
+    print(f"🕷️  Scraping {resultado.estado} en {entrada['duracion_ms']} ms" +
+          "".join(f", {nombre} {fuente['estado']} en {fuente['duracion_ms']} ms"
+                  for nombre, fuente in entrada.get("fuentes", {}).items()))
+    return entrada
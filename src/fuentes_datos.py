@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE FUENTES DE DATOS - SISTEMA EXPERTO MONOTRIBUTO
+========================================================
+
+Este módulo consulta a la vez todas las fuentes de datos registradas: la
+tabla nacional de categorías de AFIP, la tabla provincial de AREF (si se
+configura URL_AREF) y las que se agreguen con registrar_fuente (por
+ejemplo, tablas municipales).
+
+Las descargas comparten un cliente HTTP asíncrono con pool de conexiones
+(httpx; sin httpx, una sesión de requests con pool usada desde hilos) y
+cada fuente tiene su propio tiempo máximo, para la descarga completa
+también con requests: el hilo lee por partes y deja de leer al vencer el
+plazo o cancelarse la consulta. Una fuente que falla no afecta a
+las demás: el llamador sigue con su copia en caché (datos_con_cache). Así
+una actualización tarda lo que la fuente más lenta, no la suma de todas.
+
+Como con la página de AFIP, cada fuente compara la huella de lo descargado
+con la de la consulta anterior y, si no cambió, no lo vuelve a procesar.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+import pandas as pd
+
+try:
+    import httpx
+except ImportError:  # Sin httpx se usa requests desde hilos (mismo pool de conexiones)
+    httpx = None
+    import requests
+
+from data_manager import cargar_datos_fuente, cargar_estado_scraping, guardar_datos_fuente, obtener_info_archivos
+from monotributo_scraper import (TIEMPO_MAXIMO_DESCARGA, URL_CATEGORIAS, calcular_huella, limpiar_valor,
+                                 procesar_pagina_categorias)
+
+
+# Conexiones simultáneas del pool compartido
+CONEXIONES_MAXIMAS = 20
+
+
+class Fuente(NamedTuple):
+    """Una fuente de datos consultable por HTTP"""
+    nombre: str
+    url: str
+    # (contenido, codificación, huellas previas) -> (estado, datos, huellas, detalle)
+    procesar: Callable
+    tiempo_maximo: float = TIEMPO_MAXIMO_DESCARGA  # segundos, descarga completa
+    archivo: Optional[str] = None  # copia en caché en data/ (None: la maneja el llamador)
+
+
+class ResultadoFuente(NamedTuple):
+    """Resultado de consultar una fuente"""
+    nombre: str
+    estado: str  # "cambiado", "sin_cambios" o "fallido"
+    datos: Optional[dict]  # sólo si cambió
+    huellas: dict  # para comparar en la próxima consulta
+    duracion: float  # segundos
+    detalle: str = ""
+
+
+def procesar_pagina_afip(contenido, codificacion, huellas_previas):
+    """Página de categorías de AFIP: datos {"categorias", "pagos"} y huellas del HTML y de la tabla"""
+    resultado = procesar_pagina_categorias(contenido, huellas_previas.get("huella_html"),
+                                           huellas_previas.get("huella_tabla"), codificacion=codificacion)
+    datos = {"categorias": resultado.categorias, "pagos": resultado.pagos} if resultado.estado == "cambiado" else None
+    return (resultado.estado, datos,
+            {"huella_html": resultado.huella_html, "huella_tabla": resultado.huella_tabla}, resultado.detalle)
+
+
+def extraer_montos_por_categoria(contenido, codificacion=None):
+    """
+    🔍 Extrae una tabla de montos por categoría ({"A": 9767.0, ...}) de un
+    JSON con esa forma o de la tabla HTML cuya primera columna son las
+    categorías (se toma la última columna con montos en todas las filas).
+
+    Returns:
+        dict or None: Montos por categoría, o None si no se encontró la tabla
+    """
+    texto = contenido.decode(codificacion or 'utf-8', errors='replace')
+    try:
+        datos = json.loads(texto)
+    except ValueError:
+        datos = None
+    if isinstance(datos, dict):
+        montos = {categoria: float(valor) for categoria, valor in datos.items()
+                  if len(categoria) == 1 and categoria.isupper() and isinstance(valor, (int, float))}
+        return montos if montos and len(montos) == len(datos) else None
+
+    try:
+        tablas = pd.read_html(io.StringIO(texto))
+    except ValueError:
+        return None
+    for tabla in tablas:
+        filas = [(str(fila.iloc[0]).strip(), fila) for _, fila in tabla.iterrows()]
+        filas = [(categoria, fila) for categoria, fila in filas if len(categoria) == 1 and categoria.isupper()]
+        if len(filas) < 2 or filas[0][0] != "A":
+            continue
+        for columna in reversed(range(1, len(tabla.columns))):
+            montos = {categoria: limpiar_valor(fila.iloc[columna]) for categoria, fila in filas}
+            if all(valor is not None for valor in montos.values()):
+                return montos
+    return None
+
+
+def procesar_tabla_por_categoria(contenido, codificacion, huellas_previas):
+    """Tabla de montos por categoría (AREF, municipales): datos {categoría: monto} y huella del contenido"""
+    huella = calcular_huella(contenido)
+    if huella == huellas_previas.get("huella"):
+        return "sin_cambios", None, {"huella": huella}, "contenido sin cambios"
+    montos = extraer_montos_por_categoria(contenido, codificacion)
+    if not montos:
+        return "fallido", None, {}, "tabla de montos por categoría no encontrada"
+    return "cambiado", montos, {"huella": huella}, ""
+
+
+# Fuentes registradas, por nombre ("afip" es la que da categorías y pagos)
+FUENTES = {"afip": Fuente("afip", URL_CATEGORIAS, procesar_pagina_afip)}
+
+
+def registrar_fuente(fuente):
+    """Agrega (o reemplaza) una fuente a las que consulta consultar_fuentes"""
+    FUENTES[fuente.nombre] = fuente
+
+
+if os.environ.get("URL_AREF"):
+    registrar_fuente(Fuente("aref", os.environ["URL_AREF"], procesar_tabla_por_categoria, archivo="aref.json"))
+
+
+_cliente = None
+_sesion_requests = None
+
+
+def _nuevo_cliente():
+    if httpx is None:
+        return None
+    return httpx.AsyncClient(follow_redirects=True,
+                             limits=httpx.Limits(max_connections=CONEXIONES_MAXIMAS,
+                                                 max_keepalive_connections=CONEXIONES_MAXIMAS))
+
+
+def cliente_compartido():
+    """
+    Cliente HTTP asíncrono compartido por las consultas del proceso. Sus
+    conexiones pertenecen al event loop que lo usa primero (el del servidor).
+    """
+    global _cliente
+    if _cliente is None or _cliente.is_closed:
+        _cliente = _nuevo_cliente()
+    return _cliente
+
+
+async def cerrar_cliente():
+    """Cierra el cliente compartido (al apagar el servidor)"""
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+
+def _sesion_http():
+    global _sesion_requests
+    if _sesion_requests is None:
+        _sesion_requests = requests.Session()
+        adaptador = requests.adapters.HTTPAdapter(pool_maxsize=CONEXIONES_MAXIMAS)
+        _sesion_requests.mount("http://", adaptador)
+        _sesion_requests.mount("https://", adaptador)
+    return _sesion_requests
+
+
+def _descargar_requests(url, tiempo_maximo, cancelada):
+    """
+    Descarga con requests en como mucho tiempo_maximo segundos en total (el
+    timeout de requests es por operación: un servidor que responde de a
+    poco lo superaría) o hasta que se marque cancelada.
+    """
+    limite = time.monotonic() + tiempo_maximo
+    with _sesion_http().get(url, timeout=tiempo_maximo, stream=True) as respuesta:
+        respuesta.raise_for_status()
+        partes = []
+        for parte in respuesta.iter_content(64 * 1024):
+            if cancelada.is_set() or time.monotonic() > limite:
+                raise TimeoutError(f"Descarga interrumpida tras {tiempo_maximo:g} s")
+            partes.append(parte)
+        return b"".join(partes), respuesta.encoding
+
+
+async def _descargar(cliente, fuente):
+    if cliente is None:
+        # asyncio.wait_for no puede detener el hilo: al cancelarse la espera se lo avisa
+        cancelada = threading.Event()
+        try:
+            return await asyncio.to_thread(_descargar_requests, fuente.url, fuente.tiempo_maximo, cancelada)
+        finally:
+            cancelada.set()
+    respuesta = await cliente.get(fuente.url, timeout=fuente.tiempo_maximo)
+    respuesta.raise_for_status()
+    return respuesta.content, respuesta.encoding
+
+
+async def consultar_fuente(cliente, fuente, huellas_previas=None):
+    """
+    🌐 Descarga una fuente (como mucho fuente.tiempo_maximo segundos) y la
+    procesa en un hilo aparte.
+
+    Returns:
+        ResultadoFuente: Nunca lanza excepciones: los errores dan estado "fallido"
+    """
+    inicio = time.perf_counter()
+    try:
+        contenido, codificacion = await asyncio.wait_for(_descargar(cliente, fuente), fuente.tiempo_maximo)
+        estado, datos, huellas, detalle = await asyncio.to_thread(
+            fuente.procesar, contenido, codificacion, huellas_previas or {}
+        )
+    except Exception as e:
+        detalle = str(e) or type(e).__name__
+        print(f"❌ Fuente {fuente.nombre} no disponible: {detalle}")
+        return ResultadoFuente(fuente.nombre, "fallido", None, {}, time.perf_counter() - inicio, detalle)
+    return ResultadoFuente(fuente.nombre, estado, datos, huellas, time.perf_counter() - inicio, detalle)
+
+
+async def consultar_fuentes(fuentes=None, huellas_previas=None, cliente=None):
+    """
+    🌐 Consulta todas las fuentes a la vez.
+
+    Args:
+        fuentes (list, optional): Fuentes a consultar (por defecto, las registradas)
+        huellas_previas (dict, optional): nombre -> huellas de la consulta anterior
+        cliente (httpx.AsyncClient, optional): Cliente a usar; sin él se crea uno para esta consulta
+
+    Returns:
+        dict: nombre -> ResultadoFuente
+    """
+    fuentes = list(FUENTES.values()) if fuentes is None else fuentes
+    huellas_previas = huellas_previas or {}
+    propio = cliente is None and httpx is not None
+    if propio:
+        cliente = _nuevo_cliente()
+    try:
+        resultados = await asyncio.gather(*(consultar_fuente(cliente, fuente, huellas_previas.get(fuente.nombre))
+                                            for fuente in fuentes))
+    finally:
+        if propio:
+            await cliente.aclose()
+    return {resultado.nombre: resultado for resultado in resultados}
+
+
+def huellas_previas_fuentes():
+    """
+    Huellas guardadas de la última consulta de cada fuente, sólo de las que
+    tienen su copia en disco (sin copia hay que volver a procesar la fuente).
+    """
+    estado = cargar_estado_scraping()
+    archivos = obtener_info_archivos()["archivos"]
+    huellas = {}
+    if archivos["categorias.json"]["existe"] and archivos["pagos.json"]["existe"]:
+        huellas["afip"] = {"huella_html": estado.get("huella_html"), "huella_tabla": estado.get("huella_tabla")}
+    for nombre, fuente in FUENTES.items():
+        if fuente.archivo and cargar_datos_fuente(fuente.archivo) is not None:
+            huellas[nombre] = estado.get("fuentes", {}).get(nombre, {})
+    return huellas
+
+
+def datos_con_cache(resultados):
+    """
+    💾 Datos vigentes de las fuentes con copia en caché (las de archivo no
+    nulo): los nuevos se guardan y, si la fuente no cambió o falló, se usan
+    los de la copia.
+
+    Args:
+        resultados (dict): nombre -> ResultadoFuente
+
+    Returns:
+        tuple: (datos, resultados) donde datos es nombre -> datos (None si no
+        hay ninguno) y en resultados quedan sin huellas las fuentes cuyos datos
+        nuevos no se pudieron guardar, para volver a procesarlas
+    """
+    datos = {}
+    resultados = dict(resultados)
+    for nombre, resultado in resultados.items():
+        fuente = FUENTES.get(nombre)
+        if fuente is None or not fuente.archivo:
+            continue
+        if resultado.estado == "cambiado":
+            datos[nombre] = resultado.datos
+            if not guardar_datos_fuente(fuente.archivo, resultado.datos):
+                resultados[nombre] = resultado._replace(huellas={})
+            continue
+        datos[nombre] = cargar_datos_fuente(fuente.archivo)
+        if resultado.estado == "fallido":
+            print(f"📁 Fuente {nombre}: usando la copia en caché de {fuente.archivo}"
+                  if datos[nombre] is not None else f"⚠️  Fuente {nombre}: sin copia en caché")
+    return datos, resultados
+
+
+if __name__ == "__main__":
+    # Consulta todas las fuentes registradas y muestra el estado y la duración de cada una
+    inicio = time.perf_counter()
+    resultados = asyncio.run(consultar_fuentes(huellas_previas=huellas_previas_fuentes()))
+    for resultado in resultados.values():
+        print(f"{resultado.nombre:<12} {resultado.estado:<12} {resultado.duracion * 1000:>8.1f} ms  {resultado.detalle}")
+    print(f"Total: {(time.perf_counter() - inicio) * 1000:.1f} ms")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE HISTORIAL VERSIONADO DE DATOS - SISTEMA EXPERTO MONOTRIBUTO
+=====================================================================
+
+Este módulo mantiene un almacén de solo-agregado (append-only) con todas
+las versiones de las tablas de categorías, pagos y AREF, indexadas por
+fecha de vigencia. Permite evaluar el sistema "a una fecha" dada, por
+ejemplo ante reclamos por recategorizaciones retroactivas.
+
+Estructura en disco (carpeta data/historial/):
+    objetos/<sha256>.json   Contenido de cada tabla, direccionado por su hash
+    indice.jsonl            Una línea por versión: fecha de vigencia y hashes
+
+Las tablas idénticas se guardan una sola vez (mismo hash) y un scraping que
+no cambia nada respecto de la versión vigente no agrega una versión nueva.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import bisect
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from datetime import date, datetime
+
+
+TABLAS = ("categorias", "pagos", "aref")
+
+
+def _directorio_por_defecto():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), 'data', 'historial')
+
+
+def _serializar(datos):
+    """Serialización canónica: misma tabla, mismos bytes, mismo hash (acepta las vistas de sólo lectura de las tablas)"""
+    return json.dumps(datos, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=dict).encode('utf-8')
+
+
+def normalizar_fecha(fecha):
+    """
+    Convierte una fecha (date, datetime o texto ISO) a texto YYYY-MM-DD.
+
+    Raises:
+        ValueError: Si el texto no es una fecha ISO válida
+    """
+    if fecha is None:
+        return date.today().isoformat()
+    if isinstance(fecha, datetime):
+        return fecha.date().isoformat()
+    if isinstance(fecha, date):
+        return fecha.isoformat()
+    return date.fromisoformat(str(fecha)[:10]).isoformat()
+
+
+class HistorialDatos:
+    """
+    Almacén versionado de tablas del Monotributo indexado por fecha de vigencia.
+
+    El índice (fechas y hashes) se mantiene en memoria ordenado por fecha, de
+    modo que la búsqueda "a una fecha" es una búsqueda binaria O(log n). El
+    contenido de cada versión se lee de disco sólo cuando se lo pide, con un
+    pequeño cache LRU.
+    """
+
+    def __init__(self, directorio=None, tamano_cache=8):
+        self.directorio = directorio or _directorio_por_defecto()
+        self.directorio_objetos = os.path.join(self.directorio, 'objetos')
+        self.ruta_indice = os.path.join(self.directorio, 'indice.jsonl')
+        self.tamano_cache = tamano_cache
+        self._cache = OrderedDict()
+        self._versiones = []
+        self._fechas = []
+        self._leer_indice()
+
+    # ------------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------------
+
+    def _leer_indice(self):
+        versiones = []
+        if os.path.exists(self.ruta_indice):
+            with open(self.ruta_indice, 'r', encoding='utf-8') as f:
+                for orden, linea in enumerate(f):
+                    linea = linea.strip()
+                    if not linea:
+                        continue
+                    try:
+                        entrada = json.loads(linea)
+                    except json.JSONDecodeError:
+                        # Una línea truncada (corte durante la escritura) no invalida el resto
+                        print(f"⚠️  Línea {orden + 1} del índice de historial ilegible, se ignora")
+                        continue
+                    versiones.append((entrada["fecha_vigencia"], orden, entrada))
+
+        # Orden por fecha de vigencia; ante igual fecha, gana la registrada última
+        versiones.sort(key=lambda v: v[:2])
+        self._versiones = [entrada for _, _, entrada in versiones]
+        self._fechas = [fecha for fecha, _, _ in versiones]
+
+    def versiones(self):
+        """Lista las versiones registradas (sin su contenido), ordenadas por fecha de vigencia"""
+        return [dict(version) for version in self._versiones]
+
+    def version_a_fecha(self, fecha=None):
+        """
+        🔎 Busca la versión vigente a una fecha (búsqueda binaria).
+
+        Returns:
+            dict or None: Entrada del índice vigente a esa fecha, o None si
+            no hay ninguna versión anterior o igual a la fecha
+        """
+        posicion = bisect.bisect_right(self._fechas, normalizar_fecha(fecha))
+        if posicion == 0:
+            return None
+        return self._versiones[posicion - 1]
+
+    # ------------------------------------------------------------------
+    # Objetos direccionados por contenido
+    # ------------------------------------------------------------------
+
+    def _ruta_objeto(self, hash_objeto):
+        return os.path.join(self.directorio_objetos, f"{hash_objeto}.json")
+
+    def _guardar_objeto(self, datos):
+        contenido = _serializar(datos)
+        hash_objeto = hashlib.sha256(contenido).hexdigest()
+        ruta = self._ruta_objeto(hash_objeto)
+        if not os.path.exists(ruta):
+            temporal = f"{ruta}.tmp"
+            with open(temporal, 'wb') as f:
+                f.write(contenido)
+            os.replace(temporal, ruta)
+        return hash_objeto
+
+    def _leer_objeto(self, hash_objeto):
+        with open(self._ruta_objeto(hash_objeto), 'rb') as f:
+            return json.loads(f.read())
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def registrar_version(self, categorias, pagos, aref, fecha_vigencia=None, fuente="AFIP - Scraping Web"):
+        """
+        💾 Registra una versión de las tablas si difiere de la vigente a esa fecha.
+
+        Args:
+            categorias (dict): Tabla de categorías (sin envoltorio de metadatos)
+            pagos (dict): Tabla de pagos (sin envoltorio de metadatos)
+            aref (dict): Montos provinciales AREF
+            fecha_vigencia (date | str | None): Fecha desde la que rigen (hoy por defecto)
+            fuente (str): Origen de los datos
+
+        Returns:
+            tuple: (entrada_del_indice, nueva) donde nueva es False si se deduplicó
+        """
+        fecha_vigencia = normalizar_fecha(fecha_vigencia)
+        os.makedirs(self.directorio_objetos, exist_ok=True)
+
+        hashes = {
+            "categorias": self._guardar_objeto(categorias),
+            "pagos": self._guardar_objeto(pagos),
+            "aref": self._guardar_objeto(aref or {})
+        }
+
+        vigente = self.version_a_fecha(fecha_vigencia)
+        if vigente and all(vigente[tabla] == hashes[tabla] for tabla in TABLAS):
+            return vigente, False
+
+        entrada = {
+            "fecha_vigencia": fecha_vigencia,
+            "registrado": datetime.now().isoformat(),
+            "fuente": fuente,
+            **hashes
+        }
+        entrada["version"] = hashlib.sha256(_serializar(hashes)).hexdigest()[:16]
+
+        # Solo agregado: nunca se reescriben líneas existentes del índice
+        with open(self.ruta_indice, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        posicion = bisect.bisect_right(self._fechas, fecha_vigencia)
+        self._versiones.insert(posicion, entrada)
+        self._fechas.insert(posicion, fecha_vigencia)
+
+        print(f"🗂️  Nueva versión de datos registrada en el historial: {entrada['version']} (vigente desde {fecha_vigencia})")
+        return entrada, True
+
+    def cargar_version(self, entrada):
+        """
+        📂 Carga el contenido de una versión del índice (sólo sus tres objetos).
+
+        Returns:
+            dict: {"version", "fecha_vigencia", "categorias", "pagos", "aref"}
+        """
+        version = entrada["version"]
+        if version in self._cache:
+            self._cache.move_to_end(version)
+            return self._cache[version]
+
+        datos = {
+            "version": version,
+            "fecha_vigencia": entrada["fecha_vigencia"],
+            **{tabla: self._leer_objeto(entrada[tabla]) for tabla in TABLAS}
+        }
+
+        self._cache[version] = datos
+        if len(self._cache) > self.tamano_cache:
+            self._cache.popitem(last=False)
+        return datos
+
+    def cargar_a_fecha(self, fecha=None):
+        """
+        🕰️ Carga las tablas vigentes a una fecha.
+
+        Returns:
+            dict or None: Igual que cargar_version, o None si no hay datos a esa fecha
+        """
+        entrada = self.version_a_fecha(fecha)
+        if entrada is None:
+            return None
+        return self.cargar_version(entrada)
+
+
+_historial = None
+
+
+def obtener_historial():
+    """Devuelve la instancia compartida del historial en la carpeta data/historial"""
+    global _historial
+    if _historial is None:
+        _historial = HistorialDatos()
+    return _historial
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE JURISDICCIONES - SISTEMA EXPERTO MONOTRIBUTO
+======================================================
+
+Este módulo permite atender en un mismo despliegue a varias provincias y
+municipios, cada uno con su tabla provincial (el equivalente del AREF de
+Tierra del Fuego) y, si las necesita, sus propias reglas. Las categorías y
+los pagos nacionales (AFIP) son los mismos para todas.
+
+Estructura:
+    data/jurisdicciones/<id>.json                  Tabla provincial: monto por categoría ({"A": 9767.0, ...})
+    src/knowledge_base/jurisdicciones/<id>.json    Reglas propias (opcional; sin ellas, las de rules.json)
+
+Una jurisdicción existe si tiene tabla provincial. La predeterminada
+(JURISDICCION_PREDETERMINADA, "tierra_del_fuego") es la de rules.json y
+data/aref.json y la atiende el motor vigente de la API.
+
+El motor de cada una de las demás se crea la primera vez que una sesión la
+pide y se guarda en un cache LRU acotado: las jurisdicciones poco usadas se
+descartan y, si vuelven a pedirse, se crean de nuevo. Las reglas iguales a
+las del motor base no se recompilan (ver MotorInferencia, anterior). Un
+cambio en los datos nacionales o en rules.json descarta todos los motores;
+los cambios en los archivos de una jurisdicción se toman al volver a crear
+su motor.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from motor_inferencia import MotorInferencia, cargar_reglas, validar_reglas
+from tablas_monotributo import construir_tablas
+
+
+JURISDICCION_PREDETERMINADA = os.environ.get("JURISDICCION_PREDETERMINADA", "tierra_del_fuego")
+# Motores de jurisdicciones (además del predeterminado) que se mantienen compilados
+MAXIMO_JURISDICCIONES = int(os.environ.get("MAXIMO_JURISDICCIONES", 8))
+
+_NOMBRE_JURISDICCION = re.compile(r"^[a-z0-9_]{1,64}$")
+
+
+class JurisdiccionDesconocida(LookupError):
+    """Jurisdicción sin tabla provincial"""
+
+
+def _directorios_por_defecto():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return (os.path.join(os.path.dirname(current_dir), 'data', 'jurisdicciones'),
+            os.path.join(current_dir, 'knowledge_base', 'jurisdicciones'))
+
+
+def _leer_tabla_provincial(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        tabla = json.load(f)
+    if not isinstance(tabla, dict) or not tabla \
+            or not all(isinstance(valor, (int, float)) for valor in tabla.values()):
+        raise ValueError(f"{os.path.basename(ruta)}: se esperaba un monto por categoría")
+    return tabla
+
+
+class CacheJurisdicciones:
+    """
+    Motores de inferencia por jurisdicción, creados al pedirlos y guardados
+    en un cache LRU.
+
+    Args:
+        capacidad (int): Motores que se mantienen compilados
+        directorio_tablas (str, optional): Carpeta de las tablas provinciales
+        directorio_reglas (str, optional): Carpeta de las reglas propias
+    """
+
+    def __init__(self, capacidad=MAXIMO_JURISDICCIONES, directorio_tablas=None, directorio_reglas=None):
+        por_defecto = _directorios_por_defecto()
+        self.capacidad = capacidad
+        self.directorio_tablas = directorio_tablas or por_defecto[0]
+        self.directorio_reglas = directorio_reglas or por_defecto[1]
+        self._motores = OrderedDict()
+        self._base = None
+        self._categorias = None
+        self._pagos = None
+        # Generación de los datos nacionales: un motor creado con los anteriores no se guarda
+        self._generacion = 0
+        self._lock = threading.Lock()
+        # Un lock por jurisdicción: cada una se compila una sola vez aunque varias sesiones la pidan a la vez
+        self._locks_creacion = {}
+        self.aciertos = 0
+        self.creados = 0
+        self.desalojados = 0
+
+    def configurar(self, motor_base, categorias, pagos):
+        """Motor y datos nacionales vigentes; descarta los motores creados con los anteriores"""
+        with self._lock:
+            self._base = motor_base
+            self._categorias = categorias
+            self._pagos = pagos
+            self._generacion += 1
+            self._motores.clear()
+
+    def _ruta_tabla(self, jurisdiccion):
+        return os.path.join(self.directorio_tablas, f"{jurisdiccion}.json")
+
+    def _ruta_reglas(self, jurisdiccion):
+        return os.path.join(self.directorio_reglas, f"{jurisdiccion}.json")
+
+    def existe(self, jurisdiccion):
+        return bool(_NOMBRE_JURISDICCION.match(jurisdiccion)) and os.path.exists(self._ruta_tabla(jurisdiccion))
+
+    def disponibles(self):
+        """Jurisdicciones con tabla provincial (sin la predeterminada)"""
+        try:
+            archivos = os.listdir(self.directorio_tablas)
+        except FileNotFoundError:
+            return []
+        return sorted(nombre[:-len(".json")] for nombre in archivos
+                      if nombre.endswith(".json") and _NOMBRE_JURISDICCION.match(nombre[:-len(".json")]))
+
+    def obtener(self, jurisdiccion):
+        """Motor de una jurisdicción si está en el cache (sin crearlo), o None"""
+        with self._lock:
+            motor = self._motores.get(jurisdiccion)
+            if motor is not None:
+                self._motores.move_to_end(jurisdiccion)
+                self.aciertos += 1
+            return motor
+
+    def motores(self):
+        """Motores en el cache, del menos al más usado recientemente"""
+        with self._lock:
+            return list(self._motores.values())
+
+    def motor(self, jurisdiccion):
+        """
+        ⚖️ Motor de una jurisdicción: el del cache o uno nuevo.
+
+        Raises:
+            JurisdiccionDesconocida: Si la jurisdicción no tiene tabla provincial
+            ValueError: Si su tabla o sus reglas son inválidas
+        """
+        motor = self.obtener(jurisdiccion)
+        if motor is not None:
+            return motor
+        if not self.existe(jurisdiccion):
+            raise JurisdiccionDesconocida(f"Jurisdicción desconocida: {jurisdiccion}")
+
+        with self._lock:
+            lock_creacion = self._locks_creacion.setdefault(jurisdiccion, threading.Lock())
+        with lock_creacion:
+            motor = self.obtener(jurisdiccion)
+            if motor is not None:
+                return motor
+            with self._lock:
+                base, categorias, pagos, generacion = self._base, self._categorias, self._pagos, self._generacion
+            if base is None:
+                raise RuntimeError("Las jurisdicciones no están configuradas")
+            motor = self._crear(jurisdiccion, base, categorias, pagos)
+            with self._lock:
+                self.creados += 1
+                if generacion == self._generacion:
+                    self._motores[jurisdiccion] = motor
+                    while len(self._motores) > self.capacidad:
+                        retirada, _ = self._motores.popitem(last=False)
+                        self.desalojados += 1
+                        print(f"♻️  Motor de la jurisdicción {retirada} descartado del cache")
+            return motor
+
+    def _crear(self, jurisdiccion, base, categorias, pagos):
+        tabla = _leer_tabla_provincial(self._ruta_tabla(jurisdiccion))
+        reglas = base.reglas
+        if os.path.exists(self._ruta_reglas(jurisdiccion)):
+            reglas = cargar_reglas(self._ruta_reglas(jurisdiccion))
+            errores = validar_reglas(reglas)
+            if errores:
+                raise ValueError(f"Reglas inválidas de la jurisdicción {jurisdiccion}: {'; '.join(errores)}")
+        tablas = construir_tablas(categorias, pagos, tabla, version=f"{base.tablas.version}+{jurisdiccion}")
+        motor = MotorInferencia(reglas, tablas, anterior=base)
+        print(f"⚖️  Motor de la jurisdicción {jurisdiccion} creado (reglas {motor.version_reglas}, "
+              f"{len(motor.reglas_recompiladas)} de {len(motor.knowledge_base)} reglas compiladas)")
+        return motor
+
+    def metricas(self):
+        with self._lock:
+            return {"capacidad": self.capacidad, "en_cache": list(self._motores), "aciertos": self.aciertos,
+                    "creados": self.creados, "desalojados": self.desalojados}
@@ -11,7 +11,11 @@ Autor: Sistema Experto Emprendedor Fueguino
 Fecha: 2025
 """
 
+import asyncio
+
 from monotributo_scraper import obtener_datos_monotributo_web
+from fuentes_datos import consultar_fuentes, datos_con_cache
+from tablas_monotributo import construir_tablas
 from data_manager import (
     cargar_datos_json_locales,
     guardar_datos_json_locales,
@@ -23,7 +27,8 @@ from data_manager import (
 def inicializar_datos_monotributo():
     """
     🚀 Inicializa los datos del sistema experto con la estrategia más robusta:
-    1. Intenta obtener datos actualizados desde la web
+    1. Intenta obtener datos actualizados desde la web (AFIP y las demás
+       fuentes registradas, consultadas a la vez)
     2. Si falla, carga datos locales existentes
     3. Si no hay datos locales, usa datos por defecto
     
@@ -32,9 +37,14 @@ def inicializar_datos_monotributo():
     """
     print("🔧 Inicializando datos del Sistema Experto Monotributo...")
     
-    # 1. Intentar obtener datos actualizados de la web
+    # 1. Intentar obtener datos actualizados de la web (todas las fuentes a la vez)
     print("🌐 Obteniendo datos actualizados desde AFIP...")
-    datos_web_cat, datos_web_pagos = obtener_datos_monotributo_web()
+    resultados = asyncio.run(consultar_fuentes())
+    datos_web = resultados["afip"].datos if resultados["afip"].estado == "cambiado" else {}
+    datos_web_cat, datos_web_pagos = datos_web.get("categorias"), datos_web.get("pagos")
+    # Las demás fuentes se guardan si cambiaron, o se usa su copia en caché
+    datos_fuentes, _ = datos_con_cache({nombre: resultado for nombre, resultado in resultados.items()
+                                        if nombre != "afip"})
     
     datos_categorias = None
     datos_pagos = None
@@ -83,13 +93,25 @@ def inicializar_datos_monotributo():
         datos_categorias = {"servicios": {}, "venta": {}}
         datos_pagos = {"servicios": {}, "venta": {}}
     
-    # 4. Cargar datos AREF (provinciales)
-    datos_aref = cargar_datos_aref()
+    # 4. Datos AREF (provinciales): de la fuente si está configurada, si no del archivo local
+    datos_aref = datos_fuentes.get("aref") or cargar_datos_aref()
     
     print("🚀 Inicialización completada")
     return datos_categorias, datos_pagos, datos_aref
 
 
+def inicializar_tablas_monotributo():
+    """
+    🧱 Inicializa los datos (web → local → por defecto) y construye sus
+    MonotributoTables, la forma normalizada que usa el motor de inferencia.
+    
+    Returns:
+        MonotributoTables: Tablas normalizadas e inmutables de la versión cargada
+    """
+    datos_categorias, datos_pagos, datos_aref = inicializar_datos_monotributo()
+    return construir_tablas(datos_categorias, datos_pagos, datos_aref)
+
+
 def cargar_datos_aref():
     """
     🏔️ Carga los datos provinciales AREF desde archivo local.
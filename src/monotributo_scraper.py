@@ -8,12 +8,43 @@ Este módulo se encarga exclusivamente del scraping de datos de la página
 oficial de AFIP para obtener información actualizada sobre categorías y
 pagos del Monotributo.
 
+Como la página casi nunca cambia, cada consulta calcula la huella (SHA-256)
+del HTML descargado y de la tabla de categorías encontrada: si alguna
+coincide con la de la consulta anterior, se informa "sin_cambios" sin
+parsear el HTML (o sin procesar la tabla), y el llamador puede evitar
+reescribir archivos y reconstruir reglas y tablas derivadas.
+
 Autor: Sistema Experto Emprendedor Fueguino
 Fecha: 2025
 """
 
+import hashlib
+import io
+import time
+from typing import NamedTuple, Optional
+
 import pandas as pd
-import os
+import requests
+
+
+URL_CATEGORIAS = "https://www.afip.gob.ar/monotributo/categorias.asp"
+TIEMPO_MAXIMO_DESCARGA = 30
+
+
+class ResultadoScraping(NamedTuple):
+    """Resultado de una consulta a la página de categorías"""
+    estado: str  # "cambiado", "sin_cambios" o "fallido"
+    categorias: Optional[dict]
+    pagos: Optional[dict]
+    huella_html: Optional[str]
+    huella_tabla: Optional[str]
+    duracion: float  # segundos
+    detalle: str = ""
+
+
+def calcular_huella(contenido):
+    """Huella SHA-256 (hex) de un contenido en bytes"""
+    return hashlib.sha256(contenido).hexdigest()
 
 
 def limpiar_valor(texto):
@@ -48,184 +79,278 @@ def limpiar_valor(texto):
         return None  # Retorna None si no se puede convertir
 
 
-def obtener_datos_monotributo_web():
+def buscar_tabla_monotributo(tablas):
     """
-    🕷️ FUNCIÓN PRINCIPAL DE SCRAPING
+    🔍 Busca, entre las tablas de la página, la de categorías del Monotributo:
+    la que tiene una columna 'Categ.' y contiene la categoría 'K'.
+
+    Returns:
+        DataFrame or None: La tabla encontrada, o None si no está
+    """
+    df_monotributo = None
     
-    Realiza scraping de la página oficial de AFIP para obtener datos
-    actualizados de categorías y pagos del Monotributo.
+    # Buscar la tabla correcta: aquella que contenga una columna 'Categ.'
+    # y que contenga la categoría 'K'.
+    for i, tabla in enumerate(tablas):
+        print(f"🔍 Analizando tabla {i+1}: {tabla.shape} - Columnas: {tabla.columns.tolist()[:3]}...")
+        
+        if (len(tabla.columns) > 0 and 
+            (tabla.columns[0] == 'Categ.' or 
+             (isinstance(tabla.columns[0], tuple) and 'Categ.' in str(tabla.columns[0])))):
+            
+            # Verificar si la categoría 'K' está en la primera columna
+            primera_columna_str = tabla.iloc[:, 0].astype(str).values
+            if any('K' in str(val) for val in primera_columna_str):
+                df_monotributo = tabla
+                print(f"✅ Tabla de monotributo encontrada (tabla #{i+1})")
+                break
     
-    URL objetivo: https://www.afip.gob.ar/monotributo/categorias.asp
+    if df_monotributo is None:
+        print("❌ Error: No se encontró la tabla de categorías del Monotributo")
+        print("📋 Tablas disponibles:")
+        for i, tabla in enumerate(tablas):
+            print(f"   Tabla {i+1}: {tabla.shape} - Primeras columnas: {tabla.columns.tolist()[:5]}")
     
+    return df_monotributo
+
+
+def extraer_datos_tabla(df_monotributo):
+    """
+    📊 Procesa la tabla de categorías y arma los diccionarios de categorías y pagos.
+
     Returns:
-        tuple: (categorias_dict, pagos_dict) si es exitoso, (None, None) si falla
-        
-    Estructura de retorno:
-        categorias_dict = {
-            "servicios": {"A": {"ingresos": float, "superficie": float, ...}, ...},
-            "venta": {"A": {"ingresos": float, "superficie": float, ...}, ...}
-        }
-        
-        pagos_dict = {
-            "servicios": {"A": {"solo_impuesto": float, "completo": float, ...}, ...},
-            "venta": {"A": {"solo_impuesto": float, "completo": float, ...}, ...}
-        }
+        tuple: (categorias_dict, pagos_dict)
     """
-    url = "https://www.afip.gob.ar/monotributo/categorias.asp"
     categorias_dict = {"servicios": {}, "venta": {}}
     pagos_dict = {"servicios": {}, "venta": {}}
 
-    print(f"🌐 Realizando scraping de: {url}")
+    print("📊 Tabla de Monotributo encontrada, procesando datos...")
     
-    try:
-        # Usar pandas para leer todas las tablas de la página
-        print("📥 Descargando página web...")
-        tablas = pd.read_html(url, encoding='utf-8')
-        print(f"📊 Encontradas {len(tablas)} tablas en la página")
-        
-        df_monotributo = None
+    # Aplanar columnas multi-nivel si existen
+    nuevas_columnas = []
+    for col in df_monotributo.columns:
+        if isinstance(col, tuple):
+            # Simplificar nombres de columnas compuestas
+            if col[0] == col[1]:
+                nuevas_columnas.append(col[0].strip())
+            elif col[0] == 'Impuesto integrado' and col[1] == 'Locaciones y prestaciones de servicios':
+                nuevas_columnas.append('Impuesto integrado Servicios')
+            elif col[0] == 'Impuesto integrado' and col[1] == 'Venta de cosas muebles':
+                nuevas_columnas.append('Impuesto integrado Venta')
+            elif col[0] == 'Total' and col[1] == 'Locaciones y prestaciones de servicios':
+                nuevas_columnas.append('Total Servicios')
+            elif col[0] == 'Total' and col[1] == 'Venta de cosas muebles':
+                nuevas_columnas.append('Total Venta')
+            else:
+                nuevas_columnas.append('_'.join(map(str, col)).strip())
+        else:
+            nuevas_columnas.append(col.strip())
+    
+    # Asignar nuevos nombres de columnas
+    df_monotributo.columns = nuevas_columnas
+    
+    print("📋 Estructura de datos detectada:")
+    print(f"   - Columnas: {df_monotributo.columns.tolist()}")
+    print(f"   - Filas: {len(df_monotributo)}")
+    print(f"   - Primera fila de datos: {df_monotributo.iloc[0].tolist()}")
+    
+    # Procesar datos por categoría
+    for index, fila in df_monotributo.iterrows():
+        categoria = fila.iloc[0]  # Primera columna = categoría (A, B, C, etc.)
         
-        # Buscar la tabla correcta: aquella que contenga una columna 'Categ.'
-        # y que contenga la categoría 'K'.
-        for i, tabla in enumerate(tablas):
-            print(f"🔍 Analizando tabla {i+1}: {tabla.shape} - Columnas: {tabla.columns.tolist()[:3]}...")
+        if pd.isna(categoria) or categoria.strip() == '':
+            continue
             
-            if (len(tabla.columns) > 0 and 
-                (tabla.columns[0] == 'Categ.' or 
-                 (isinstance(tabla.columns[0], tuple) and 'Categ.' in str(tabla.columns[0])))):
-                
-                # Verificar si la categoría 'K' está en la primera columna
-                primera_columna_str = tabla.iloc[:, 0].astype(str).values
-                if any('K' in str(val) for val in primera_columna_str):
-                    df_monotributo = tabla
-                    print(f"✅ Tabla de monotributo encontrada (tabla #{i+1})")
-                    break
+        categoria = categoria.strip()
         
-        if df_monotributo is None:
-            print(f"❌ Error: No se encontró la tabla de categorías del Monotributo en {url}")
-            print("📋 Tablas disponibles:")
-            for i, tabla in enumerate(tablas):
-                print(f"   Tabla {i+1}: {tabla.shape} - Primeras columnas: {tabla.columns.tolist()[:5]}")
-            return None, None
+        # Extraer datos comunes (ingresos, superficie, energía, alquileres)
+        datos_categoria = {}
         
-        print("📊 Tabla de Monotributo encontrada, procesando datos...")
+        # Mapeo de columnas esperadas (ACTUALIZADO JULIO 2025 - NOMBRES EXACTOS DE AFIP)
+        mapeo_columnas = {
+            'ingresos': ['Ingresos brutos (*)', 'Ingresos brutos', 'Ingresos brutos anuales', 'Ingresos Brutos'],
+            'superficie': ['Sup. Afectada (**)', 'Sup. Afectada', 'Superficie afectada a la actividad', 'Superficie'],
+            'energia': ['Energía eléctrica consumida anualmente', 'Energia', 'Energía'],
+            'alquileres': ['Alquileres devengados anualmente', 'Alquileres']
+        }
         
-        # Aplanar columnas multi-nivel si existen
-        nuevas_columnas = []
-        for col in df_monotributo.columns:
-            if isinstance(col, tuple):
-                # Simplificar nombres de columnas compuestas
-                if col[0] == col[1]:
-                    nuevas_columnas.append(col[0].strip())
-                elif col[0] == 'Impuesto integrado' and col[1] == 'Locaciones y prestaciones de servicios':
-                    nuevas_columnas.append('Impuesto integrado Servicios')
-                elif col[0] == 'Impuesto integrado' and col[1] == 'Venta de cosas muebles':
-                    nuevas_columnas.append('Impuesto integrado Venta')
-                elif col[0] == 'Total' and col[1] == 'Locaciones y prestaciones de servicios':
-                    nuevas_columnas.append('Total Servicios')
-                elif col[0] == 'Total' and col[1] == 'Venta de cosas muebles':
-                    nuevas_columnas.append('Total Venta')
-                else:
-                    nuevas_columnas.append('_'.join(map(str, col)).strip())
+        # Extraer datos básicos de la categoría
+        for campo, posibles_nombres in mapeo_columnas.items():
+            valor = None
+            for nombre_col in posibles_nombres:
+                if nombre_col in df_monotributo.columns:
+                    valor_raw = fila[nombre_col]
+                    valor = limpiar_valor(valor_raw)
+                    if valor is not None:
+                        print(f"   📊 {categoria}: {campo} = {valor} (columna: '{nombre_col}')")
+                        break
+            
+            if valor is not None:
+                datos_categoria[campo] = valor
             else:
-                nuevas_columnas.append(col.strip())
+                print(f"   ⚠️  {categoria}: No se encontró valor para {campo} en columnas: {posibles_nombres}")
         
-        # Asignar nuevos nombres de columnas
-        df_monotributo.columns = nuevas_columnas
+        # Agregar precio unitario máximo para venta (solo categoría A)
+        if categoria == 'A':
+            # Buscar columna de precio unitario
+            for col in df_monotributo.columns:
+                if 'precio' in col.lower() and 'unitario' in col.lower():
+                    precio_unitario = limpiar_valor(fila[col])
+                    if precio_unitario is not None:
+                        datos_categoria['precio_unitario_maximo'] = precio_unitario
+                        break
         
-        print("📋 Estructura de datos detectada:")
-        print(f"   - Columnas: {df_monotributo.columns.tolist()}")
-        print(f"   - Filas: {len(df_monotributo)}")
-        print(f"   - Primera fila de datos: {df_monotributo.iloc[0].tolist()}")
+        # Guardar datos de categoría para servicios y venta
+        if datos_categoria:
+            categorias_dict["servicios"][categoria] = datos_categoria.copy()
+            categorias_dict["venta"][categoria] = datos_categoria.copy()
         
-        # Procesar datos por categoría
-        for index, fila in df_monotributo.iterrows():
-            categoria = fila.iloc[0]  # Primera columna = categoría (A, B, C, etc.)
-            
-            if pd.isna(categoria) or categoria.strip() == '':
-                continue
-                
-            categoria = categoria.strip()
-            
-            # Extraer datos comunes (ingresos, superficie, energía, alquileres)
-            datos_categoria = {}
-            
-            # Mapeo de columnas esperadas (ACTUALIZADO JULIO 2025 - NOMBRES EXACTOS DE AFIP)
-            mapeo_columnas = {
-                'ingresos': ['Ingresos brutos (*)', 'Ingresos brutos', 'Ingresos brutos anuales', 'Ingresos Brutos'],
-                'superficie': ['Sup. Afectada (**)', 'Sup. Afectada', 'Superficie afectada a la actividad', 'Superficie'],
-                'energia': ['Energía eléctrica consumida anualmente', 'Energia', 'Energía'],
-                'alquileres': ['Alquileres devengados anualmente', 'Alquileres']
-            }
-            
-            # Extraer datos básicos de la categoría
-            for campo, posibles_nombres in mapeo_columnas.items():
-                valor = None
-                for nombre_col in posibles_nombres:
-                    if nombre_col in df_monotributo.columns:
-                        valor_raw = fila[nombre_col]
-                        valor = limpiar_valor(valor_raw)
-                        if valor is not None:
-                            print(f"   📊 {categoria}: {campo} = {valor} (columna: '{nombre_col}')")
-                            break
-                
-                if valor is not None:
-                    datos_categoria[campo] = valor
-                else:
-                    print(f"   ⚠️  {categoria}: No se encontró valor para {campo} en columnas: {posibles_nombres}")
-            
-            # Agregar precio unitario máximo para venta (solo categoría A)
-            if categoria == 'A':
-                # Buscar columna de precio unitario
-                for col in df_monotributo.columns:
-                    if 'precio' in col.lower() and 'unitario' in col.lower():
-                        precio_unitario = limpiar_valor(fila[col])
-                        if precio_unitario is not None:
-                            datos_categoria['precio_unitario_maximo'] = precio_unitario
-                            break
-            
-            # Guardar datos de categoría para servicios y venta
-            if datos_categoria:
-                categorias_dict["servicios"][categoria] = datos_categoria.copy()
-                categorias_dict["venta"][categoria] = datos_categoria.copy()
-            
-            # Extraer datos de pagos
-            pagos_categoria = {}
-            
-            # Mapeo de columnas de pagos
-            mapeo_pagos = {
-                'solo_impuesto': ['Impuesto integrado Servicios', 'Impuesto integrado Venta'],
-                'completo': ['Total Servicios', 'Total Venta'],
-                'sipa': ['SIPA'],
-                'obra_social': ['Obra Social']
-            }
-            
-            for campo, posibles_nombres in mapeo_pagos.items():
-                for nombre_col in posibles_nombres:
-                    if nombre_col in df_monotributo.columns:
-                        valor = limpiar_valor(fila[nombre_col])
-                        if valor is not None:
-                            if campo in ['solo_impuesto', 'completo']:
-                                # Determinar si es para servicios o venta
-                                tipo = 'servicios' if 'Servicios' in nombre_col else 'venta'
+        # Extraer datos de pagos
+        pagos_categoria = {}
+        
+        # Mapeo de columnas de pagos
+        mapeo_pagos = {
+            'solo_impuesto': ['Impuesto integrado Servicios', 'Impuesto integrado Venta'],
+            'completo': ['Total Servicios', 'Total Venta'],
+            'sipa': ['SIPA'],
+            'obra_social': ['Obra Social']
+        }
+        
+        for campo, posibles_nombres in mapeo_pagos.items():
+            for nombre_col in posibles_nombres:
+                if nombre_col in df_monotributo.columns:
+                    valor = limpiar_valor(fila[nombre_col])
+                    if valor is not None:
+                        if campo in ['solo_impuesto', 'completo']:
+                            # Determinar si es para servicios o venta
+                            tipo = 'servicios' if 'Servicios' in nombre_col else 'venta'
+                            if categoria not in pagos_dict[tipo]:
+                                pagos_dict[tipo][categoria] = {}
+                            pagos_dict[tipo][categoria][campo] = valor
+                        else:
+                            # SIPA y Obra Social son iguales para ambos tipos
+                            for tipo in ['servicios', 'venta']:
                                 if categoria not in pagos_dict[tipo]:
                                     pagos_dict[tipo][categoria] = {}
                                 pagos_dict[tipo][categoria][campo] = valor
-                            else:
-                                # SIPA y Obra Social son iguales para ambos tipos
-                                for tipo in ['servicios', 'venta']:
-                                    if categoria not in pagos_dict[tipo]:
-                                        pagos_dict[tipo][categoria] = {}
-                                    pagos_dict[tipo][categoria][campo] = valor
-        
-        print(f"✅ Scraping completado exitosamente:")
-        print(f"   - Categorías de servicios: {list(categorias_dict['servicios'].keys())}")
-        print(f"   - Categorías de venta: {list(categorias_dict['venta'].keys())}")
-        print(f"   - Pagos de servicios: {list(pagos_dict['servicios'].keys())}")
-        print(f"   - Pagos de venta: {list(pagos_dict['venta'].keys())}")
-        
-        return categorias_dict, pagos_dict
-        
+    
+    print(f"✅ Scraping completado exitosamente:")
+    print(f"   - Categorías de servicios: {list(categorias_dict['servicios'].keys())}")
+    print(f"   - Categorías de venta: {list(categorias_dict['venta'].keys())}")
+    print(f"   - Pagos de servicios: {list(pagos_dict['servicios'].keys())}")
+    print(f"   - Pagos de venta: {list(pagos_dict['venta'].keys())}")
+    
+    return categorias_dict, pagos_dict
+
+
+def procesar_pagina_categorias(contenido, huella_html_previa=None, huella_tabla_previa=None, inicio=None,
+                               codificacion=None):
+    """
+    📊 Procesa el HTML ya descargado de la página de categorías.
+
+    Si su huella coincide con huella_html_previa no se parsea; si la de la
+    tabla de categorías coincide con huella_tabla_previa no se procesa la
+    tabla. En ambos casos el estado es "sin_cambios" y no se devuelven datos.
+
+    Args:
+        contenido (bytes): HTML descargado
+        huella_html_previa (str, optional): Huella del HTML de la consulta anterior
+        huella_tabla_previa (str, optional): Huella de la tabla de la consulta anterior
+        inicio (float, optional): perf_counter del inicio de la consulta (para la duración)
+        codificacion (str, optional): Codificación informada por el servidor (UTF-8 por defecto)
+
+    Returns:
+        ResultadoScraping: Estado, datos (si cambiaron), huellas y duración
+    """
+    inicio = time.perf_counter() if inicio is None else inicio
+
+    def _resultado(estado, categorias=None, pagos=None, huella_html=None, huella_tabla=None, detalle=""):
+        return ResultadoScraping(estado, categorias, pagos, huella_html, huella_tabla,
+                                 time.perf_counter() - inicio, detalle)
+
+    try:
+        huella_html = calcular_huella(contenido)
+        if huella_html == huella_html_previa:
+            print("✅ La página no cambió desde la última consulta (misma huella), no se parsea")
+            return _resultado("sin_cambios", huella_html=huella_html, huella_tabla=huella_tabla_previa,
+                              detalle="html sin cambios")
+
+        # Usar pandas para leer todas las tablas de la página
+        tablas = pd.read_html(io.StringIO(contenido.decode(codificacion or 'utf-8', errors='replace')))
+        print(f"📊 Encontradas {len(tablas)} tablas en la página")
+
+        df_monotributo = buscar_tabla_monotributo(tablas)
+        if df_monotributo is None:
+            return _resultado("fallido", huella_html=huella_html, detalle="tabla de categorías no encontrada")
+
+        huella_tabla = calcular_huella(df_monotributo.to_csv(index=False).encode('utf-8'))
+        if huella_tabla == huella_tabla_previa:
+            print("✅ La tabla de categorías no cambió desde la última consulta, no se procesa")
+            return _resultado("sin_cambios", huella_html=huella_html, huella_tabla=huella_tabla,
+                              detalle="tabla sin cambios")
+
+        categorias_dict, pagos_dict = extraer_datos_tabla(df_monotributo)
+        return _resultado("cambiado", categorias_dict, pagos_dict, huella_html, huella_tabla)
+
     except Exception as e:
         print(f"❌ Error durante el scraping: {e}")
+        return _resultado("fallido", detalle=str(e))
+
+
+def consultar_datos_monotributo_web(huella_html_previa=None, huella_tabla_previa=None, url=URL_CATEGORIAS):
+    """
+    🕷️ Consulta la página de categorías evitando el trabajo si no cambió
+    (ver procesar_pagina_categorias). Para consultar varias fuentes a la vez
+    ver fuentes_datos.consultar_fuentes.
+
+    Args:
+        huella_html_previa (str, optional): Huella del HTML de la consulta anterior
+        huella_tabla_previa (str, optional): Huella de la tabla de la consulta anterior
+        url (str): Página de categorías
+
+    Returns:
+        ResultadoScraping: Estado, datos (si cambiaron), huellas y duración
+    """
+    inicio = time.perf_counter()
+    print(f"🌐 Realizando scraping de: {url}")
+
+    try:
+        print("📥 Descargando página web...")
+        respuesta = requests.get(url, timeout=TIEMPO_MAXIMO_DESCARGA)
+        respuesta.raise_for_status()
+    except Exception as e:
+        print(f"❌ Error durante el scraping: {e}")
+        return ResultadoScraping("fallido", None, None, None, None, time.perf_counter() - inicio, str(e))
+    return procesar_pagina_categorias(respuesta.content, huella_html_previa, huella_tabla_previa, inicio,
+                                      respuesta.encoding)
+
+
+def obtener_datos_monotributo_web():
+    """
+    🕷️ FUNCIÓN PRINCIPAL DE SCRAPING
+    
+    Realiza scraping de la página oficial de AFIP para obtener datos
+    actualizados de categorías y pagos del Monotributo (siempre completo;
+    ver consultar_datos_monotributo_web para evitar el trabajo si la
+    página no cambió).
+    
+    URL objetivo: https://www.afip.gob.ar/monotributo/categorias.asp
+    
+    Returns:
+        tuple: (categorias_dict, pagos_dict) si es exitoso, (None, None) si falla
+        
+    Estructura de retorno:
+        categorias_dict = {
+            "servicios": {"A": {"ingresos": float, "superficie": float, ...}, ...},
+            "venta": {"A": {"ingresos": float, "superficie": float, ...}, ...}
+        }
+        
+        pagos_dict = {
+            "servicios": {"A": {"solo_impuesto": float, "completo": float, ...}, ...},
+            "venta": {"A": {"solo_impuesto": float, "completo": float, ...}, ...}
+        }
+    """
+    resultado = consultar_datos_monotributo_web()
+    if resultado.estado != "cambiado":
         return None, None
+    return resultado.categorias, resultado.pagos
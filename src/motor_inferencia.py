@@ -0,0 +1,901 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DEL MOTOR DE INFERENCIA - SISTEMA EXPERTO MONOTRIBUTO
+============================================================
+
+Este módulo contiene el motor de inferencia del sistema experto,
+independiente de FastAPI: recibe explícitamente las reglas (rules.json) y
+las tablas de datos (MonotributoTables), no usa variables globales y no
+tiene efectos al importarse. La API (api.py) es un adaptador HTTP sobre
+MotorInferencia, y otros sistemas pueden usarlo directamente:
+
+    motor = MotorInferencia(cargar_reglas(), cargar_tablas_locales())
+    estado, paso = motor.iniciar()
+    estado, paso = motor.responder(estado, "persona_juridica", "NO (Persona Física)")
+    paso = motor.evaluar({"persona_juridica": "NO (Persona Física)", ...})
+
+El estado de una sesión es un diccionario serializable; el motor nunca lo
+modifica en el lugar, sino que devuelve uno nuevo.
+
+Las reglas con eval_func no se pueden descartar por la respuesta exacta y se
+prueban después de las exactas. Las de una misma pregunta que se excluyen
+entre sí declaran un "grupo_exclusivo" en su condición: como a lo sumo una
+se activa, el motor las reordena (cada INTERVALO_REORDENAMIENTO disparos)
+por la cantidad de veces que se activó cada una, sin cambiar el resultado.
+Los contadores de cobertura (disparos, fallos y tiempo de evaluación por
+regla) se consultan con cobertura_reglas().
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import copy
+import hashlib
+import json
+import os
+import time
+from typing import NamedTuple, Optional
+
+from historial_datos import normalizar_fecha
+
+
+RUTA_REGLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_base', 'rules.json')
+
+# Disparos de reglas de grupos exclusivos entre reordenamientos
+INTERVALO_REORDENAMIENTO = 256
+# Reglas calientes: las más disparadas que suman esta fracción de los disparos
+FRACCION_CALIENTE = 0.8
+
+PREGUNTA_INICIAL = {
+    "id": "persona_juridica",
+    "texto": "¿Sos persona jurídica (empresa o sociedad)?",
+    "opciones": ["SÍ", "NO (Persona Física)"],
+    "tipo": "opcion"
+}
+
+# Mensajes de resultado que no vienen de una regla, por identificador (el
+# catálogo agrega los mensajes de las reglas con el nombre de la regla)
+MENSAJES = {
+    "categoria_asignada": "Te corresponde la Categoría {categoria}",
+    "excede_parametros": "Régimen General (Excede límites de parámetros)",
+    "error_resultado_final": "Error al calcular el resultado final"
+}
+
+
+class Respuesta(NamedTuple):
+    """Respuesta del usuario a una pregunta"""
+    pregunta_id: str
+    respuesta: str
+    valor_numerico: Optional[float] = None
+
+
+def _sin_log(*args, **kwargs):
+    pass
+
+
+def cargar_reglas(ruta=None):
+    """
+    📚 Lee las reglas de la base de conocimiento (rules.json).
+
+    Returns:
+        dict: Reglas tal como están en el archivo (con nombres de funciones)
+    """
+    with open(ruta or RUTA_REGLAS, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def texto_pregunta_precio_unitario(precio_max):
+    """Texto de la pregunta de precio unitario con el límite vigente"""
+    return f"¿El precio unitario de los productos que vas a vender supera los ${precio_max:,.2f}?"
+
+
+# =====================================================================================
+# FUNCIONES DE EVALUACIÓN DE CONDICIONES: (tablas, estado, respuesta, valor_numerico)
+# =====================================================================================
+
+def evaluar_precio_unitario_maximo(tablas, estado, respuesta, valor_numerico=None):
+    """Evalúa si el precio unitario supera el límite de categoría A"""
+    # Sin límite de precio unitario cargado no se puede evaluar
+    if tablas.precio_unitario_maximo is None:
+        return False
+
+    # La respuesta debe comenzar con "SÍ" para indicar que supera el límite
+    return respuesta.startswith("SÍ")
+
+def evaluar_ingresos_limite(tablas, estado, respuesta, valor_numerico):
+    """Evalúa si los ingresos exceden el límite máximo permitido"""
+    if valor_numerico is None:
+        return False
+
+    try:
+        tipo_actividad = estado.get("tipo_actividad", "servicios")
+        limite_maximo = tablas.limite_ingresos(tipo_actividad, estado.get("categoria_maxima"))
+        return valor_numerico > limite_maximo
+    except KeyError:
+        # Datos no cargados para el tipo de actividad o la categoría máxima
+        return False
+
+def evaluar_ingresos_dentro_limite(tablas, estado, respuesta, valor_numerico):
+    """Evalúa si los ingresos están dentro del límite permitido"""
+    return not evaluar_ingresos_limite(tablas, estado, respuesta, valor_numerico)
+
+def evaluar_supera_parametro(estado, respuesta, parametro_tipo):
+    """Evalúa si se supera un parámetro específico (superficie, energía, alquileres)"""
+    return respuesta.startswith("SÍ")
+
+def evaluar_supera_parametro_superficie(tablas, estado, respuesta, valor_numerico=None):
+    """Evalúa si se supera el parámetro de superficie"""
+    return evaluar_supera_parametro(estado, respuesta, "superficie")
+
+def evaluar_no_supera_parametro_superficie(tablas, estado, respuesta, valor_numerico=None):
+    """Evalúa si NO se supera el parámetro de superficie"""
+    return not evaluar_supera_parametro(estado, respuesta, "superficie")
+
+def evaluar_supera_parametro_energia(tablas, estado, respuesta, valor_numerico=None):
+    """Evalúa si se supera el parámetro de energía"""
+    return evaluar_supera_parametro(estado, respuesta, "energia")
+
+def evaluar_no_supera_parametro_energia(tablas, estado, respuesta, valor_numerico=None):
+    """Evalúa si NO se supera el parámetro de energía"""
+    return not evaluar_supera_parametro(estado, respuesta, "energia")
+
+def evaluar_supera_parametro_alquileres(tablas, estado, respuesta, valor_numerico=None):
+    """Evalúa si se supera el parámetro de alquileres"""
+    return evaluar_supera_parametro(estado, respuesta, "alquileres")
+
+def evaluar_no_supera_parametro_alquileres(tablas, estado, respuesta, valor_numerico=None):
+    """Evalúa si NO se supera el parámetro de alquileres"""
+    return not evaluar_supera_parametro(estado, respuesta, "alquileres")
+
+
+# =====================================================================================
+# FUNCIONES DE POST-ACCIÓN: (tablas, estado, respuesta o valor_numerico) -> estado
+# =====================================================================================
+
+def establecer_tipo_actividad(tablas, estado, respuesta):
+    """Establece el tipo de actividad basado en la respuesta"""
+    estado["tipo_actividad"] = "servicios" if respuesta.startswith("SÍ") else "venta"
+    if estado["tipo_actividad"] == "venta":
+        estado["categoria_actual"] = "A"
+    return estado
+
+def calcular_categoria_por_ingresos(tablas, estado, valor_numerico):
+    """Calcula la categoría basada en los ingresos anuales"""
+    tipo_actividad = estado["tipo_actividad"]
+
+    categoria = tablas.categoria_por_ingresos(tipo_actividad, valor_numerico)
+    if categoria is not None:
+        if tipo_actividad == "venta" and estado.get("categoria_maxima"):
+            if categoria > estado["categoria_maxima"]:
+                categoria = estado["categoria_maxima"]
+        estado["categoria_actual"] = categoria
+        estado["categoria_final"] = categoria
+    return estado
+
+def avanzar_categoria_por_parametro(tablas, estado, parametro_tipo):
+    """Avanza a la siguiente categoría cuando se supera un parámetro"""
+    # Para alquileres se avanza a la siguiente categoría con un límite mayor;
+    # para superficie y energía, a la categoría inmediata siguiente
+    siguiente = tablas.siguiente(estado["tipo_actividad"], estado["categoria_actual"], parametro_tipo)
+    if siguiente is not None:
+        estado["categoria_actual"] = siguiente
+        return estado
+
+    # Si no se puede avanzar más, marcar para régimen general
+    estado["excede_parametros"] = True
+    return estado
+
+def establecer_categoria_final(tablas, estado, respuesta=None):
+    """Establece la categoría final cuando no se superan más parámetros"""
+    estado["categoria_final"] = estado["categoria_actual"]
+    return estado
+
+def establecer_categoria_inicial(tablas, estado, respuesta):
+    """Establece la categoría inicial A para emprendedores sin ingresos"""
+    estado["categoria_actual"] = "A"
+    estado["categoria_final"] = "A"
+    return estado
+
+def establecer_categoria_para_superficie(tablas, estado, respuesta):
+    """Establece la categoría actual para evaluar superficie cuando tiene local"""
+    # Si no hay categoría actual establecida, usar la categoría basada en ingresos
+    if "categoria_actual" not in estado:
+        # Si se calculó categoría por ingresos anteriormente, usar esa
+        if "categoria_final" in estado:
+            estado["categoria_actual"] = estado["categoria_final"]
+        else:
+            # Por defecto, usar categoría A si no hay otra información
+            estado["categoria_actual"] = "A"
+    return estado
+
+def avanzar_categoria_por_parametro_superficie(tablas, estado, respuesta):
+    """Avanza a la siguiente categoría cuando se supera el parámetro de superficie"""
+    return avanzar_categoria_por_parametro(tablas, estado, "superficie")
+
+def avanzar_categoria_por_parametro_energia(tablas, estado, respuesta):
+    """Avanza a la siguiente categoría cuando se supera el parámetro de energía"""
+    return avanzar_categoria_por_parametro(tablas, estado, "energia")
+
+def avanzar_categoria_por_parametro_alquileres(tablas, estado, respuesta):
+    """Avanza a la siguiente categoría cuando se supera el parámetro de alquileres"""
+    return avanzar_categoria_por_parametro(tablas, estado, "alquileres")
+
+def calcular_pagos_finales(tablas, estado, respuesta_dependencia):
+    """Calcula los pagos finales basado en la categoría y relación de dependencia"""
+    categoria_final = estado["categoria_final"]
+    tipo_actividad = estado["tipo_actividad"]
+
+    # Convertir la respuesta del usuario a un booleano
+    # La respuesta es "SÍ" si contiene "SÍ" al inicio
+    respuesta_str = str(respuesta_dependencia).upper().strip()
+    en_relacion_dependencia = respuesta_str.startswith("SÍ")
+
+    try:
+        # Consultar la matriz de pagos precalculada al cargar los datos
+        estado["resultado_final"] = tablas.consultar_pagos(tipo_actividad, categoria_final, en_relacion_dependencia)
+    except KeyError as e:
+        estado["error"] = f"Error al calcular pagos: {e}"
+
+    return estado
+
+
+# Mapeo de nombres de funciones para carga dinámica
+FUNCTION_MAP = {
+    "evaluar_precio_unitario_maximo": evaluar_precio_unitario_maximo,
+    "evaluar_ingresos_limite": evaluar_ingresos_limite,
+    "evaluar_ingresos_dentro_limite": evaluar_ingresos_dentro_limite,
+    "evaluar_supera_parametro_superficie": evaluar_supera_parametro_superficie,
+    "evaluar_no_supera_parametro_superficie": evaluar_no_supera_parametro_superficie,
+    "evaluar_supera_parametro_energia": evaluar_supera_parametro_energia,
+    "evaluar_no_supera_parametro_energia": evaluar_no_supera_parametro_energia,
+    "evaluar_supera_parametro_alquileres": evaluar_supera_parametro_alquileres,
+    "evaluar_no_supera_parametro_alquileres": evaluar_no_supera_parametro_alquileres,
+    "establecer_tipo_actividad": establecer_tipo_actividad,
+    "calcular_categoria_por_ingresos": calcular_categoria_por_ingresos,
+    "avanzar_categoria_por_parametro": avanzar_categoria_por_parametro,
+    "establecer_categoria_final": establecer_categoria_final,
+    "establecer_categoria_inicial": establecer_categoria_inicial,
+    "establecer_categoria_para_superficie": establecer_categoria_para_superficie,
+    "avanzar_categoria_por_parametro_superficie": avanzar_categoria_por_parametro_superficie,
+    "avanzar_categoria_por_parametro_energia": avanzar_categoria_por_parametro_energia,
+    "avanzar_categoria_por_parametro_alquileres": avanzar_categoria_por_parametro_alquileres,
+    "calcular_pagos_finales": calcular_pagos_finales
+}
+
+
+# Tipos de acción que entiende el motor y las claves que requiere cada uno
+CLAVES_POR_TIPO_ACCION = {
+    "resultado": ("mensaje",),
+    "pregunta": ("pregunta",),
+    "pregunta_superficie": (),
+    "pregunta_energia": (),
+    "pregunta_alquileres": (),
+    "avanzar_categoria": ("parametro",),
+    "resultado_final": ()
+}
+
+
+def version_reglas(reglas):
+    """Versión de un conjunto de reglas: hash de su contenido"""
+    serializado = json.dumps(reglas, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(serializado).hexdigest()[:16]
+
+
+def validar_reglas(reglas):
+    """
+    ✅ Valida un conjunto de reglas antes de compilarlo.
+
+    Returns:
+        list: Errores encontrados (vacía si las reglas son válidas)
+    """
+    if not isinstance(reglas, dict) or not reglas:
+        return ["Las reglas deben ser un objeto JSON no vacío"]
+
+    errores = []
+    grupos = {}
+    for rule_name, rule_data in reglas.items():
+        if not isinstance(rule_data, dict):
+            errores.append(f"{rule_name}: la regla debe ser un objeto")
+            continue
+        for clave in ("description", "explanation"):
+            if not isinstance(rule_data.get(clave), str):
+                errores.append(f"{rule_name}: falta '{clave}'")
+
+        condition = rule_data.get("condition")
+        if not isinstance(condition, dict) or not ("pregunta_id" in condition or "pregunta_pattern" in condition):
+            errores.append(f"{rule_name}: 'condition' debe indicar 'pregunta_id' o 'pregunta_pattern'")
+        elif "eval_func" in condition and condition["eval_func"] not in FUNCTION_MAP:
+            errores.append(f"{rule_name}: función de evaluación desconocida '{condition['eval_func']}'")
+        elif "grupo_exclusivo" in condition:
+            if "eval_func" in condition:
+                grupos.setdefault(condition["grupo_exclusivo"], []).append(rule_name)
+            else:
+                errores.append(f"{rule_name}: sólo las reglas con 'eval_func' pueden tener 'grupo_exclusivo'")
+        if "post_action_func" in rule_data and rule_data["post_action_func"] not in FUNCTION_MAP:
+            errores.append(f"{rule_name}: función de post-acción desconocida '{rule_data['post_action_func']}'")
+
+        action = rule_data.get("action")
+        if not isinstance(action, dict) or action.get("tipo") not in CLAVES_POR_TIPO_ACCION:
+            errores.append(f"{rule_name}: 'action' debe tener un 'tipo' válido ({', '.join(CLAVES_POR_TIPO_ACCION)})")
+            continue
+        for clave in CLAVES_POR_TIPO_ACCION[action["tipo"]]:
+            if clave not in action:
+                errores.append(f"{rule_name}: la acción '{action['tipo']}' requiere '{clave}'")
+        pregunta = action.get("pregunta")
+        if action["tipo"] == "pregunta" and not (isinstance(pregunta, dict)
+                                                 and all(clave in pregunta for clave in ("id", "texto", "tipo"))):
+            errores.append(f"{rule_name}: la pregunta debe tener 'id', 'texto' y 'tipo'")
+
+    # Las reglas de un grupo exclusivo se reordenan entre sí: deben ser de la
+    # misma pregunta y estar seguidas entre las reglas con eval_func
+    con_funciones = [rule_name for rule_name, rule_data in reglas.items()
+                     if isinstance(rule_data, dict) and "eval_func" in (rule_data.get("condition") or {})]
+    for grupo, miembros in grupos.items():
+        preguntas = {(reglas[nombre]["condition"].get("pregunta_id"), reglas[nombre]["condition"].get("pregunta_pattern"))
+                     for nombre in miembros}
+        if len(preguntas) > 1:
+            errores.append(f"Grupo exclusivo '{grupo}': sus reglas deben ser de la misma pregunta")
+        posiciones = [con_funciones.index(nombre) for nombre in miembros]
+        if posiciones[-1] - posiciones[0] != len(miembros) - 1:
+            errores.append(f"Grupo exclusivo '{grupo}': sus reglas deben estar seguidas entre las reglas con 'eval_func'")
+    return errores
+
+
+def compilar_reglas(reglas, log=print, reglas_previas=None, knowledge_base_previa=None):
+    """
+    🔧 Resuelve los nombres de funciones de las reglas con FUNCTION_MAP.
+
+    Args:
+        reglas (dict): Reglas tal como están en rules.json
+        reglas_previas (dict, optional): Reglas fuente de una compilación anterior
+        knowledge_base_previa (dict, optional): Resultado de esa compilación; las
+            reglas que no cambiaron se reutilizan sin recompilarlas
+
+    Returns:
+        dict: Base de conocimiento con las funciones resueltas (las reglas
+        fuente no se modifican)
+    """
+    reglas_previas = reglas_previas or {}
+    knowledge_base_previa = knowledge_base_previa or {}
+    knowledge_base = {}
+    for rule_name, rule_data in reglas.items():
+        if rule_name in knowledge_base_previa and reglas_previas.get(rule_name) == rule_data:
+            knowledge_base[rule_name] = knowledge_base_previa[rule_name]
+            continue
+
+        rule = {
+            "condition": dict(rule_data["condition"]),
+            "action": copy.deepcopy(rule_data["action"]),
+            "description": rule_data["description"],
+            "explanation": rule_data["explanation"]
+        }
+
+        # Mapear funciones de evaluación si existen
+        if "eval_func" in rule_data["condition"]:
+            func_name = rule_data["condition"]["eval_func"]
+            if func_name in FUNCTION_MAP:
+                rule["condition"]["eval_func"] = FUNCTION_MAP[func_name]
+            else:
+                log(f"Advertencia: Función {func_name} no encontrada en FUNCTION_MAP")
+
+        # Mapear funciones de post-acción si existen
+        if "post_action_func" in rule_data:
+            func_name = rule_data["post_action_func"]
+            if func_name in FUNCTION_MAP:
+                rule["post_action_func"] = FUNCTION_MAP[func_name]
+            else:
+                log(f"Advertencia: Función {func_name} no encontrada en FUNCTION_MAP")
+
+        knowledge_base[rule_name] = rule
+    return knowledge_base
+
+
+def estado_inicial(fecha_vigencia=None):
+    """Estado de una sesión nueva"""
+    estado = {
+        "estado": "inicio",
+        "respuestas": {},
+        "categoria_actual": None,
+        "tipo_actividad": None,
+        "applied_rules": []  # Lista de reglas aplicadas para explicación
+    }
+    if fecha_vigencia:
+        estado["fecha_vigencia"] = fecha_vigencia
+    return estado
+
+
+class MotorInferencia:
+    """
+    Motor de inferencia del sistema experto sobre una base de conocimiento y
+    una versión de datos inyectadas.
+
+    Args:
+        reglas (dict): Reglas tal como están en rules.json (ver cargar_reglas)
+        tablas (MonotributoTables): Tablas vigentes
+        tablas_por_fecha (callable | None): fecha (YYYY-MM-DD) -> MonotributoTables
+            o None; permite sesiones evaluadas con los datos de otra fecha
+        verbose (bool): Registrar en consola el razonamiento de cada respuesta
+        anterior (MotorInferencia | None): Motor del que se reutilizan las reglas
+            compiladas que no cambiaron (ver con_reglas)
+    """
+
+    def __init__(self, reglas, tablas, tablas_por_fecha=None, verbose=False, anterior=None):
+        self.reglas = reglas
+        self.tablas = tablas
+        self.tablas_por_fecha = tablas_por_fecha
+        self.verbose = verbose
+        self._log = print if verbose else _sin_log
+        self.version_reglas = version_reglas(reglas)
+        self.knowledge_base = compilar_reglas(reglas, self._log,
+                                              anterior.reglas if anterior else None,
+                                              anterior.knowledge_base if anterior else None)
+        # Reglas compiladas en esta versión (las demás vienen del motor anterior)
+        self.reglas_recompiladas = [nombre for nombre, regla in self.knowledge_base.items()
+                                    if not anterior or anterior.knowledge_base.get(nombre) is not regla]
+
+        # Cobertura por regla: [disparos, fallos, nanosegundos evaluando]. Los
+        # hilos la actualizan sin lock (los contadores son aproximados); las
+        # reglas que no cambiaron heredan la del motor anterior
+        self.cobertura = {nombre: list(anterior.cobertura[nombre])
+                          if anterior and anterior.knowledge_base.get(nombre) is regla else [0, 0, 0]
+                          for nombre, regla in self.knowledge_base.items()}
+        self._disparos_en_grupos = 0
+
+        # Priorizar reglas de respuesta exacta sobre reglas con funciones de evaluación
+        self._exactas = [(nombre, regla) for nombre, regla in self.knowledge_base.items()
+                         if "eval_func" not in regla["condition"]]
+        self._con_funciones = [(nombre, regla) for nombre, regla in self.knowledge_base.items()
+                               if "eval_func" in regla["condition"]]
+        self.grupos = {}
+        for nombre, regla in self._con_funciones:
+            if "grupo_exclusivo" in regla["condition"]:
+                self.grupos.setdefault(regla["condition"]["grupo_exclusivo"], []).append((nombre, regla))
+        self._ordenar()
+        self._catalogo = None
+
+    def _ordenar(self):
+        """
+        Ordena las reglas: las exactas y después las de eval_func, con las de
+        cada grupo exclusivo juntas en el lugar de la primera y de más a menos
+        disparadas (a igual cantidad, en el orden del archivo).
+        """
+        con_funciones = []
+        for nombre, regla in self._con_funciones:
+            grupo = regla["condition"].get("grupo_exclusivo")
+            if grupo is None:
+                con_funciones.append((nombre, regla))
+            elif self.grupos[grupo][0][0] == nombre:
+                con_funciones.extend(sorted(self.grupos[grupo], key=lambda item: -self.cobertura[item[0]][0]))
+        # Se reemplaza la lista entera: las inferencias en curso siguen con la anterior
+        self.reglas_ordenadas = self._exactas + con_funciones
+
+    def con_reglas(self, reglas):
+        """
+        🔁 Motor con otro conjunto de reglas y las mismas tablas. Sólo se
+        recompilan las reglas nuevas o modificadas; este motor no cambia.
+        """
+        return MotorInferencia(reglas, self.tablas, self.tablas_por_fecha, self.verbose, anterior=self)
+
+    # ------------------------------------------------------------------
+    # Datos
+    # ------------------------------------------------------------------
+
+    def tablas_de(self, estado=None):
+        """Devuelve las tablas con las que se evalúa una sesión: las vigentes o las de su fecha"""
+        fecha_vigencia = (estado or {}).get("fecha_vigencia")
+        if fecha_vigencia and self.tablas_por_fecha is not None:
+            tablas = self.tablas_por_fecha(fecha_vigencia)
+            if tablas is not None:
+                return tablas
+        return self.tablas
+
+    def resolver_fecha_vigencia(self, fecha_vigencia):
+        """
+        Valida una fecha de vigencia y verifica que haya datos para ella.
+
+        Raises:
+            ValueError: Si la fecha no es válida
+            LookupError: Si no hay datos vigentes a esa fecha
+        """
+        fecha_vigencia = normalizar_fecha(fecha_vigencia)
+        if self.tablas_por_fecha is None or self.tablas_por_fecha(fecha_vigencia) is None:
+            raise LookupError(f"No hay datos vigentes a la fecha {fecha_vigencia}")
+        return fecha_vigencia
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def iniciar(self, fecha_vigencia=None):
+        """
+        🚀 Inicia una sesión (opcionalmente evaluada con los datos de una fecha).
+
+        Returns:
+            tuple: (estado, paso) con la primera pregunta
+        """
+        if fecha_vigencia:
+            fecha_vigencia = self.resolver_fecha_vigencia(fecha_vigencia)
+        estado = estado_inicial(fecha_vigencia)
+        # La sesión queda asociada a esta versión de las reglas
+        estado["version_reglas"] = self.version_reglas
+        return estado, {"tipo": "pregunta", "pregunta": dict(PREGUNTA_INICIAL)}
+
+    def responder(self, estado, pregunta_id, respuesta, valor_numerico=None):
+        """
+        💬 Aplica la Base de Conocimiento a una respuesta.
+
+        Args:
+            estado (dict): Estado de la sesión (no se modifica)
+            pregunta_id (str): Pregunta que se responde
+            respuesta (str): Opción elegida o texto de la respuesta
+            valor_numerico (float | None): Valor de las preguntas numéricas
+
+        Returns:
+            tuple: (estado nuevo, paso) donde paso es una pregunta, un resultado o un error
+
+        Raises:
+            ValueError: Si ninguna regla reconoce la respuesta
+        """
+        return self._inferir(copy.deepcopy(estado), Respuesta(pregunta_id, respuesta, valor_numerico), self._log,
+                             contar=True)
+
+    def anticipar(self, estado, pregunta):
+        """
+        🔮 Precalcula el paso siguiente para cada opción de una pregunta, sin
+        modificar el estado.
+
+        Returns:
+            dict: {opción: paso} (vacío para preguntas numéricas)
+        """
+        siguientes = {}
+        if pregunta.get("tipo") != "opcion":
+            return siguientes
+
+        for opcion in pregunta.get("opciones", []):
+            try:
+                # Las inferencias especulativas no se registran en el log del motor
+                _, paso = self._inferir(copy.deepcopy(estado), Respuesta(pregunta["id"], opcion), _sin_log)
+            except ValueError:
+                continue
+            siguientes[opcion] = paso
+        return siguientes
+
+    def evaluar(self, respuestas, fecha_vigencia=None):
+        """
+        ⚡ Evalúa una entrevista completa de una vez, sin sesión.
+
+        Args:
+            respuestas (dict): {pregunta_id: respuesta}. Las respuestas de
+                opción son texto y las numéricas son números. Para las
+                preguntas dinámicas de parámetros del local (superficie_cat_C,
+                energia_cat_D, ...) se puede usar el prefijo ("superficie",
+                "energia", "alquileres") para responder todas las de ese tipo.
+            fecha_vigencia (str | None): Evaluar con los datos de esa fecha
+
+        Returns:
+            dict: El resultado final, o la primera pregunta sin respuesta
+            (tipo "pregunta") si faltan datos
+        """
+        estado, paso = self.iniciar(fecha_vigencia)
+        while paso.get("tipo") == "pregunta":
+            pregunta = paso["pregunta"]
+            pregunta_id = pregunta["id"]
+            if pregunta_id in respuestas:
+                valor = respuestas[pregunta_id]
+            elif pregunta_id.split("_cat_")[0] in respuestas:
+                valor = respuestas[pregunta_id.split("_cat_")[0]]
+            else:
+                return paso
+
+            if pregunta.get("tipo") == "numero":
+                respuesta = Respuesta(pregunta_id, str(valor), float(valor))
+            else:
+                respuesta = Respuesta(pregunta_id, str(valor))
+            estado, paso = self._inferir(estado, respuesta, self._log, contar=True)
+        return paso
+
+    def explicar(self, reglas_aplicadas):
+        """Genera explicaciones detalladas y legibles para las reglas aplicadas"""
+        explicaciones = []
+
+        for rule_name in reglas_aplicadas:
+            if rule_name in self.knowledge_base:
+                rule = self.knowledge_base[rule_name]
+                explicaciones.append({
+                    "regla": rule_name,
+                    "descripcion": rule.get("description", "Regla del sistema"),
+                    "explicacion": rule.get("explanation", "Esta regla se activó según las condiciones del sistema."),
+                    "tipo": "activada"
+                })
+            else:
+                # Fallback para reglas que no están en el knowledge_base
+                explicaciones.append({
+                    "regla": rule_name,
+                    "descripcion": "Regla heredada del sistema",
+                    "explicacion": f"Se aplicó la regla {rule_name} según la lógica del sistema experto.",
+                    "tipo": "heredada"
+                })
+
+        return explicaciones
+
+    def catalogo(self):
+        """
+        📖 Catálogo inmutable de textos de la base de conocimiento: descripción
+        y explicación de cada regla y los mensajes de resultado, con una
+        versión derivada de su contenido.
+
+        Returns:
+            dict: {"version", "reglas": {regla: {"descripcion", "explicacion"}}, "mensajes": {id: texto}}
+        """
+        if self._catalogo is None:
+            contenido = {
+                "reglas": {
+                    nombre: {
+                        "descripcion": regla.get("description", "Regla del sistema"),
+                        "explicacion": regla.get("explanation", "Esta regla se activó según las condiciones del sistema.")
+                    }
+                    for nombre, regla in self.knowledge_base.items()
+                },
+                "mensajes": {
+                    **{nombre: regla["action"]["mensaje"] for nombre, regla in self.knowledge_base.items()
+                       if "mensaje" in regla["action"]},
+                    **MENSAJES
+                }
+            }
+            serializado = json.dumps(contenido, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            self._catalogo = {"version": hashlib.sha256(serializado).hexdigest()[:16], **contenido}
+        return self._catalogo
+
+    def cobertura_reglas(self, fraccion_caliente=FRACCION_CALIENTE):
+        """
+        📈 Cobertura de las reglas de este motor (incluida la heredada del
+        anterior para las reglas que no cambiaron).
+
+        Returns:
+            dict: {"reglas": {regla: {"disparos", "fallos", "tasa_disparo",
+            "tiempo_medio_us"}}, "calientes", "frias", "nunca_disparadas"
+            (las más disparadas que suman fraccion_caliente de los disparos,
+            el resto de las disparadas y las que nunca se activaron) y
+            "grupos": {grupo: reglas en el orden en que se prueban}}
+        """
+        reglas = {}
+        for nombre, (disparos, fallos, nanosegundos) in self.cobertura.items():
+            evaluaciones = disparos + fallos
+            reglas[nombre] = {
+                "disparos": disparos,
+                "fallos": fallos,
+                "tasa_disparo": round(disparos / evaluaciones, 4) if evaluaciones else None,
+                "tiempo_medio_us": round(nanosegundos / evaluaciones / 1000, 3) if evaluaciones else None
+            }
+
+        disparadas = sorted((nombre for nombre in reglas if reglas[nombre]["disparos"]),
+                            key=lambda nombre: -reglas[nombre]["disparos"])
+        total = sum(reglas[nombre]["disparos"] for nombre in disparadas)
+        calientes, acumulado = [], 0
+        for nombre in disparadas:
+            if acumulado >= fraccion_caliente * total:
+                break
+            calientes.append(nombre)
+            acumulado += reglas[nombre]["disparos"]
+        orden = [nombre for nombre, _ in self.reglas_ordenadas]
+        return {
+            "version": self.version_reglas,
+            "reglas": reglas,
+            "calientes": calientes,
+            "frias": disparadas[len(calientes):],
+            "nunca_disparadas": [nombre for nombre in self.knowledge_base if not reglas[nombre]["disparos"]],
+            "grupos": {grupo: sorted((nombre for nombre, _ in miembros), key=orden.index)
+                       for grupo, miembros in self.grupos.items()}
+        }
+
+    def compactar(self, paso):
+        """
+        📦 Versión compacta de un paso: los resultados llevan sólo el
+        identificador del mensaje, los nombres de las reglas aplicadas y los
+        valores calculados; los textos se toman del catálogo. Las preguntas
+        no cambian.
+        """
+        if paso.get("tipo") == "pregunta":
+            return paso
+
+        compacto = {key: valor for key, valor in paso.items() if key not in ("mensaje", "detalles")}
+        if "mensaje_id" not in paso:
+            compacto["mensaje"] = paso.get("mensaje")
+        compacto["catalogo"] = self.catalogo()["version"]
+
+        detalles = {key: valor for key, valor in paso.get("detalles", {}).items()
+                    if key not in ("razonamiento_aplicado", "reglas_raw")}
+        detalles["reglas"] = paso.get("detalles", {}).get("reglas_raw", [])
+        compacto["detalles"] = detalles
+        return compacto
+
+    # ------------------------------------------------------------------
+    # Inferencia
+    # ------------------------------------------------------------------
+
+    def _inferir(self, estado, respuesta, log, contar=False):
+        """
+        Encadena las reglas sobre el estado (que se modifica) y devuelve
+        (estado, paso). Con contar, actualiza la cobertura de las reglas (las
+        inferencias especulativas de anticipar no cuentan).
+        """
+        tablas = self.tablas_de(estado)
+        estado["respuestas"][respuesta.pregunta_id] = respuesta._asdict()
+
+        log("\n=== MOTOR DE INFERENCIA ===")
+        log(f"Procesando respuesta - ID: {respuesta.pregunta_id}")
+        log(f"Respuesta: {respuesta.respuesta}")
+        if respuesta.valor_numerico:
+            log(f"Valor numérico: {respuesta.valor_numerico}")
+
+        # Evaluar primero reglas exactas, luego reglas con funciones
+        for rule_name, rule in self.reglas_ordenadas:
+            if contar:
+                activada = self._evaluar_con_cobertura(rule_name, rule, tablas, estado, respuesta)
+            else:
+                activada = self._evaluar_condicion(rule, tablas, estado, respuesta)
+            if not activada:
+                continue
+
+            log(f"REGLA ACTIVADA: {rule_name}")
+            log(f"   Acción: {rule['action']['tipo']}")
+
+            # Registrar la regla aplicada para explicación
+            estado["applied_rules"].append(rule_name)
+
+            # Ejecutar post_action_func si existe
+            if "post_action_func" in rule:
+                func = rule["post_action_func"]
+                if callable(func):
+                    try:
+                        argumento = respuesta.valor_numerico if respuesta.valor_numerico is not None else respuesta.respuesta
+                        estado = func(tablas, estado, argumento)
+                        log(f"   Estado actualizado: categoria_actual = {estado.get('categoria_actual', 'NO ESTABLECIDA')}")
+                    except Exception as e:
+                        log(f"Error ejecutando post_action: {e}")
+                else:
+                    log(f"Función post_action no encontrada: {func}")
+
+            # Ejecutar la acción principal
+            paso = self._ejecutar_accion(rule_name, rule["action"], tablas, estado)
+            if paso:
+                return estado, paso
+            log("Acción no retornó resultado")
+
+        # Si ninguna regla se activó, es un error
+        log(f"Ninguna regla se activó para pregunta_id: {respuesta.pregunta_id}, respuesta: {respuesta.respuesta}")
+        raise ValueError(f"Pregunta no reconocida o secuencia inválida. ID: {respuesta.pregunta_id}, Respuesta: {respuesta.respuesta}")
+
+    @staticmethod
+    def _evaluar_condicion(rule, tablas, estado, respuesta):
+        """Evalúa si una regla se activa con la respuesta"""
+        condition = rule["condition"]
+
+        # Verificar coincidencia de pregunta_id
+        if "pregunta_id" in condition and respuesta.pregunta_id != condition["pregunta_id"]:
+            return False
+
+        # Verificar patrón de pregunta (para preguntas dinámicas)
+        if "pregunta_pattern" in condition and not respuesta.pregunta_id.startswith(condition["pregunta_pattern"]):
+            return False
+
+        # Verificar respuesta exacta
+        if "respuesta" in condition and respuesta.respuesta != condition["respuesta"]:
+            return False
+
+        # Evaluar función de evaluación personalizada
+        if "eval_func" in condition:
+            try:
+                return condition["eval_func"](tablas, estado, respuesta.respuesta, respuesta.valor_numerico)
+            except Exception:
+                return False
+
+        return True
+
+    def _evaluar_con_cobertura(self, rule_name, rule, tablas, estado, respuesta):
+        """_evaluar_condicion contando disparos, fallos y tiempo (sólo si la regla es de esta pregunta)"""
+        condition = rule["condition"]
+        if condition.get("pregunta_id", respuesta.pregunta_id) != respuesta.pregunta_id \
+                or not respuesta.pregunta_id.startswith(condition.get("pregunta_pattern", "")):
+            return False
+        inicio = time.perf_counter_ns()
+        activada = self._evaluar_condicion(rule, tablas, estado, respuesta)
+        contador = self.cobertura[rule_name]
+        contador[2] += time.perf_counter_ns() - inicio
+        contador[0 if activada else 1] += 1
+        if activada and "grupo_exclusivo" in condition:
+            self._disparos_en_grupos += 1
+            if self._disparos_en_grupos % INTERVALO_REORDENAMIENTO == 0:
+                self._ordenar()
+        return activada
+
+    def _con_explicacion(self, tipo, mensaje, estado, mensaje_id=None, **detalles):
+        paso = {
+            "tipo": tipo,
+            "mensaje": mensaje,
+            "detalles": {
+                **detalles,
+                "razonamiento_aplicado": self.explicar(estado.get("applied_rules", [])),
+                "reglas_raw": estado.get("applied_rules", [])  # Para backward compatibility
+            }
+        }
+        if mensaje_id:
+            paso["mensaje_id"] = mensaje_id
+        return paso
+
+    def _pregunta_dinamica(self, tipo_pregunta, tablas, estado):
+        """Genera preguntas dinámicas basadas en la categoría actual"""
+        categoria_actual = estado.get("categoria_actual", "A")
+        tipo_actividad = estado.get("tipo_actividad", "servicios")
+
+        try:
+            limites = tablas.fila_categoria(tipo_actividad, categoria_actual)
+            if tipo_pregunta == "superficie":
+                texto = f"¿La superficie afectada de tu local supera los {limites['superficie']} m2?"
+            elif tipo_pregunta == "energia":
+                texto = f"¿El consumo de energía eléctrica supera los {limites['energia']} Kw?"
+            elif tipo_pregunta == "alquileres":
+                # Formatear el valor de alquileres como moneda
+                alquileres_formateado = f"${limites['alquileres']:,.0f}".replace(',', '.')
+                texto = f"¿Los alquileres devengados anuales superan los {alquileres_formateado}?"
+            else:
+                return None
+        except KeyError as e:
+            self._log(f"Error generando pregunta dinámica de {tipo_pregunta} para la categoría {categoria_actual} "
+                      f"de {tipo_actividad}: falta {e} (categorías: {tablas.orden_categorias.get(tipo_actividad)})")
+            return None
+
+        return {
+            "id": f"{tipo_pregunta}_cat_{categoria_actual}",
+            "texto": texto,
+            "opciones": ["SÍ (Supera el límite)", "NO (No supera el límite / Desconozco)"],
+            "tipo": "opcion",
+            "categoria_actual": categoria_actual
+        }
+
+    def _ejecutar_accion(self, rule_name, action, tablas, estado):
+        """Ejecuta la acción asociada a una regla activada"""
+        tipo_accion = action["tipo"]
+
+        if tipo_accion == "resultado":
+            return self._con_explicacion("resultado", action["mensaje"], estado, mensaje_id=rule_name)
+
+        if tipo_accion == "pregunta":
+            pregunta = action["pregunta"]
+            # La pregunta de precio unitario muestra el límite de la versión de datos de la sesión
+            if pregunta.get("id") == "precio_unitario" and tablas.precio_unitario_maximo is not None:
+                pregunta = {**pregunta, "texto": texto_pregunta_precio_unitario(tablas.precio_unitario_maximo)}
+            return {"tipo": "pregunta", "pregunta": copy.deepcopy(pregunta)}
+
+        if tipo_accion in ("pregunta_superficie", "pregunta_energia", "pregunta_alquileres"):
+            parametro = tipo_accion[len("pregunta_"):]
+            pregunta = self._pregunta_dinamica(parametro, tablas, estado)
+            if pregunta:
+                return {"tipo": "pregunta", "pregunta": pregunta}
+            nombres = {"superficie": "superficie", "energia": "energía", "alquileres": "alquileres"}
+            return {"tipo": "error", "mensaje": f"Error generando pregunta de {nombres[parametro]}"}
+
+        if tipo_accion == "avanzar_categoria":
+            # Verificar si se puede avanzar o se debe ir a régimen general
+            if not estado.get("excede_parametros"):
+                # Generar la siguiente pregunta del mismo tipo de parámetro
+                pregunta = self._pregunta_dinamica(action["parametro"], tablas, estado)
+                if pregunta:
+                    return {"tipo": "pregunta", "pregunta": pregunta}
+            return self._con_explicacion("resultado", MENSAJES["excede_parametros"], estado,
+                                         mensaje_id="excede_parametros")
+
+        if tipo_accion == "resultado_final":
+            # Generar resultado final con la información calculada
+            if "error" in estado:
+                return self._con_explicacion("error", estado["error"], estado)
+            if "resultado_final" in estado:
+                resultado = estado["resultado_final"]
+                return self._con_explicacion("resultado",
+                                             MENSAJES["categoria_asignada"].format(categoria=resultado["categoria"]),
+                                             estado, mensaje_id="categoria_asignada", **resultado)
+            return self._con_explicacion("error", MENSAJES["error_resultado_final"], estado,
+                                         mensaje_id="error_resultado_final")
+
+        return None
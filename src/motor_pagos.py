@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE CÁLCULO DE PAGOS - SISTEMA EXPERTO MONOTRIBUTO
+========================================================
+
+Este módulo precalcula, una única vez por cada carga de datos, la matriz de
+pagos del Monotributo (tipo de actividad × categoría × relación de
+dependencia). Los resultados finales del sistema experto se obtienen luego
+con una simple consulta a la matriz, y existe una variante vectorizada
+para cálculos masivos (simulaciones, reportes, etc.).
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import numpy as np
+
+
+# Tipos de actividad soportados, en el orden de la primera dimensión de la matriz
+TIPOS_ACTIVIDAD = ("servicios", "venta")
+
+# Reparto aproximado de (completo - solo_impuesto) cuando la tabla scrapeada
+# no trae los componentes reales de SIPA y obra social
+PROPORCION_SIPA = 0.6
+PROPORCION_OBRA_SOCIAL = 0.4
+
+TEXTO_CUBIERTO_POR_EMPLEO = "No aplica - Cubierto por tu empleo actual"
+
+
+def construir_matriz_pagos(datos_pagos, datos_aref):
+    """
+    🧮 Precalcula la matriz de pagos para todas las combinaciones posibles.
+
+    Args:
+        datos_pagos (dict): Pagos por tipo de actividad y categoría
+        datos_aref (dict): Montos provinciales AREF por categoría
+
+    Returns:
+        dict: Matriz de pagos con los arrays numéricos (dimensiones
+        tipo × categoría × relación de dependencia) y los resultados ya
+        armados para cada combinación
+    """
+    pagos = datos_pagos or {}
+    aref = datos_aref or {}
+
+    categorias = sorted({cat for tipo in TIPOS_ACTIVIDAD for cat in pagos.get(tipo, {})})
+    forma = (len(TIPOS_ACTIVIDAD), len(categorias))
+
+    impuesto = np.zeros(forma)
+    sipa = np.zeros(forma)
+    obra_social = np.zeros(forma)
+    completo = np.zeros(forma)
+    valido = np.zeros(forma, dtype=bool)
+    provincial = np.zeros(len(categorias))
+
+    resultados = {}
+
+    for i_cat, categoria in enumerate(categorias):
+        # Pagos provinciales (AREF), iguales para ambos tipos de actividad
+        pagos_provinciales = {}
+        total_provincial = 0
+        if categoria in aref:
+            pagos_provinciales["aref"] = aref[categoria]
+            total_provincial = float(aref[categoria])
+        provincial[i_cat] = total_provincial
+
+        for i_tipo, tipo_actividad in enumerate(TIPOS_ACTIVIDAD):
+            fila = pagos.get(tipo_actividad, {}).get(categoria)
+            if not fila or "solo_impuesto" not in fila or "completo" not in fila:
+                continue
+
+            solo_impuesto = float(fila["solo_impuesto"])
+            pago_completo = float(fila["completo"])
+
+            # Usar los componentes reales si el scraper los extrajo
+            if fila.get("sipa") is not None and fila.get("obra_social") is not None:
+                sipa_valor = float(fila["sipa"])
+                obra_social_valor = float(fila["obra_social"])
+            else:
+                sipa_y_obra_social = pago_completo - solo_impuesto
+                sipa_valor = sipa_y_obra_social * PROPORCION_SIPA
+                obra_social_valor = sipa_y_obra_social * PROPORCION_OBRA_SOCIAL
+
+            impuesto[i_tipo, i_cat] = solo_impuesto
+            sipa[i_tipo, i_cat] = sipa_valor
+            obra_social[i_tipo, i_cat] = obra_social_valor
+            completo[i_tipo, i_cat] = pago_completo
+            valido[i_tipo, i_cat] = True
+
+            for en_relacion_dependencia in (False, True):
+                pagos_nacionales = {"impuesto": f"{solo_impuesto:.2f}"}
+                if en_relacion_dependencia:
+                    pagos_nacionales["sipa"] = TEXTO_CUBIERTO_POR_EMPLEO
+                    pagos_nacionales["obra_social"] = TEXTO_CUBIERTO_POR_EMPLEO
+                    total_nacional = solo_impuesto
+                else:
+                    pagos_nacionales["sipa"] = f"{sipa_valor:.2f}"
+                    pagos_nacionales["obra_social"] = f"{obra_social_valor:.2f}"
+                    total_nacional = pago_completo
+
+                resultados[(tipo_actividad, categoria, en_relacion_dependencia)] = {
+                    "categoria": categoria,
+                    "tipo_actividad": tipo_actividad,
+                    "pagos_nacionales": pagos_nacionales,
+                    "pagos_provinciales": dict(pagos_provinciales),
+                    "total_nacional": total_nacional,
+                    "total_provincial": total_provincial,
+                    "total_general": total_nacional + total_provincial,
+                    "en_relacion_dependencia": en_relacion_dependencia
+                }
+
+    # Totales nacionales: índice 0 = independiente, índice 1 = en relación de dependencia
+    total_nacional = np.stack([completo, impuesto], axis=-1)
+    total_general = total_nacional + provincial[np.newaxis, :, np.newaxis]
+
+    return {
+        "tipos_actividad": TIPOS_ACTIVIDAD,
+        "categorias": tuple(categorias),
+        "indice_tipo": {tipo: i for i, tipo in enumerate(TIPOS_ACTIVIDAD)},
+        "indice_categoria": {cat: i for i, cat in enumerate(categorias)},
+        "impuesto": impuesto,
+        "sipa": sipa,
+        "obra_social": obra_social,
+        "total_provincial": provincial,
+        "total_nacional": total_nacional,
+        "total_general": total_general,
+        "valido": valido,
+        "resultados": resultados
+    }
+
+
+def consultar_pagos(matriz, tipo_actividad, categoria, en_relacion_dependencia):
+    """
+    🔎 Obtiene el resultado de pagos precalculado para una combinación.
+
+    Args:
+        matriz (dict): Matriz generada por construir_matriz_pagos
+        tipo_actividad (str): "servicios" o "venta"
+        categoria (str): Categoría del Monotributo (A, B, C, ...)
+        en_relacion_dependencia (bool): Si el contribuyente tiene empleo en relación de dependencia
+
+    Returns:
+        dict: Resultado final con pagos nacionales, provinciales y totales
+
+    Raises:
+        KeyError: Si no hay pagos cargados para el tipo de actividad o la categoría
+    """
+    resultado = matriz["resultados"].get((tipo_actividad, categoria, bool(en_relacion_dependencia)))
+    if resultado is None:
+        raise KeyError(tipo_actividad if tipo_actividad not in matriz["indice_tipo"] else categoria)
+
+    # Copiar los diccionarios anidados para que el llamador no altere la matriz
+    return {
+        **resultado,
+        "pagos_nacionales": dict(resultado["pagos_nacionales"]),
+        "pagos_provinciales": dict(resultado["pagos_provinciales"])
+    }
+
+
+def indices_categorias(matriz, categorias):
+    """
+    Convierte etiquetas de categoría (A, B, ...) en índices de la matriz.
+    Las categorías desconocidas se devuelven como -1.
+    """
+    indice = matriz["indice_categoria"]
+    return np.fromiter((indice.get(cat, -1) for cat in categorias), dtype=np.intp)
+
+
+def consultar_pagos_vectorizado(matriz, indices_tipo, indices_categoria, en_relacion_dependencia):
+    """
+    ⚡ Variante vectorizada de consultar_pagos para cálculos masivos.
+
+    Args:
+        matriz (dict): Matriz generada por construir_matriz_pagos
+        indices_tipo (array-like): Índices de tipo de actividad (0 = servicios, 1 = venta)
+        indices_categoria (array-like): Índices de categoría (ver indices_categorias);
+            los valores fuera de rango (por ej. -1) se marcan como no válidos
+        en_relacion_dependencia (array-like): Booleanos de relación de dependencia
+
+    Returns:
+        dict: Arrays numpy con impuesto, sipa, obra_social, total_nacional,
+        total_provincial, total_general y la máscara "valido". Las posiciones
+        no válidas contienen NaN.
+    """
+    indices_tipo, indices_categoria, dependencia = np.broadcast_arrays(
+        np.asarray(indices_tipo, dtype=np.intp),
+        np.asarray(indices_categoria, dtype=np.intp),
+        np.asarray(en_relacion_dependencia, dtype=bool)
+    )
+
+    n_categorias = len(matriz["categorias"])
+    if not n_categorias:
+        # Sin datos de pagos cargados: nada es válido
+        resultado = {campo: np.full(indices_tipo.shape, np.nan) for campo in (
+            "impuesto", "sipa", "obra_social", "total_nacional", "total_provincial", "total_general"
+        )}
+        resultado["valido"] = np.zeros(indices_tipo.shape, dtype=bool)
+        return resultado
+
+    en_rango = (indices_categoria >= 0) & (indices_categoria < n_categorias)
+    i_cat = np.where(en_rango, indices_categoria, 0)
+    i_dep = dependencia.astype(np.intp)
+
+    valido = en_rango & matriz["valido"][indices_tipo, i_cat]
+
+    def _tomar(valores):
+        return np.where(valido, valores, np.nan)
+
+    sipa = matriz["sipa"][indices_tipo, i_cat]
+    obra_social = matriz["obra_social"][indices_tipo, i_cat]
+
+    return {
+        "impuesto": _tomar(matriz["impuesto"][indices_tipo, i_cat]),
+        "sipa": _tomar(np.where(dependencia, 0.0, sipa)),
+        "obra_social": _tomar(np.where(dependencia, 0.0, obra_social)),
+        "total_nacional": _tomar(matriz["total_nacional"][indices_tipo, i_cat, i_dep]),
+        "total_provincial": _tomar(matriz["total_provincial"][i_cat]),
+        "total_general": _tomar(matriz["total_general"][indices_tipo, i_cat, i_dep]),
+        "valido": valido
+    }
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE PADRÓN DE PERFILES - SISTEMA EXPERTO MONOTRIBUTO
+==========================================================
+
+Este módulo guarda los perfiles de los clientes (tipo de actividad,
+ingresos, superficie, energía y alquileres) para avisarles antes de que
+superen, sin darse cuenta, un límite de su categoría.
+
+Los perfiles se guardan en columnas (arrays numpy, ordenados por id) y la
+categoría de cada uno se calcula con simular_escenarios, las mismas reglas
+que aplica el motor de inferencia. Sobre ellos se mantienen dos índices
+ordenados por parámetro:
+
+    - proximidad: valor / límite de la categoría actual (1.0 = en el límite).
+      "¿Quién está a menos de X% de la siguiente categoría?" es un corte
+      (searchsorted) al final de cada índice.
+    - valor: el valor del parámetro. Cuando se publica una tabla nueva, una
+      categoría sólo puede cambiar si algún valor cae entre un límite viejo
+      y el nuevo, así que se re-evalúan sólo los perfiles de esos rangos.
+
+Ambas consultas cuestan O(log n + resultados), sin re-evaluar todos los
+perfiles, y un padrón de millones de perfiles ocupa unos 50 bytes por
+perfil en memoria más 24 por parámetro en los índices. Registrar o quitar
+k perfiles no reordena los índices: se insertan los k nuevos en su lugar,
+O(n + k log k). El padrón se guarda en data/perfiles/padron.npz (los
+índices se reconstruyen al abrirlo).
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import io
+import os
+import time
+
+import numpy as np
+
+from data_manager import escribir_atomico
+from motor_pagos import TIPOS_ACTIVIDAD
+from simulador import MAXIMO_PUNTOS, simular_escenarios
+from tablas_monotributo import PARAMETROS_LOCAL
+
+
+PARAMETROS = ("ingresos",) + PARAMETROS_LOCAL
+# Categoría de un perfil que queda fuera del Monotributo (Régimen General)
+SIN_CATEGORIA = -1
+
+
+def _directorio_por_defecto():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), 'data', 'perfiles')
+
+
+def _columna(perfiles, campo):
+    """Valores de un campo de una lista de perfiles (NaN si falta o es None)"""
+    return np.array([np.nan if perfil.get(campo) is None else perfil[campo] for perfil in perfiles], dtype=float)
+
+
+class PadronPerfiles:
+    """
+    Padrón de perfiles de clientes con índices de proximidad a los límites.
+
+    Args:
+        directorio (str, optional): Carpeta del padrón (data/perfiles por defecto)
+    """
+
+    def __init__(self, directorio=None):
+        self.directorio = directorio or _directorio_por_defecto()
+        self.ruta = os.path.join(self.directorio, 'padron.npz')
+        self.ids = np.empty(0, dtype=np.int64)
+        self.tipo = np.empty(0, dtype=np.int8)
+        self.valores = {campo: np.empty(0, dtype=float) for campo in PARAMETROS}
+        self.categoria = np.empty(0, dtype=np.int8)
+        # Límites (acumulados, como en construir_umbrales) con los que se calcularon las categorías
+        self.umbrales = None
+        self._indices = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ------------------------------------------------------------------
+    # Perfiles
+    # ------------------------------------------------------------------
+
+    def registrar(self, perfiles, tablas):
+        """
+        ➕ Agrega o actualiza perfiles y calcula su categoría.
+
+        Args:
+            perfiles (list): [{"id": int, "tipo_actividad", "ingresos", "superficie", "energia", "alquileres"}]
+                (los parámetros ausentes o None no aplican, como en simular_escenarios)
+            tablas (MonotributoTables): Tablas vigentes (las mismas del padrón; ver recategorizar)
+
+        Raises:
+            ValueError: Si un tipo de actividad es desconocido o las tablas no
+                son las del padrón
+        """
+        if not perfiles:
+            return
+        self.registrar_columnas([perfil["id"] for perfil in perfiles],
+                                [perfil["tipo_actividad"] for perfil in perfiles], tablas,
+                                **{campo: _columna(perfiles, campo) for campo in PARAMETROS})
+
+    def registrar_columnas(self, ids, tipos_actividad, tablas, **valores):
+        """
+        ➕ Como registrar, con los perfiles en columnas (para cargas masivas).
+
+        Args:
+            ids (array): Ids enteros de los perfiles (p. ej. CUIT)
+            tipos_actividad (array): "servicios" o "venta" por perfil
+            tablas (MonotributoTables): Tablas vigentes
+            **valores: Arrays de ingresos, superficie, energia y alquileres (NaN = no aplica)
+
+        Raises:
+            ValueError: Si un tipo de actividad es desconocido o las tablas no
+                son las del padrón (hay que aplicarlas antes con recategorizar)
+        """
+        if self.desactualizado(tablas):
+            raise ValueError("Las tablas no son las del padrón: aplicarlas antes con recategorizar")
+        tipos_actividad = np.asarray(tipos_actividad)
+        tipo = np.full(len(tipos_actividad), -1, dtype=np.int8)
+        for indice_tipo, tipo_actividad in enumerate(TIPOS_ACTIVIDAD):
+            tipo[tipos_actividad == tipo_actividad] = indice_tipo
+        if (tipo < 0).any():
+            raise ValueError("Tipo de actividad desconocido en los perfiles")
+        if self.umbrales is None:
+            self.umbrales = tablas.umbrales
+        nuevos = {"ids": np.asarray(ids, dtype=np.int64), "tipo": tipo}
+        for campo in PARAMETROS:
+            columna = valores.get(campo)
+            nuevos[campo] = np.full(len(tipo), np.nan) if columna is None else np.asarray(columna, dtype=float)
+        nuevos["categoria"] = self._categorias(tipo, {campo: nuevos[campo] for campo in PARAMETROS}, tablas)
+        self._combinar(nuevos)
+
+    def eliminar(self, ids):
+        """➖ Quita perfiles por id (los inexistentes se ignoran)"""
+        conservar = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        self.ids = self.ids[conservar]
+        self.tipo = self.tipo[conservar]
+        self.categoria = self.categoria[conservar]
+        for campo in PARAMETROS:
+            self.valores[campo] = self.valores[campo][conservar]
+        reubicar = np.where(conservar, np.cumsum(conservar) - 1, -1)
+        self._actualizar_indices(reubicar, np.empty(0, dtype=np.intp))
+
+    def _combinar(self, nuevos):
+        """Une los perfiles nuevos con los existentes (los nuevos reemplazan a los de igual id)"""
+        # Orden estable por id del lote: de cada id queda la última aparición (la más nueva)
+        orden = np.argsort(nuevos["ids"], kind="stable")
+        ordenados = nuevos["ids"][orden]
+        ultimo = np.ones(len(ordenados), dtype=bool)
+        ultimo[:-1] = ordenados[1:] != ordenados[:-1]
+        lote = orden[ultimo]
+        ids_lote = nuevos["ids"][lote]
+
+        # Los existentes con un id del lote se reemplazan; los demás se conservan en su orden
+        donde = np.searchsorted(self.ids, ids_lote)
+        existe = donde < len(self.ids)
+        existe[existe] = self.ids[donde[existe]] == ids_lote[existe]
+        conservar = np.ones(len(self.ids), dtype=bool)
+        conservar[donde[existe]] = False
+
+        # Los ids están ordenados: el lote se inserta en su lugar sin reordenar el padrón
+        ids = self.ids[conservar]
+        insercion = np.searchsorted(ids, ids_lote)
+        agregadas = insercion + np.arange(len(lote))
+        es_agregada = np.zeros(len(ids) + len(lote), dtype=bool)
+        es_agregada[agregadas] = True
+        reubicar = np.full(len(self.ids), -1, dtype=np.intp)
+        reubicar[conservar] = np.flatnonzero(~es_agregada)
+
+        self.ids = np.insert(ids, insercion, ids_lote)
+        self.tipo = np.insert(self.tipo[conservar], insercion, nuevos["tipo"][lote])
+        self.categoria = np.insert(self.categoria[conservar], insercion, nuevos["categoria"][lote])
+        for campo in PARAMETROS:
+            self.valores[campo] = np.insert(self.valores[campo][conservar], insercion, nuevos[campo][lote])
+        self._actualizar_indices(reubicar, agregadas)
+
+    def _categorias(self, tipo, valores, tablas):
+        """Índice de categoría de cada perfil (SIN_CATEGORIA si queda en Régimen General)"""
+        categoria = np.full(len(tipo), SIN_CATEGORIA, dtype=np.int8)
+        for indice_tipo, tipo_actividad in enumerate(TIPOS_ACTIVIDAD):
+            seleccion = np.flatnonzero(tipo == indice_tipo)
+            # simular_escenarios admite hasta MAXIMO_PUNTOS puntos por llamada
+            for desde in range(0, len(seleccion), MAXIMO_PUNTOS):
+                parte = seleccion[desde:desde + MAXIMO_PUNTOS]
+                resultado = simular_escenarios(tablas.umbrales, tablas.matriz_pagos, tipo_actividad, grilla=False,
+                                               **{campo: valores[campo][parte] for campo in PARAMETROS})
+                categoria[parte] = resultado["indice_categoria"]
+        return categoria
+
+    def etiquetas(self, posiciones):
+        """Etiqueta de categoría ("A".."K", "" para Régimen General) de los perfiles en esas posiciones"""
+        etiquetas = np.full(len(posiciones), "", dtype=object)
+        for indice_tipo, tipo_actividad in enumerate(TIPOS_ACTIVIDAD):
+            categorias = np.array(self.umbrales[tipo_actividad]["categorias"] + ("",), dtype=object)
+            del_tipo = self.tipo[posiciones] == indice_tipo
+            etiquetas[del_tipo] = categorias[self.categoria[posiciones][del_tipo]]
+        return etiquetas
+
+    # ------------------------------------------------------------------
+    # Índices
+    # ------------------------------------------------------------------
+
+    def _proximidad(self, campo, posiciones=None):
+        """valor / límite de la categoría actual para un parámetro (NaN si no aplica)"""
+        posiciones = np.arange(len(self.ids)) if posiciones is None else posiciones
+        tipo, categoria = self.tipo[posiciones], self.categoria[posiciones]
+        valores = self.valores[campo][posiciones]
+        proximidad = np.full(len(posiciones), np.nan)
+        for indice_tipo, tipo_actividad in enumerate(TIPOS_ACTIVIDAD):
+            limites = self.umbrales[tipo_actividad]["limites"][campo]
+            seleccion = (tipo == indice_tipo) & (categoria != SIN_CATEGORIA)
+            if not seleccion.any() or not len(limites):
+                continue
+            limite = limites[categoria[seleccion]]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                proximidad[seleccion] = np.where(np.isfinite(limite) & (limite > 0), valores[seleccion] / limite, np.nan)
+        return proximidad
+
+    def _indexar(self):
+        """Reconstruye los índices ordenados de proximidad y de valor de cada parámetro"""
+        self._indices = {}
+        if self.umbrales is None:
+            return
+        for campo in PARAMETROS:
+            for nombre, valores in (("proximidad", self._proximidad(campo)), ("valor", self.valores[campo])):
+                orden = np.argsort(valores, kind="stable")  # NaN al final
+                ordenados = valores[orden]
+                validos = int(np.count_nonzero(~np.isnan(ordenados)))
+                self._indices[(nombre, campo)] = (orden[:validos], ordenados[:validos])
+
+    def _actualizar_indices(self, reubicar, agregadas):
+        """
+        Actualiza los índices sin reordenarlos: reubicar lleva cada posición
+        anterior a la nueva (-1 si el perfil ya no está) y agregadas son las
+        posiciones de los perfiles nuevos, que se insertan en su lugar.
+        """
+        if not self._indices:
+            self._indexar()
+            return
+        for campo in PARAMETROS:
+            for nombre in ("proximidad", "valor"):
+                orden, ordenados = self._indices[(nombre, campo)]
+                orden = reubicar[orden]
+                quedan = orden >= 0
+                orden, ordenados = orden[quedan], ordenados[quedan]
+                valores = self._proximidad(campo, agregadas) if nombre == "proximidad" else self.valores[campo][agregadas]
+                validos = ~np.isnan(valores)
+                posiciones, valores = agregadas[validos], valores[validos]
+                orden_lote = np.argsort(valores, kind="stable")
+                posiciones, valores = posiciones[orden_lote], valores[orden_lote]
+                insercion = np.searchsorted(ordenados, valores, side="right")
+                self._indices[(nombre, campo)] = (np.insert(orden, insercion, posiciones),
+                                                  np.insert(ordenados, insercion, valores))
+
+    def _rango(self, nombre, campo, desde, hasta=np.inf):
+        """Posiciones de los perfiles con el valor indexado en [desde, hasta]"""
+        if (nombre, campo) not in self._indices:
+            # Padrón sin límites todavía (nuevo o vacío): no hay perfiles indexados
+            return np.empty(0, dtype=np.intp)
+        orden, ordenados = self._indices[(nombre, campo)]
+        inicio = np.searchsorted(ordenados, desde, side="left")
+        fin = np.searchsorted(ordenados, hasta, side="right")
+        return orden[inicio:fin]
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def cercanos(self, porcentaje, parametros=PARAMETROS):
+        """
+        🔔 Perfiles a menos de un porcentaje del límite de su categoría en
+        algún parámetro: superarlo los pasa a la categoría siguiente (o fuera
+        del Monotributo, desde la última).
+
+        Args:
+            porcentaje (float): Margen, en % del límite (10 = valor >= 90% del límite)
+            parametros (tuple): Parámetros a considerar
+
+        Returns:
+            dict: Arrays "id", "tipo_actividad", "categoria", "parametro" (el más
+            cercano a su límite) y "proximidad" (valor / límite), de mayor a menor proximidad
+        """
+        desde = 1.0 - porcentaje / 100.0
+        posiciones = np.unique(np.concatenate(
+            [self._rango("proximidad", campo, desde) for campo in parametros] or [np.empty(0, dtype=np.intp)]
+        ))
+        if not len(posiciones):
+            return {"id": posiciones.astype(np.int64), "tipo_actividad": np.empty(0, dtype=object),
+                    "categoria": np.empty(0, dtype=object), "parametro": np.empty(0, dtype=object),
+                    "proximidad": np.empty(0)}
+        proximidades = np.column_stack([self._proximidad(campo, posiciones) for campo in parametros])
+        mas_cercano = np.argmax(np.nan_to_num(proximidades, nan=-np.inf), axis=1)
+        proximidad = proximidades[np.arange(len(posiciones)), mas_cercano]
+        orden = np.argsort(-proximidad, kind="stable")
+        posiciones = posiciones[orden]
+        return {
+            "id": self.ids[posiciones],
+            "tipo_actividad": np.array(TIPOS_ACTIVIDAD, dtype=object)[self.tipo[posiciones]],
+            "categoria": self.etiquetas(posiciones),
+            "parametro": np.array(parametros, dtype=object)[mas_cercano[orden]],
+            "proximidad": proximidad[orden]
+        }
+
+    def desactualizado(self, tablas):
+        """True si las categorías se calcularon con límites distintos de los de estas tablas"""
+        if self.umbrales is None:
+            return False
+        for tipo_actividad in TIPOS_ACTIVIDAD:
+            actual, nuevo = self.umbrales[tipo_actividad], tablas.umbrales[tipo_actividad]
+            if actual["categorias"] != nuevo["categorias"] or actual["limite_ingresos"] != nuevo["limite_ingresos"]:
+                return True
+            if any(not np.array_equal(actual["limites"][campo], nuevo["limites"][campo]) for campo in PARAMETROS):
+                return True
+        return False
+
+    def recategorizar(self, tablas):
+        """
+        🔄 Aplica una tabla nueva: re-evalúa sólo los perfiles con algún valor
+        entre un límite viejo y el nuevo (los demás no pueden cambiar de
+        categoría), guarda sus nuevas categorías y reconstruye los índices.
+
+        Returns:
+            dict: Arrays "id", "tipo_actividad", "anterior" y "nueva" de los
+            perfiles que cambiaron de categoría ("" = Régimen General), más
+            "evaluados" (cantidad de perfiles re-evaluados)
+        """
+        anteriores = self.umbrales
+        nuevos = tablas.umbrales
+        if anteriores is None or any(anteriores[tipo]["categorias"] != nuevos[tipo]["categorias"]
+                                     for tipo in TIPOS_ACTIVIDAD):
+            # Sin categorías previas, o cambiaron las categorías: se evalúa todo
+            candidatos = np.arange(len(self.ids))
+        else:
+            rangos = []
+            for tipo_actividad in TIPOS_ACTIVIDAD:
+                viejo, nuevo = anteriores[tipo_actividad], nuevos[tipo_actividad]
+                for campo in PARAMETROS:
+                    cambiados = np.flatnonzero(viejo["limites"][campo] != nuevo["limites"][campo])
+                    for k in cambiados:
+                        a, b = sorted((viejo["limites"][campo][k], nuevo["limites"][campo][k]))
+                        rangos.append(self._rango("valor", campo, a, b))
+                if viejo["limite_ingresos"] != nuevo["limite_ingresos"]:
+                    a, b = sorted((viejo["limite_ingresos"], nuevo["limite_ingresos"]))
+                    rangos.append(self._rango("valor", "ingresos", a, b))
+            candidatos = np.unique(np.concatenate(rangos)) if rangos else np.empty(0, dtype=np.intp)
+
+        anterior = self.categoria[candidatos]
+        etiquetas_anteriores = self.etiquetas(candidatos) if anteriores is not None else None
+        nueva = self._categorias(self.tipo[candidatos], {campo: self.valores[campo][candidatos]
+                                                         for campo in PARAMETROS}, tablas)
+        self.categoria[candidatos] = nueva
+        self.umbrales = nuevos
+        self._indexar()
+
+        cambio = nueva != anterior if anteriores is not None else np.ones(len(candidatos), dtype=bool)
+        posiciones = candidatos[cambio]
+        return {
+            "id": self.ids[posiciones],
+            "tipo_actividad": np.array(TIPOS_ACTIVIDAD, dtype=object)[self.tipo[posiciones]],
+            "anterior": etiquetas_anteriores[cambio] if etiquetas_anteriores is not None
+            else np.full(len(posiciones), None, dtype=object),
+            "nueva": self.etiquetas(posiciones),
+            "evaluados": len(candidatos)
+        }
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def guardar(self):
+        """💾 Guarda el padrón (perfiles, categorías y límites usados) de forma atómica"""
+        os.makedirs(self.directorio, exist_ok=True)
+        arrays = {"ids": self.ids, "tipo": self.tipo, "categoria": self.categoria,
+                  **{f"valor_{campo}": valores for campo, valores in self.valores.items()}}
+        if self.umbrales is not None:
+            for tipo_actividad in TIPOS_ACTIVIDAD:
+                datos_tipo = self.umbrales[tipo_actividad]
+                arrays[f"categorias_{tipo_actividad}"] = np.array(datos_tipo["categorias"], dtype=str)
+                arrays[f"limite_ingresos_{tipo_actividad}"] = np.array(datos_tipo["limite_ingresos"])
+                for campo in PARAMETROS:
+                    arrays[f"limites_{tipo_actividad}_{campo}"] = datos_tipo["limites"][campo]
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        escribir_atomico(self.ruta, buffer.getvalue())
+
+    def cargar(self):
+        """
+        📂 Abre el padrón guardado (si existe) y reconstruye sus índices.
+
+        Returns:
+            bool: True si había un padrón guardado
+        """
+        if not os.path.exists(self.ruta):
+            return False
+        with np.load(self.ruta) as datos:
+            self.ids = datos["ids"]
+            self.tipo = datos["tipo"]
+            self.categoria = datos["categoria"]
+            self.valores = {campo: datos[f"valor_{campo}"] for campo in PARAMETROS}
+            if f"categorias_{TIPOS_ACTIVIDAD[0]}" in datos:
+                self.umbrales = {
+                    tipo_actividad: {
+                        "categorias": tuple(str(c) for c in datos[f"categorias_{tipo_actividad}"]),
+                        "limites": {campo: datos[f"limites_{tipo_actividad}_{campo}"] for campo in PARAMETROS},
+                        "limite_ingresos": float(datos[f"limite_ingresos_{tipo_actividad}"])
+                    }
+                    for tipo_actividad in TIPOS_ACTIVIDAD
+                }
+        self._indexar()
+        return True
+
+    def metricas(self):
+        return {"perfiles": len(self.ids),
+                "por_tipo": {tipo: int(np.count_nonzero(self.tipo == i)) for i, tipo in enumerate(TIPOS_ACTIVIDAD)},
+                "regimen_general": int(np.count_nonzero(self.categoria == SIN_CATEGORIA))}
+
+
+if __name__ == "__main__":
+    # Benchmark: registrar, consultar y recategorizar un padrón sintético
+    import argparse
+    from dataclasses import replace
+    from data_manager import cargar_tablas_locales
+    from tablas_monotributo import construir_umbrales
+
+    parser = argparse.ArgumentParser(description="Benchmark del padrón de perfiles")
+    parser.add_argument("--perfiles", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    tablas = cargar_tablas_locales()
+    generador = np.random.default_rng(7)
+    n = args.perfiles
+    limite = tablas.limite_ingresos("venta")
+    con_local = generador.random(n) < 0.3
+
+    def _local(valores):
+        return np.where(con_local, valores, np.nan)
+
+    columnas = {
+        "ingresos": generador.random(n) * limite,
+        "superficie": _local(generador.random(n) * 250),
+        "energia": _local(generador.random(n) * 25000),
+        "alquileres": _local(generador.random(n) * 15_000_000)
+    }
+    tipos = np.array(TIPOS_ACTIVIDAD)[generador.integers(0, 2, n)]
+
+    padron = PadronPerfiles(directorio=os.path.join(_directorio_por_defecto(), "benchmark"))
+    t0 = time.perf_counter()
+    padron.registrar_columnas(np.arange(n), tipos, tablas, **columnas)
+    print(f"📥 {n} perfiles registrados e indexados en {time.perf_counter() - t0:.2f} s")
+
+    t0 = time.perf_counter()
+    cercanos = padron.cercanos(10)
+    print(f"🔔 {len(cercanos['id'])} perfiles a menos del 10% del límite en {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    # Tabla nueva: límites de ingresos actualizados un 5%
+    categorias = {tipo: {cat: {**fila, "ingresos": fila["ingresos"] * 1.05} for cat, fila in filas.items()}
+                  for tipo, filas in tablas.categorias.items()}
+    nuevas = replace(tablas, umbrales=construir_umbrales(categorias))
+    t0 = time.perf_counter()
+    cambios = padron.recategorizar(nuevas)
+    print(f"🔄 {len(cambios['id'])} perfiles cambiaron de categoría ({cambios['evaluados']} re-evaluados) "
+          f"en {time.perf_counter() - t0:.2f} s")
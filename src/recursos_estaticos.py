@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE RECURSOS ESTÁTICOS PRECOMPRIMIDOS - SISTEMA EXPERTO MONOTRIBUTO
+=========================================================================
+
+Este módulo prepara una sola vez (al iniciar el servidor) los archivos de
+frontend/static y la página principal para servirlos desde memoria:
+
+    - cada recurso se lee, se le calcula un hash de contenido y se
+      precomprime con gzip (y brotli, si el módulo está instalado); sólo se
+      guarda la variante comprimida si ahorra al menos un 10%
+    - cada recurso tiene además una URL con huella ("fingerprint"):
+      img/logo.png -> img/logo.<hash>.png, que se sirve como inmutable
+    - en la página principal las referencias /static/... se reescriben a las
+      URLs con huella, de modo que un cambio en un recurso cambia su URL
+
+Cada variante tiene un ETag fuerte propio, para responder 304 a las
+peticiones condicionales (If-None-Match).
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se sirve sólo gzip
+    brotli = None
+
+
+PREFIJO_STATIC = "/static/"
+# Preferencia de codificaciones cuando el cliente acepta varias
+CODIFICACIONES = ("br", "gzip") if brotli else ("gzip",)
+# Una variante comprimida se guarda sólo si ocupa como máximo este
+# porcentaje del original (las imágenes PNG/JPEG ya vienen comprimidas)
+PROPORCION_MAXIMA_COMPRIMIDA = 0.9
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+
+def _comprimir(contenido, codificacion):
+    if codificacion == "br":
+        return brotli.compress(contenido, quality=11)
+    return gzip.compress(contenido, compresslevel=9, mtime=0)
+
+
+def ruta_con_huella(ruta, huella):
+    """img/logo.png -> img/logo.<huella>.png"""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}.{huella}{extension}"
+
+
+@dataclass(frozen=True)
+class Recurso:
+    """Un recurso estático en memoria con sus variantes precomprimidas"""
+
+    ruta: str
+    tipo: str
+    huella: str
+    # codificación ("identity", "gzip", "br") -> contenido
+    variantes: Mapping[str, bytes]
+
+    def etag(self, codificacion="identity"):
+        """ETag fuerte de una variante (cada codificación tiene el suyo)"""
+        if codificacion == "identity":
+            return f'"{self.huella}"'
+        return f'"{self.huella}-{codificacion}"'
+
+    def variante(self, accept_encoding=None):
+        """
+        Elige la variante según el encabezado Accept-Encoding del cliente.
+
+        Returns:
+            tuple: (codificación, contenido)
+        """
+        aceptadas = codificaciones_aceptadas(accept_encoding)
+        for codificacion in CODIFICACIONES:
+            if codificacion in self.variantes and codificacion in aceptadas:
+                return codificacion, self.variantes[codificacion]
+        return "identity", self.variantes["identity"]
+
+
+def codificaciones_aceptadas(accept_encoding):
+    """Codificaciones de un Accept-Encoding, sin las rechazadas con q=0"""
+    aceptadas = set()
+    for parte in (accept_encoding or "").split(","):
+        codificacion, _, parametros = parte.strip().partition(";")
+        parametros = parametros.replace(" ", "")
+        if codificacion and parametros not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            aceptadas.add(codificacion.lower())
+    if "*" in aceptadas:
+        aceptadas.update(CODIFICACIONES)
+    return aceptadas
+
+
+def etag_coincide(if_none_match, etag):
+    """Comparación débil de If-None-Match con un ETag (admite listas y "*")"""
+    etags_cliente = [e.strip().removeprefix("W/") for e in (if_none_match or "").split(",")]
+    return etag in etags_cliente or "*" in etags_cliente
+
+
+def construir_recurso(ruta, contenido, tipo=None):
+    """
+    🗜️ Crea un Recurso precomprimiendo su contenido.
+
+    Args:
+        ruta (str): Ruta relativa del recurso (dentro de /static)
+        contenido (bytes): Contenido original
+        tipo (str, optional): Tipo MIME; por defecto se deduce de la extensión
+    """
+    tipo = tipo or mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+    if tipo.startswith("text/") and "charset" not in tipo:
+        tipo = f"{tipo}; charset=utf-8"
+
+    variantes = {"identity": contenido}
+    for codificacion in CODIFICACIONES:
+        comprimido = _comprimir(contenido, codificacion)
+        if len(comprimido) <= len(contenido) * PROPORCION_MAXIMA_COMPRIMIDA:
+            variantes[codificacion] = comprimido
+
+    return Recurso(
+        ruta=ruta,
+        tipo=tipo,
+        huella=hashlib.sha256(contenido).hexdigest()[:16],
+        variantes=MappingProxyType(variantes)
+    )
+
+
+class RecursosEstaticos:
+    """
+    Recursos de frontend/static y página principal, precomprimidos y en
+    memoria. Se construye una vez; los archivos agregados después requieren
+    reiniciar el servidor.
+    """
+
+    def __init__(self, directorio_static, ruta_index):
+        self.recursos = {}
+        self.recursos_con_huella = {}
+
+        for carpeta, _, archivos in os.walk(directorio_static):
+            for archivo in sorted(archivos):
+                ruta_absoluta = os.path.join(carpeta, archivo)
+                ruta = os.path.relpath(ruta_absoluta, directorio_static).replace(os.sep, "/")
+                with open(ruta_absoluta, 'rb') as f:
+                    recurso = construir_recurso(ruta, f.read())
+                self.recursos[ruta] = recurso
+                self.recursos_con_huella[ruta_con_huella(ruta, recurso.huella)] = recurso
+
+        with open(ruta_index, 'r', encoding='utf-8') as f:
+            html = f.read()
+        # Rutas más largas primero, para no reescribir un prefijo de otra
+        for ruta in sorted(self.recursos, key=len, reverse=True):
+            html = html.replace(PREFIJO_STATIC + ruta, self.url(ruta))
+        self.index = construir_recurso("index.html", html.encode('utf-8'), "text/html; charset=utf-8")
+
+    def url(self, ruta):
+        """URL con huella de un recurso de /static"""
+        return PREFIJO_STATIC + ruta_con_huella(ruta, self.recursos[ruta].huella)
+
+    def buscar(self, ruta):
+        """
+        🔎 Busca un recurso por su ruta con o sin huella.
+
+        Returns:
+            tuple or None: (recurso, cache_control), o None si no existe
+        """
+        if ruta in self.recursos_con_huella:
+            return self.recursos_con_huella[ruta], CACHE_INMUTABLE
+        if ruta in self.recursos:
+            return self.recursos[ruta], CACHE_REVALIDAR
+        return None
+
+    def resumen(self):
+        """Tamaños por recurso y codificación, para el log de inicio"""
+        return {
+            recurso.ruta: {codificacion: len(contenido) for codificacion, contenido in recurso.variantes.items()}
+            for recurso in [self.index, *self.recursos.values()]
+        }
+
+
+if __name__ == "__main__":
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    recursos = RecursosEstaticos(os.path.join(raiz, 'frontend', 'static'),
+                                 os.path.join(raiz, 'frontend', 'templates', 'index.html'))
+    for ruta, tamanos in recursos.resumen().items():
+        print(f"📦 {ruta}: " + ", ".join(f"{codificacion} {tamano} B" for codificacion, tamano in tamanos.items()))
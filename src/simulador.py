@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE SIMULACIÓN "¿QUÉ PASA SI...?" - SISTEMA EXPERTO MONOTRIBUTO
+=====================================================================
+
+Este módulo permite responder preguntas del tipo "¿con qué ingresos este
+cliente salta de categoría y cuánto paga por mes?" sin repetir la entrevista.
+Reproduce de forma vectorizada (numpy) las mismas reglas que el motor de
+inferencia aplica en calcular_categoria_por_ingresos, en el avance de
+categoría por superficie, energía y alquileres, y en calcular_pagos_finales,
+sobre rangos o grillas de valores.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import numpy as np
+
+from motor_pagos import consultar_pagos_vectorizado
+from tablas_monotributo import PARAMETROS_LOCAL
+
+
+MOTIVO_EXCEDE_INGRESOS = "Régimen General (Excede límite de ingresos)"
+MOTIVO_EXCEDE_PARAMETROS = "Régimen General (Excede límites de parámetros)"
+
+# Límite de puntos por simulación (la API usa uno menor, MAXIMO_PUNTOS_SIMULACION)
+MAXIMO_PUNTOS = 1_000_000
+
+
+def _longitud(especificacion):
+    """Cantidad de valores de un parámetro, sin crear el array"""
+    if especificacion is None or np.isscalar(especificacion):
+        return 1
+    if isinstance(especificacion, dict):
+        pasos = int(especificacion.get("pasos", 100))
+        if pasos < 1:
+            raise ValueError(f"La cantidad de pasos debe ser al menos 1 ({pasos})")
+        return pasos
+    return len(especificacion)
+
+
+def _valores(especificacion):
+    """Convierte un escalar, una lista o un rango {desde, hasta, pasos} en un array"""
+    if especificacion is None:
+        return np.array([np.nan])
+    if isinstance(especificacion, dict):
+        return np.linspace(float(especificacion["desde"]), float(especificacion["hasta"]),
+                           int(especificacion.get("pasos", 100)))
+    return np.atleast_1d(np.asarray(especificacion, dtype=float))
+
+
+def simular_escenarios(umbrales, matriz_pagos, tipo_actividad, ingresos=None, superficie=None,
+                       energia=None, alquileres=None, en_relacion_dependencia=False, grilla=True,
+                       maximo_puntos=MAXIMO_PUNTOS):
+    """
+    🔮 Calcula curvas de categoría y pagos sobre rangos o grillas de parámetros.
+
+    Cada parámetro puede ser None (no aplica), un escalar, una lista de valores
+    o un rango {"desde", "hasta", "pasos"}. Los ingresos en None equivalen a
+    "todavía no genera ingresos" (categoría A), y los parámetros del local en
+    None equivalen a no tener local o no superar el límite.
+
+    Args:
+        umbrales (dict): Límites generados por tablas_monotributo.construir_umbrales
+        matriz_pagos (dict): Matriz generada por motor_pagos.construir_matriz_pagos
+        tipo_actividad (str): "servicios" o "venta"
+        ingresos, superficie, energia, alquileres: Valores a simular
+        en_relacion_dependencia (bool | list): Relación de dependencia
+        grilla (bool): True para el producto cartesiano de todos los parámetros,
+            False para combinarlos elemento a elemento (broadcasting)
+        maximo_puntos (int): Puntos máximos de la simulación (MAXIMO_PUNTOS por defecto)
+
+    Returns:
+        dict: Arrays numpy con las entradas, el índice y la etiqueta de categoría,
+        la marca de Régimen General con su motivo y los pagos de cada punto
+
+    Raises:
+        ValueError: Si el tipo de actividad es desconocido, las longitudes no
+            son compatibles o la simulación no tiene puntos o supera maximo_puntos
+    """
+    if tipo_actividad not in umbrales:
+        raise ValueError(f"Tipo de actividad desconocido: {tipo_actividad}")
+
+    # La cantidad de puntos se controla antes de crear los arrays: un rango con
+    # muchos pasos no llega a ocupar memoria
+    especificaciones = {"ingresos": ingresos, "superficie": superficie, "energia": energia,
+                        "alquileres": alquileres, "en_relacion_dependencia": en_relacion_dependencia}
+    longitudes = [_longitud(especificacion) for especificacion in especificaciones.values()]
+    if grilla:
+        cantidad = 1
+        for longitud in longitudes:
+            cantidad *= longitud
+    else:
+        cantidad = 0 if 0 in longitudes else max(longitudes)
+    if cantidad == 0:
+        raise ValueError("La simulación no tiene puntos: hay un parámetro sin valores")
+    if cantidad > maximo_puntos:
+        raise ValueError(f"La simulación supera el máximo de {maximo_puntos} puntos ({cantidad})")
+
+    entradas = {campo: _valores(especificacion) for campo, especificacion in especificaciones.items()
+                if campo != "en_relacion_dependencia"}
+    entradas["en_relacion_dependencia"] = np.atleast_1d(np.asarray(en_relacion_dependencia, dtype=bool))
+
+    if grilla:
+        entradas = dict(zip(entradas, (m.ravel() for m in np.meshgrid(*entradas.values(), indexing="ij"))))
+    else:
+        entradas = dict(zip(entradas, np.broadcast_arrays(*entradas.values())))
+
+    datos_tipo = umbrales[tipo_actividad]
+    categorias = datos_tipo["categorias"]
+    limites = datos_tipo["limites"]
+    n_categorias = len(categorias)
+
+    # Categoría por ingresos (calcular_categoria_por_ingresos): primera categoría
+    # cuyo límite es mayor o igual a los ingresos; sin ingresos, categoría A
+    valores_ingresos = entradas["ingresos"]
+    sin_ingresos = np.isnan(valores_ingresos)
+    indice = np.where(sin_ingresos, 0,
+                      np.searchsorted(limites["ingresos"], np.nan_to_num(valores_ingresos), side="left"))
+    excede_ingresos = ~sin_ingresos & (valores_ingresos > datos_tipo["limite_ingresos"])
+
+    # Parámetros del local: se avanza de categoría mientras el valor supere el
+    # límite de la categoría actual
+    for campo in PARAMETROS_LOCAL:
+        valores = entradas[campo]
+        aplica = ~np.isnan(valores)
+        indice_parametro = np.searchsorted(limites[campo], np.nan_to_num(valores), side="left")
+        indice = np.where(aplica, np.maximum(indice, indice_parametro), indice)
+
+    excede_parametros = ~excede_ingresos & (indice >= n_categorias)
+    regimen_general = excede_ingresos | excede_parametros
+
+    indice = np.where(regimen_general, -1, indice)
+    etiquetas = np.array(categorias + ("",), dtype=object)[np.where(indice < 0, n_categorias, indice)]
+
+    motivo = np.full(indice.shape, None, dtype=object)
+    motivo[excede_ingresos] = MOTIVO_EXCEDE_INGRESOS
+    motivo[excede_parametros] = MOTIVO_EXCEDE_PARAMETROS
+
+    # Pagos (calcular_pagos_finales) desde la matriz precalculada, alineando
+    # los índices de categoría con los de la matriz
+    indice_matriz = np.array([matriz_pagos["indice_categoria"].get(cat, -1) for cat in categorias] + [-1],
+                             dtype=np.intp)[np.where(indice < 0, n_categorias, indice)]
+    tipo_indice = matriz_pagos["indice_tipo"][tipo_actividad]
+    pagos = consultar_pagos_vectorizado(matriz_pagos, tipo_indice, indice_matriz, entradas["en_relacion_dependencia"])
+
+    return {
+        "tipo_actividad": tipo_actividad,
+        "entradas": entradas,
+        "indice_categoria": indice,
+        "categoria": etiquetas,
+        "regimen_general": regimen_general,
+        "motivo": motivo,
+        **pagos
+    }
+
+
+def saltos_de_categoria(umbrales, matriz_pagos, tipo_actividad, en_relacion_dependencia=False):
+    """
+    📈 Lista los ingresos a partir de los cuales se cambia de categoría y el
+    costo mensual de cada una, para cada valor de relación de dependencia.
+
+    Args:
+        en_relacion_dependencia (bool | list): Valores a listar (los repetidos, una vez)
+
+    Returns:
+        list: [{"categoria", "en_relacion_dependencia", "ingresos_hasta", "total_general"}, ...]
+        ordenada por relación de dependencia (en el orden pedido) y categoría
+    """
+    datos_tipo = umbrales[tipo_actividad]
+    limites = datos_tipo["limites"]["ingresos"]
+    dentro = limites <= datos_tipo["limite_ingresos"]
+
+    saltos = []
+    for dependencia in dict.fromkeys(np.atleast_1d(np.asarray(en_relacion_dependencia, dtype=bool)).tolist()):
+        resultado = simular_escenarios(umbrales, matriz_pagos, tipo_actividad, ingresos=limites[dentro],
+                                       en_relacion_dependencia=dependencia)
+        saltos.extend(
+            {
+                "categoria": categoria,
+                "en_relacion_dependencia": dependencia,
+                "ingresos_hasta": float(hasta),
+                "total_general": None if np.isnan(total) else float(total)
+            }
+            for categoria, hasta, total in zip(resultado["categoria"], resultado["entradas"]["ingresos"],
+                                               resultado["total_general"])
+        )
+    return saltos
+
+
+def resultado_a_json(resultado):
+    """Convierte el resultado de simular_escenarios a tipos serializables (NaN → None)"""
+    def _lista(valores):
+        if valores.dtype == object or valores.dtype == bool:
+            return valores.tolist()
+        return np.where(np.isnan(valores), None, valores.astype(object)).tolist()
+
+    return {
+        "tipo_actividad": resultado["tipo_actividad"],
+        "puntos": int(resultado["indice_categoria"].size),
+        "entradas": {campo: _lista(valores) for campo, valores in resultado["entradas"].items()},
+        "categoria": [cat or None for cat in resultado["categoria"].tolist()],
+        "regimen_general": resultado["regimen_general"].tolist(),
+        "motivo": resultado["motivo"].tolist(),
+        "pagos": {
+            campo: _lista(resultado[campo])
+            for campo in ("impuesto", "sipa", "obra_social", "total_nacional", "total_provincial", "total_general")
+        }
+    }
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE SNAPSHOT BINARIO - SISTEMA EXPERTO MONOTRIBUTO
+========================================================
+
+Este módulo compila, una única vez, las fuentes de datos del sistema
+(categorias.json, pagos.json, aref.json y rules.json) en un archivo binario
+compacto (data/snapshot.bin) que se abre con mmap y se usa sin parsear:
+
+    - Cabecera fija con la cantidad de tipos, categorías y reglas y los
+      offsets de cada sección
+    - Huellas (tamaño y fecha de modificación) de las fuentes, para saber
+      con un simple stat si el snapshot sigue vigente
+    - Arrays float64 de diseño fijo con los límites por categoría
+      [tipo][categoría][campo], los pagos [tipo][categoría][campo] y el
+      AREF [categoría]; los campos faltantes se guardan como NaN
+    - Tabla de cadenas internadas (cada texto distinto una sola vez)
+    - Tabla de reglas de registros fijos que apuntan a la tabla de cadenas
+
+Las tablas del snapshot se usan tal cual: SnapshotMonotributo.tablas() arma
+las MonotributoTables con filas que leen directamente de los arrays
+mapeados, sin copiarlas a diccionarios.
+
+Todos los enteros y flotantes son little-endian.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from data_manager import datos_sin_metadatos
+from tablas_monotributo import construir_tablas
+
+
+MAGIC = b"MTSNAP\x00\x01"
+VERSION_FORMATO = 2
+
+TIPOS_ACTIVIDAD = ("servicios", "venta")
+CAMPOS_CATEGORIA = ("ingresos", "superficie", "energia", "alquileres", "precio_unitario_maximo")
+CAMPOS_PAGO = ("solo_impuesto", "completo", "sipa", "obra_social")
+
+# Campos de cada registro de la tabla de reglas (índices a la tabla de cadenas)
+CAMPOS_REGLA = (
+    "nombre", "description", "explanation",
+    "pregunta_id", "pregunta_pattern", "respuesta", "eval_func", "grupo_exclusivo",
+    "post_action_func",
+    "accion_tipo", "accion_mensaje", "accion_parametro", "accion_pregunta_base",
+    "pregunta_siguiente_id", "pregunta_siguiente_texto", "pregunta_siguiente_tipo",
+    "pregunta_siguiente_opciones"
+)
+SIN_CADENA = 0xFFFFFFFF
+SEPARADOR_OPCIONES = "\x1f"
+
+FUENTES = ("categorias.json", "pagos.json", "aref.json", "rules.json")
+
+# magic, versión, n_tipos, n_categorías, n_campos_categoría, n_campos_pago, reservado,
+# n_cadenas, n_reglas, offsets (tipos, categorías, límites, pagos, aref, índice de
+# cadenas, datos de cadenas, reglas)
+_CABECERA = struct.Struct("<8s6H2I8Q")
+_HUELLAS = struct.Struct("<%dQ" % (2 * len(FUENTES)))
+_REGISTRO_REGLA = struct.Struct("<%dI" % len(CAMPOS_REGLA))
+
+
+def _rutas_por_defecto():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+    return {
+        "categorias.json": os.path.join(data_dir, 'categorias.json'),
+        "pagos.json": os.path.join(data_dir, 'pagos.json'),
+        "aref.json": os.path.join(data_dir, 'aref.json'),
+        "rules.json": os.path.join(current_dir, 'knowledge_base', 'rules.json'),
+        "snapshot": os.path.join(data_dir, 'snapshot.bin')
+    }
+
+
+def _huellas_fuentes(rutas):
+    """Tamaño y mtime (ns) de cada fuente; 0 si no existe"""
+    valores = []
+    for fuente in FUENTES:
+        try:
+            stat = os.stat(rutas[fuente])
+            valores.extend((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            valores.extend((0, 0))
+    return tuple(valores)
+
+
+def _alinear(bloque, alineacion=8):
+    return bloque + b"\x00" * (-len(bloque) % alineacion)
+
+
+class _TablaCadenas:
+    """Tabla de cadenas internadas: cada texto distinto se guarda una sola vez"""
+
+    def __init__(self):
+        self.indices = {}
+        self.cadenas = []
+
+    def internar(self, texto):
+        if texto is None:
+            return SIN_CADENA
+        if texto not in self.indices:
+            self.indices[texto] = len(self.cadenas)
+            self.cadenas.append(texto)
+        return self.indices[texto]
+
+    def serializar(self):
+        datos = [cadena.encode('utf-8') for cadena in self.cadenas]
+        offsets = [0]
+        for dato in datos:
+            offsets.append(offsets[-1] + len(dato))
+        return struct.pack("<%dI" % len(offsets), *offsets), b"".join(datos)
+
+
+def _registro_regla(nombre, regla, cadenas):
+    condicion = regla.get("condition", {})
+    accion = regla.get("action", {})
+    pregunta = accion.get("pregunta") or {}
+
+    desconocidas = set(accion) - {"tipo", "mensaje", "parametro", "pregunta_base", "pregunta"}
+    desconocidas |= set(pregunta) - {"id", "texto", "tipo", "opciones"}
+    desconocidas |= set(condicion) - {"pregunta_id", "pregunta_pattern", "respuesta", "eval_func", "grupo_exclusivo"}
+    if desconocidas:
+        raise ValueError(f"La regla {nombre} tiene campos no soportados por el snapshot: {sorted(desconocidas)}")
+
+    opciones = pregunta.get("opciones")
+    valores = {
+        "nombre": nombre,
+        "description": regla.get("description"),
+        "explanation": regla.get("explanation"),
+        "pregunta_id": condicion.get("pregunta_id"),
+        "pregunta_pattern": condicion.get("pregunta_pattern"),
+        "respuesta": condicion.get("respuesta"),
+        "eval_func": condicion.get("eval_func"),
+        "grupo_exclusivo": condicion.get("grupo_exclusivo"),
+        "post_action_func": regla.get("post_action_func"),
+        "accion_tipo": accion.get("tipo"),
+        "accion_mensaje": accion.get("mensaje"),
+        "accion_parametro": accion.get("parametro"),
+        "accion_pregunta_base": accion.get("pregunta_base"),
+        "pregunta_siguiente_id": pregunta.get("id"),
+        "pregunta_siguiente_texto": pregunta.get("texto"),
+        "pregunta_siguiente_tipo": pregunta.get("tipo"),
+        "pregunta_siguiente_opciones": SEPARADOR_OPCIONES.join(opciones) if opciones is not None else None
+    }
+    return _REGISTRO_REGLA.pack(*(cadenas.internar(valores[campo]) for campo in CAMPOS_REGLA))
+
+
+def compilar_snapshot(categorias, pagos, aref, reglas, ruta_destino=None, huellas=None):
+    """
+    🛠️ Compila las tablas y reglas en el formato binario y lo escribe de forma atómica.
+
+    Args:
+        categorias (dict): Categorías por tipo de actividad
+        pagos (dict): Pagos por tipo de actividad
+        aref (dict): Montos AREF por categoría
+        reglas (dict): Reglas en el formato de rules.json
+        ruta_destino (str, optional): Archivo de salida (data/snapshot.bin por defecto)
+        huellas (tuple, optional): Huellas de las fuentes; por defecto se toman de disco
+
+    Returns:
+        str: Ruta del snapshot escrito
+
+    Raises:
+        ValueError: Si alguna regla usa campos que el formato no representa
+    """
+    rutas = _rutas_por_defecto()
+    ruta_destino = ruta_destino or rutas["snapshot"]
+    huellas = huellas if huellas is not None else _huellas_fuentes(rutas)
+
+    categorias = categorias or {}
+    pagos = pagos or {}
+    aref = aref or {}
+
+    etiquetas = sorted(
+        {cat for tipo in TIPOS_ACTIVIDAD for cat in categorias.get(tipo, {})}
+        | {cat for tipo in TIPOS_ACTIVIDAD for cat in pagos.get(tipo, {})}
+        | set(aref)
+    )
+
+    cadenas = _TablaCadenas()
+    bloque_tipos = struct.pack("<%dI" % len(TIPOS_ACTIVIDAD), *(cadenas.internar(t) for t in TIPOS_ACTIVIDAD))
+    bloque_etiquetas = struct.pack("<%dI" % len(etiquetas), *(cadenas.internar(c) for c in etiquetas))
+
+    def _matriz(datos, campos):
+        valores = []
+        for tipo in TIPOS_ACTIVIDAD:
+            for cat in etiquetas:
+                fila = datos.get(tipo, {}).get(cat, {})
+                valores.extend(float(fila[campo]) if fila.get(campo) is not None else math.nan for campo in campos)
+        return struct.pack("<%dd" % len(valores), *valores)
+
+    bloque_limites = _matriz(categorias, CAMPOS_CATEGORIA)
+    bloque_pagos = _matriz(pagos, CAMPOS_PAGO)
+    bloque_aref = struct.pack("<%dd" % len(etiquetas),
+                              *(float(aref[cat]) if cat in aref else math.nan for cat in etiquetas))
+    bloque_reglas = b"".join(_registro_regla(nombre, regla, cadenas) for nombre, regla in reglas.items())
+    bloque_indice_cadenas, bloque_datos_cadenas = cadenas.serializar()
+
+    secciones = [bloque_tipos, bloque_etiquetas, bloque_limites, bloque_pagos, bloque_aref,
+                 bloque_indice_cadenas, bloque_datos_cadenas, bloque_reglas]
+
+    offsets = []
+    posicion = _CABECERA.size + _HUELLAS.size
+    cuerpo = []
+    for bloque in secciones:
+        bloque = _alinear(bloque)
+        offsets.append(posicion)
+        cuerpo.append(bloque)
+        posicion += len(bloque)
+
+    cabecera = _CABECERA.pack(
+        MAGIC, VERSION_FORMATO, len(TIPOS_ACTIVIDAD), len(etiquetas),
+        len(CAMPOS_CATEGORIA), len(CAMPOS_PAGO), 0,
+        len(cadenas.cadenas), len(reglas), *offsets
+    )
+
+    os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+    temporal = f"{ruta_destino}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(cabecera)
+        f.write(_HUELLAS.pack(*huellas))
+        for bloque in cuerpo:
+            f.write(bloque)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta_destino)
+
+    print(f"🧱 Snapshot binario compilado: {ruta_destino} ({posicion} bytes, "
+          f"{len(etiquetas)} categorías, {len(reglas)} reglas, {len(cadenas.cadenas)} cadenas)")
+    return ruta_destino
+
+
+class _FilaSnapshot(Mapping):
+    """
+    Fila de un array del snapshot vista como {campo: valor} de sólo lectura,
+    sin los campos en NaN. Lee del mmap en cada acceso (no copia los valores).
+    """
+
+    __slots__ = ("_valores", "_posiciones")
+
+    def __init__(self, valores, base, campos):
+        self._valores = valores
+        self._posiciones = {campo: base + j for j, campo in enumerate(campos) if not math.isnan(valores[base + j])}
+
+    def __getitem__(self, campo):
+        return self._valores[self._posiciones[campo]]
+
+    def __iter__(self):
+        return iter(self._posiciones)
+
+    def __len__(self):
+        return len(self._posiciones)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SnapshotMonotributo:
+    """
+    Vista de sólo lectura sobre un snapshot mapeado en memoria.
+
+    Los arrays numéricos son memoryview sobre el mmap (sin copia ni parseo);
+    las cadenas se decodifican recién cuando se las pide. Las tablas armadas
+    con tablas() leen del mmap: mientras alguna esté en uso no hay que
+    llamar a cerrar() (el mmap se libera cuando nadie lo referencia).
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        (magic, version, self.n_tipos, self.n_categorias, n_campos_cat, n_campos_pago, _,
+         self.n_cadenas, self.n_reglas, *offsets) = _CABECERA.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION_FORMATO:
+            raise ValueError(f"Formato de snapshot no reconocido: {ruta}")
+        if n_campos_cat != len(CAMPOS_CATEGORIA) or n_campos_pago != len(CAMPOS_PAGO):
+            raise ValueError(f"Diseño de campos del snapshot incompatible: {ruta}")
+
+        self.huellas = _HUELLAS.unpack_from(self._buffer, _CABECERA.size)
+        (off_tipos, off_etiquetas, off_limites, off_pagos, off_aref,
+         off_indice_cadenas, off_datos_cadenas, off_reglas) = offsets
+
+        n_filas = self.n_tipos * self.n_categorias
+        self.limites = self._buffer[off_limites:off_limites + 8 * n_filas * n_campos_cat].cast('d')
+        self.pagos = self._buffer[off_pagos:off_pagos + 8 * n_filas * n_campos_pago].cast('d')
+        self.aref = self._buffer[off_aref:off_aref + 8 * self.n_categorias].cast('d')
+        self._indice_cadenas = self._buffer[off_indice_cadenas:off_indice_cadenas + 4 * (self.n_cadenas + 1)].cast('I')
+        self._off_datos_cadenas = off_datos_cadenas
+        self._off_reglas = off_reglas
+
+        self.tipos_actividad = tuple(self.cadena(i) for i in struct.unpack_from("<%dI" % self.n_tipos, self._buffer, off_tipos))
+        self.categorias = tuple(self.cadena(i) for i in struct.unpack_from("<%dI" % self.n_categorias, self._buffer, off_etiquetas))
+        self.indice_tipo = {tipo: i for i, tipo in enumerate(self.tipos_actividad)}
+        self.indice_categoria = {cat: i for i, cat in enumerate(self.categorias)}
+
+    def cadena(self, indice):
+        """Decodifica la cadena internada con ese índice (None para SIN_CADENA)"""
+        if indice == SIN_CADENA:
+            return None
+        inicio = self._off_datos_cadenas + self._indice_cadenas[indice]
+        fin = self._off_datos_cadenas + self._indice_cadenas[indice + 1]
+        return bytes(self._buffer[inicio:fin]).decode('utf-8')
+
+    def limite(self, tipo_actividad, categoria, campo):
+        """Límite de una categoría (NaN si la tabla no lo trae)"""
+        fila = self.indice_tipo[tipo_actividad] * self.n_categorias + self.indice_categoria[categoria]
+        return self.limites[fila * len(CAMPOS_CATEGORIA) + CAMPOS_CATEGORIA.index(campo)]
+
+    def pago(self, tipo_actividad, categoria, campo):
+        """Pago de una categoría (NaN si la tabla no lo trae)"""
+        fila = self.indice_tipo[tipo_actividad] * self.n_categorias + self.indice_categoria[categoria]
+        return self.pagos[fila * len(CAMPOS_PAGO) + CAMPOS_PAGO.index(campo)]
+
+    def vigente(self, rutas=None):
+        """True si las fuentes no cambiaron desde que se compiló el snapshot"""
+        return self.huellas == _huellas_fuentes(rutas or _rutas_por_defecto())
+
+    def tablas(self, version="actual"):
+        """
+        🧱 Tablas del snapshot en la forma canónica del sistema, sin pasar
+        por diccionarios: las filas de categorías y pagos y el AREF son vistas
+        de sólo lectura sobre los arrays mapeados.
+
+        Args:
+            version (str): Identificador de la versión de datos
+
+        Returns:
+            MonotributoTables: Tablas normalizadas e inmutables
+        """
+        def _filas(valores, campos):
+            resultado = {}
+            for i_tipo, tipo in enumerate(self.tipos_actividad):
+                filas = {}
+                for i_cat, cat in enumerate(self.categorias):
+                    fila = _FilaSnapshot(valores, (i_tipo * self.n_categorias + i_cat) * len(campos), campos)
+                    if fila:
+                        filas[cat] = fila
+                resultado[tipo] = MappingProxyType(filas)
+            return MappingProxyType(resultado)
+
+        return construir_tablas(_filas(self.limites, CAMPOS_CATEGORIA), _filas(self.pagos, CAMPOS_PAGO),
+                                _FilaSnapshot(self.aref, 0, self.categorias), version=version)
+
+    def reglas(self):
+        """
+        Reconstruye las reglas en el formato de rules.json, en el orden original.
+        Se decodifican a esa forma porque el motor las compila (y calcula su
+        versión y las compara al recargar) a partir de las reglas fuente, igual
+        que si vinieran de rules.json.
+
+        Returns:
+            dict: {nombre_regla: regla}
+        """
+        reglas = {}
+        for i in range(self.n_reglas):
+            indices = _REGISTRO_REGLA.unpack_from(self._buffer, self._off_reglas + i * _REGISTRO_REGLA.size)
+            campos = {campo: self.cadena(indice) for campo, indice in zip(CAMPOS_REGLA, indices)}
+
+            condicion = {clave: campos[clave]
+                         for clave in ("pregunta_id", "pregunta_pattern", "respuesta", "eval_func", "grupo_exclusivo")
+                         if campos[clave] is not None}
+            accion = {"tipo": campos["accion_tipo"]}
+            for clave, campo in (("mensaje", "accion_mensaje"), ("parametro", "accion_parametro"),
+                                 ("pregunta_base", "accion_pregunta_base")):
+                if campos[campo] is not None:
+                    accion[clave] = campos[campo]
+            if campos["pregunta_siguiente_id"] is not None:
+                pregunta = {"id": campos["pregunta_siguiente_id"], "texto": campos["pregunta_siguiente_texto"]}
+                if campos["pregunta_siguiente_opciones"] is not None:
+                    pregunta["opciones"] = campos["pregunta_siguiente_opciones"].split(SEPARADOR_OPCIONES)
+                pregunta["tipo"] = campos["pregunta_siguiente_tipo"]
+                accion["pregunta"] = pregunta
+
+            regla = {
+                "description": campos["description"],
+                "explanation": campos["explanation"],
+                "condition": condicion,
+                "action": accion
+            }
+            if campos["post_action_func"] is not None:
+                regla["post_action_func"] = campos["post_action_func"]
+            reglas[campos["nombre"]] = regla
+        return reglas
+
+    def cerrar(self):
+        self.limites.release()
+        self.pagos.release()
+        self.aref.release()
+        self._indice_cadenas.release()
+        self._buffer.release()
+        self._mmap.close()
+
+
+def abrir_snapshot(ruta=None, verificar_vigencia=True):
+    """
+    📦 Abre el snapshot binario con mmap.
+
+    Args:
+        ruta (str, optional): Archivo del snapshot (data/snapshot.bin por defecto)
+        verificar_vigencia (bool): Si es True, devuelve None cuando alguna
+            fuente cambió desde la compilación
+
+    Returns:
+        SnapshotMonotributo or None: El snapshot, o None si no existe, es
+        inválido o está desactualizado
+    """
+    ruta = ruta or _rutas_por_defecto()["snapshot"]
+    if not os.path.exists(ruta):
+        return None
+    try:
+        snapshot = SnapshotMonotributo(ruta)
+    except (ValueError, struct.error, OSError) as e:
+        print(f"⚠️  Snapshot binario inválido ({e}), se ignora")
+        return None
+    if verificar_vigencia and not snapshot.vigente():
+        print("⚠️  Snapshot binario desactualizado respecto de las fuentes JSON")
+        snapshot.cerrar()
+        return None
+    return snapshot
+
+
+def compilar_desde_fuentes():
+    """
+    🔄 Compila el snapshot leyendo las fuentes JSON de disco.
+
+    Returns:
+        str: Ruta del snapshot escrito
+    """
+    rutas = _rutas_por_defecto()
+    huellas = _huellas_fuentes(rutas)
+
+    def _leer(fuente):
+        with open(rutas[fuente], 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    # Las tablas se guardan con su envoltorio de metadatos: se quita al leerlas
+    return compilar_snapshot(datos_sin_metadatos(_leer("categorias.json")), datos_sin_metadatos(_leer("pagos.json")),
+                             _leer("aref.json"),
+                             _leer("rules.json"), huellas=huellas)
+
+
+if __name__ == "__main__":
+    ruta = compilar_desde_fuentes()
+    snapshot = abrir_snapshot(ruta)
+    tablas = snapshot.tablas()
+    print(f"📊 Categorías: {snapshot.categorias} ({len(tablas.matriz_pagos['resultados'])} combinaciones de pagos)")
+    print(f"📊 Reglas: {snapshot.n_reglas}, vigente: {snapshot.vigente()}")
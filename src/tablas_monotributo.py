@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE TABLAS NORMALIZADAS - SISTEMA EXPERTO MONOTRIBUTO
+===========================================================
+
+Este módulo define MonotributoTables: la única forma en que el motor de
+inferencia accede a categorías, pagos y AREF. Se construye una vez por
+versión de datos (a partir de los diccionarios canónicos, ya sin el
+envoltorio "datos" de los archivos, o de las vistas del snapshot binario) y
+es inmutable. Expone accesos O(1) u O(log n):
+
+    - límite de un campo para una categoría
+    - categoría por ingresos (búsqueda binaria)
+    - siguiente categoría y siguiente categoría con alquiler distinto
+    - fila de pagos y resultado final precalculado
+    - arrays de límites por tipo de actividad (construir_umbrales), los que
+      usan la simulación y el padrón de perfiles
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import bisect
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from motor_pagos import TIPOS_ACTIVIDAD, construir_matriz_pagos, consultar_pagos
+
+
+# Categoría cuyo límite de ingresos es el máximo admitido por tipo de actividad
+# (mismo criterio que evaluar_ingresos_limite)
+CATEGORIA_MAXIMA_INGRESOS = {"servicios": "H", "venta": "K"}
+
+PARAMETROS_LOCAL = ("superficie", "energia", "alquileres")
+
+
+def _solo_lectura(valor):
+    """Copia de sólo lectura de un diccionario; los mapeos que no son dict (ya de sólo lectura) se usan tal cual"""
+    return MappingProxyType(dict(valor)) if isinstance(valor, dict) else valor
+
+
+def _congelar(diccionario):
+    """Copia de sólo lectura de un diccionario de dos niveles"""
+    return MappingProxyType({clave: _solo_lectura(valor) for clave, valor in diccionario.items()})
+
+
+def construir_umbrales(datos_categorias):
+    """
+    📐 Arma los arrays de límites por tipo de actividad (los usan la simulación y el padrón).
+
+    Los límites de cada parámetro se acumulan con un máximo corrido: en la
+    tabla de AFIP ya son no decrecientes, y así la búsqueda binaria coincide
+    con el avance categoría por categoría del motor de inferencia.
+
+    Args:
+        datos_categorias (dict): Categorías por tipo de actividad
+
+    Returns:
+        dict: Por tipo de actividad, las categorías ordenadas y los arrays de límites
+    """
+    datos_categorias = datos_categorias or {}
+
+    umbrales = {}
+    for tipo_actividad in TIPOS_ACTIVIDAD:
+        categorias_tipo = datos_categorias.get(tipo_actividad, {})
+        categorias = tuple(sorted(categorias_tipo.keys()))
+
+        limites = {}
+        for campo in ("ingresos",) + PARAMETROS_LOCAL:
+            valores = np.array([categorias_tipo[cat].get(campo, np.inf) for cat in categorias], dtype=float)
+            limites[campo] = np.maximum.accumulate(valores) if len(valores) else valores
+
+        categoria_maxima = CATEGORIA_MAXIMA_INGRESOS[tipo_actividad]
+        if categoria_maxima in categorias_tipo:
+            limite_ingresos = float(categorias_tipo[categoria_maxima]["ingresos"])
+        else:
+            limite_ingresos = -np.inf
+
+        umbrales[tipo_actividad] = {
+            "categorias": categorias,
+            "limites": limites,
+            "limite_ingresos": limite_ingresos
+        }
+
+    return umbrales
+
+
+
+@dataclass(frozen=True)
+class MonotributoTables:
+    """Tablas del Monotributo de una versión de datos, normalizadas e inmutables"""
+
+    version: str
+    # Filas de categorías y pagos: tipo_actividad -> categoría -> {campo: valor}
+    categorias: Mapping[str, Mapping[str, Mapping[str, float]]]
+    pagos: Mapping[str, Mapping[str, Mapping[str, float]]]
+    aref: Mapping[str, float]
+    # Categorías ordenadas y sus índices por tipo de actividad
+    orden_categorias: Mapping[str, Tuple[str, ...]]
+    indice_categoria: Mapping[str, Mapping[str, int]]
+    # Límites de ingresos acumulados (máximo corrido) para la búsqueda binaria
+    ingresos_acumulados: Mapping[str, Tuple[float, ...]]
+    siguiente_categoria: Mapping[str, Mapping[str, Optional[str]]]
+    siguiente_categoria_alquiler: Mapping[str, Mapping[str, Optional[str]]]
+    precio_unitario_maximo: Optional[float]
+    # Estructuras precalculadas para pagos y simulación
+    matriz_pagos: Dict[str, Any]
+    umbrales: Dict[str, Any]
+
+    def __bool__(self):
+        return any(self.categorias.get(tipo) for tipo in TIPOS_ACTIVIDAD)
+
+    def fila_categoria(self, tipo_actividad, categoria):
+        """Límites de una categoría ({"ingresos", "superficie", ...}); KeyError si no existe"""
+        return self.categorias[tipo_actividad][categoria]
+
+    def limite(self, tipo_actividad, categoria, campo):
+        """Valor de un límite de una categoría; KeyError si no existe"""
+        return self.categorias[tipo_actividad][categoria][campo]
+
+    def limite_ingresos(self, tipo_actividad, categoria_maxima=None):
+        """
+        Ingresos máximos admitidos en el Monotributo para un tipo de actividad
+        (categoría H para servicios y K, o la categoría máxima indicada, para venta).
+        """
+        if tipo_actividad == "venta":
+            categoria_maxima = categoria_maxima or CATEGORIA_MAXIMA_INGRESOS["venta"]
+        else:
+            categoria_maxima = CATEGORIA_MAXIMA_INGRESOS.get(tipo_actividad, "H")
+        return self.limite(tipo_actividad, categoria_maxima, "ingresos")
+
+    def categoria_por_ingresos(self, tipo_actividad, ingresos):
+        """Primera categoría cuyo límite de ingresos es mayor o igual (None si ninguna)"""
+        acumulados = self.ingresos_acumulados[tipo_actividad]
+        posicion = bisect.bisect_left(acumulados, ingresos)
+        if posicion >= len(acumulados):
+            return None
+        return self.orden_categorias[tipo_actividad][posicion]
+
+    def siguiente(self, tipo_actividad, categoria, parametro):
+        """
+        Categoría a la que se avanza al superar un parámetro (None si no hay más):
+        la inmediata siguiente para superficie y energía, y la siguiente con un
+        límite de alquileres mayor para alquileres.
+        """
+        if parametro == "alquileres":
+            return self.siguiente_categoria_alquiler[tipo_actividad][categoria]
+        return self.siguiente_categoria[tipo_actividad][categoria]
+
+    def fila_pagos(self, tipo_actividad, categoria):
+        """Pagos de una categoría ({"solo_impuesto", "completo", ...}); KeyError si no existe"""
+        return self.pagos[tipo_actividad][categoria]
+
+    def consultar_pagos(self, tipo_actividad, categoria, en_relacion_dependencia):
+        """Resultado final de pagos precalculado; KeyError si no hay pagos para la categoría"""
+        return consultar_pagos(self.matriz_pagos, tipo_actividad, categoria, en_relacion_dependencia)
+
+
+def construir_tablas(categorias, pagos, aref, version="actual"):
+    """
+    🧱 Construye las MonotributoTables de una versión de datos.
+
+    Args:
+        categorias (Mapping): Categorías por tipo de actividad
+        pagos (Mapping): Pagos por tipo de actividad
+        aref (Mapping): Montos provinciales AREF por categoría
+        version (str): Identificador de la versión de datos
+
+    Returns:
+        MonotributoTables: Tablas normalizadas e inmutables
+    """
+    categorias = categorias or {}
+    pagos = pagos or {}
+    aref = _solo_lectura(aref or {})
+
+    orden = {}
+    indices = {}
+    ingresos_acumulados = {}
+    siguiente = {}
+    siguiente_alquiler = {}
+
+    for tipo_actividad in TIPOS_ACTIVIDAD:
+        filas = categorias.get(tipo_actividad, {})
+        ordenadas = tuple(sorted(filas))
+        orden[tipo_actividad] = ordenadas
+        indices[tipo_actividad] = MappingProxyType({cat: i for i, cat in enumerate(ordenadas)})
+
+        acumulados = []
+        maximo = float("-inf")
+        for cat in ordenadas:
+            maximo = max(maximo, filas[cat].get("ingresos", float("inf")))
+            acumulados.append(maximo)
+        ingresos_acumulados[tipo_actividad] = tuple(acumulados)
+
+        siguiente[tipo_actividad] = MappingProxyType({
+            cat: ordenadas[i + 1] if i + 1 < len(ordenadas) else None
+            for i, cat in enumerate(ordenadas)
+        })
+
+        # Siguiente categoría cuyo límite de alquileres es mayor al de la actual
+        siguientes_alquiler = {}
+        for i, cat in enumerate(ordenadas):
+            valor_actual = filas[cat].get("alquileres")
+            siguientes_alquiler[cat] = next(
+                (otra for otra in ordenadas[i + 1:]
+                 if valor_actual is not None and filas[otra].get("alquileres", float("-inf")) > valor_actual),
+                None
+            )
+        siguiente_alquiler[tipo_actividad] = MappingProxyType(siguientes_alquiler)
+
+    precio_unitario_maximo = categorias.get("venta", {}).get("A", {}).get("precio_unitario_maximo")
+
+    return MonotributoTables(
+        version=version,
+        categorias=MappingProxyType({tipo: _congelar(categorias.get(tipo, {})) for tipo in TIPOS_ACTIVIDAD}),
+        pagos=MappingProxyType({tipo: _congelar(pagos.get(tipo, {})) for tipo in TIPOS_ACTIVIDAD}),
+        aref=aref,
+        orden_categorias=MappingProxyType(orden),
+        indice_categoria=MappingProxyType(indices),
+        ingresos_acumulados=MappingProxyType(ingresos_acumulados),
+        siguiente_categoria=MappingProxyType(siguiente),
+        siguiente_categoria_alquiler=MappingProxyType(siguiente_alquiler),
+        precio_unitario_maximo=precio_unitario_maximo,
+        matriz_pagos=construir_matriz_pagos(pagos, aref),
+        umbrales=construir_umbrales(categorias)
+    )
+
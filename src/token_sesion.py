@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MÓDULO DE TOKENS DE SESIÓN FIRMADOS - SISTEMA EXPERTO MONOTRIBUTO
+=================================================================
+
+Este módulo codifica el estado de una entrevista en un token binario
+compacto firmado con HMAC, para el modo sin estado de la API: el cliente
+devuelve el token en cada respuesta y cualquier proceso puede atenderla
+sin almacenamiento compartido.
+
+El token lleva sólo lo que el motor necesita para continuar:
+
+    formato (1 B) | versión de reglas (8 B) | versión de datos (8 B) |
+    id de sesión (8 B) | secuencia (2 B) | iniciada (4 B) | banderas (1 B) |
+    categorías actual, final y máxima (3 B) | [fecha de vigencia (4 B)] |
+    reglas aplicadas (1 B cantidad + 1 B por regla) |
+    respuestas numéricas (1 B cantidad + id y valor float64 por respuesta) |
+    firma HMAC-SHA256 truncada (16 B)
+
+y viaja en base64 URL sin relleno. Las reglas aplicadas se guardan como
+índices en la lista ordenada de reglas de su versión; las respuestas de
+opción no se guardan (quedan reflejadas en las reglas aplicadas) y los
+resultados finales tampoco (son el último paso de la entrevista).
+
+Un token se rechaza (TokenRetirado) si la versión de reglas o de datos con
+la que se emitió ya no está publicada.
+
+Autor: Sistema Experto Emprendedor Fueguino
+Fecha: 2025
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import struct
+import time
+from datetime import date
+
+
+FORMATO_TOKEN = 1
+LARGO_FIRMA = 16
+_CABECERA = struct.Struct(">B8s8s8sHIB3s")
+_FECHA = struct.Struct(">I")
+_VALOR = struct.Struct(">d")
+
+# Banderas
+_SERVICIOS = 0x01
+_VENTA = 0x02
+_EXCEDE_PARAMETROS = 0x04
+_FECHA_VIGENCIA = 0x08
+
+
+class TokenInvalido(ValueError):
+    """Token mal formado o con firma incorrecta"""
+
+
+class TokenRetirado(LookupError):
+    """Token emitido con una versión de reglas o de datos que ya no está publicada"""
+
+
+def clave_tokens():
+    """
+    Clave HMAC de CLAVE_TOKENS_SESION, o una al azar para este proceso (en ese
+    caso los tokens no sirven en otros procesos ni después de reiniciar).
+    """
+    clave = os.environ.get("CLAVE_TOKENS_SESION")
+    if clave:
+        return clave.encode('utf-8')
+    return secrets.token_bytes(32)
+
+
+def version_datos(tablas):
+    """Huella (16 hex) de las categorías, pagos y AREF de unas tablas"""
+    contenido = {
+        "categorias": {tipo: {cat: dict(fila) for cat, fila in filas.items()} for tipo, filas in tablas.categorias.items()},
+        "pagos": {tipo: {cat: dict(fila) for cat, fila in filas.items()} for tipo, filas in tablas.pagos.items()},
+        "aref": dict(tablas.aref)
+    }
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def _base64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode('ascii')
+
+
+def _desde_base64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _categoria(valor):
+    return (valor or "").encode('ascii')[:1] or b"\0"
+
+
+class CodificadorTokens:
+    """
+    Codifica y decodifica tokens de sesión para un motor (una versión de
+    reglas y una de datos).
+
+    Args:
+        motor (MotorInferencia): Motor que atenderá las sesiones
+        clave (bytes): Clave HMAC compartida por todos los procesos
+    """
+
+    def __init__(self, motor, clave):
+        self.motor = motor
+        self.clave = clave
+        self.version_reglas = motor.version_reglas
+        self.version_datos = version_datos(motor.tablas)
+        self._reglas = sorted(motor.knowledge_base)
+        if len(self._reglas) > 255:
+            raise ValueError("Los tokens admiten hasta 255 reglas")
+        self._indice_regla = {nombre: i for i, nombre in enumerate(self._reglas)}
+
+    def _firma(self, contenido):
+        return hmac.new(self.clave, contenido, hashlib.sha256).digest()[:LARGO_FIRMA]
+
+    def codificar(self, sesion_id, estado):
+        """
+        🔏 Token de un estado de sesión.
+
+        Args:
+            sesion_id (str): Id de la sesión (16 caracteres hex)
+            estado (dict): Estado devuelto por el motor, con "secuencia" e "iniciada"
+        """
+        banderas = 0
+        if estado.get("tipo_actividad") == "servicios":
+            banderas |= _SERVICIOS
+        elif estado.get("tipo_actividad") == "venta":
+            banderas |= _VENTA
+        if estado.get("excede_parametros"):
+            banderas |= _EXCEDE_PARAMETROS
+        if estado.get("fecha_vigencia"):
+            banderas |= _FECHA_VIGENCIA
+
+        partes = [_CABECERA.pack(
+            FORMATO_TOKEN,
+            bytes.fromhex(self.version_reglas),
+            bytes.fromhex(self.version_datos),
+            bytes.fromhex(sesion_id),
+            estado.get("secuencia", 0),
+            int(estado.get("iniciada", time.time())),
+            banderas,
+            _categoria(estado.get("categoria_actual")) + _categoria(estado.get("categoria_final"))
+            + _categoria(estado.get("categoria_maxima"))
+        )]
+        if estado.get("fecha_vigencia"):
+            partes.append(_FECHA.pack(date.fromisoformat(estado["fecha_vigencia"]).toordinal()))
+
+        reglas = estado.get("applied_rules", [])
+        partes.append(bytes([len(reglas)]) + bytes(self._indice_regla[nombre] for nombre in reglas))
+
+        numericas = [(pregunta_id, respuesta["valor_numerico"])
+                     for pregunta_id, respuesta in estado.get("respuestas", {}).items()
+                     if respuesta.get("valor_numerico") is not None]
+        partes.append(bytes([len(numericas)]))
+        for pregunta_id, valor in numericas:
+            identificador = pregunta_id.encode('utf-8')
+            partes.append(bytes([len(identificador)]) + identificador + _VALOR.pack(valor))
+
+        contenido = b"".join(partes)
+        return _base64(contenido + self._firma(contenido))
+
+    def decodificar(self, token):
+        """
+        🔓 Estado de sesión de un token emitido por este codificador.
+
+        Returns:
+            tuple: (sesion_id, estado)
+
+        Raises:
+            TokenInvalido: Si el token está mal formado o la firma no coincide
+            TokenRetirado: Si la versión de datos no es la de este codificador
+        """
+        try:
+            datos = _desde_base64(token)
+        except (ValueError, TypeError):
+            raise TokenInvalido("Token mal codificado")
+        if len(datos) < _CABECERA.size + LARGO_FIRMA + 2:
+            raise TokenInvalido("Token incompleto")
+        contenido, firma = datos[:-LARGO_FIRMA], datos[-LARGO_FIRMA:]
+        if not hmac.compare_digest(firma, self._firma(contenido)):
+            raise TokenInvalido("Firma del token inválida")
+
+        formato, reglas_bin, datos_bin, sesion_bin, secuencia, iniciada, banderas, categorias = \
+            _CABECERA.unpack_from(contenido)
+        if formato != FORMATO_TOKEN or reglas_bin.hex() != self.version_reglas:
+            raise TokenInvalido("El token no corresponde a este codificador")
+        if datos_bin.hex() != self.version_datos:
+            raise TokenRetirado(f"La versión de datos {datos_bin.hex()} del token fue retirada")
+
+        estado = {
+            "estado": "inicio",
+            "respuestas": {},
+            "categoria_actual": None,
+            "tipo_actividad": "servicios" if banderas & _SERVICIOS else "venta" if banderas & _VENTA else None,
+            "applied_rules": [],
+            "version_reglas": self.version_reglas,
+            "secuencia": secuencia,
+            "iniciada": float(iniciada)
+        }
+        for clave, valor in zip(("categoria_actual", "categoria_final", "categoria_maxima"), categorias):
+            if valor:
+                estado[clave] = chr(valor)
+        if banderas & _EXCEDE_PARAMETROS:
+            estado["excede_parametros"] = True
+
+        try:
+            posicion = _CABECERA.size
+            if banderas & _FECHA_VIGENCIA:
+                estado["fecha_vigencia"] = date.fromordinal(_FECHA.unpack_from(contenido, posicion)[0]).isoformat()
+                posicion += _FECHA.size
+            cantidad = contenido[posicion]
+            estado["applied_rules"] = [self._reglas[i] for i in contenido[posicion + 1:posicion + 1 + cantidad]]
+            posicion += 1 + cantidad
+            cantidad = contenido[posicion]
+            posicion += 1
+            for _ in range(cantidad):
+                largo = contenido[posicion]
+                pregunta_id = contenido[posicion + 1:posicion + 1 + largo].decode('utf-8')
+                posicion += 1 + largo
+                valor = _VALOR.unpack_from(contenido, posicion)[0]
+                posicion += _VALOR.size
+                estado["respuestas"][pregunta_id] = {"pregunta_id": pregunta_id, "respuesta": f"{valor:g}",
+                                                     "valor_numerico": valor}
+        except (IndexError, struct.error, UnicodeDecodeError, ValueError):
+            raise TokenInvalido("Token mal formado")
+        return sesion_bin.hex(), estado
+
+
+def versiones_del_token(token):
+    """
+    (versión de reglas, versión de datos) de un token, sin verificar la firma:
+    sirve para elegir el codificador que lo verifica.
+
+    Raises:
+        TokenInvalido: Si el token está mal formado
+    """
+    try:
+        datos = _desde_base64(token)
+        _, reglas_bin, datos_bin = struct.unpack_from(">B8s8s", datos)
+    except (ValueError, TypeError, struct.error):
+        raise TokenInvalido("Token mal codificado")
+    return reglas_bin.hex(), datos_bin.hex()
+
+
+def nuevo_sesion_id():
+    """Id de sesión para el modo sin estado (16 caracteres hex)"""
+    return secrets.token_hex(8)
+
+
+if __name__ == "__main__":
+    # Benchmark: tamaño del token y costo de codificar/decodificar frente al estado en JSON
+    import timeit
+    from data_manager import cargar_tablas_locales
+    from motor_inferencia import MotorInferencia, cargar_reglas
+
+    motor = MotorInferencia(cargar_reglas(), cargar_tablas_locales())
+    codificador = CodificadorTokens(motor, clave_tokens())
+    estado, _ = motor.iniciar()
+    estado.update(secuencia=0, iniciada=time.time())
+    sesion_id = nuevo_sesion_id()
+    entrevista = [
+        ("persona_juridica", "NO (Persona Física)", None), ("socio_sociedad", "NO", None),
+        ("actividades_diferentes", "NO (3 o menos actividades)", None),
+        ("actividad_servicios", "SÍ (Prestación de Servicios)", None), ("genera_ingresos", "SÍ", None),
+        ("ingresos_anuales", "12000000", 12000000.0), ("tiene_local", "SÍ (Tiene local)", None),
+        ("superficie_cat_C", "SÍ (Supera el límite)", None),
+        ("superficie_cat_D", "NO (No supera el límite / Desconozco)", None),
+        ("energia_cat_D", "NO (No supera el límite / Desconozco)", None),
+        ("alquileres_cat_D", "NO (No supera el límite / Desconozco)", None),
+    ]
+    print(f"{'paso':>4} {'token':>7} {'JSON':>7} {'codificar':>11} {'decodificar':>12}")
+    for paso, (pregunta_id, respuesta, valor) in enumerate(entrevista, 1):
+        estado, _ = motor.responder(estado, pregunta_id, respuesta, valor)
+        estado["secuencia"] = paso
+        token = codificador.codificar(sesion_id, estado)
+        assert codificador.decodificar(token)[1]["applied_rules"] == estado["applied_rules"]
+        repeticiones = 2000
+        codificar = timeit.timeit(lambda: codificador.codificar(sesion_id, estado), number=repeticiones) / repeticiones
+        decodificar = timeit.timeit(lambda: codificador.decodificar(token), number=repeticiones) / repeticiones
+        print(f"{paso:>4} {len(token):>5} B {len(json.dumps(estado, ensure_ascii=False)):>5} B "
+              f"{codificar * 1e6:>8.1f} µs {decodificar * 1e6:>9.1f} µs")